@@ -0,0 +1,134 @@
+import queue
+import threading
+import time
+
+from database import get_db_connection
+from settings import settings
+
+AUDIT_BATCH_SIZE = settings.audit_batch_size
+AUDIT_FLUSH_INTERVAL = settings.audit_flush_interval
+AUDIT_QUEUE_SIZE = settings.audit_queue_size
+
+_STOP = object()
+
+
+class BatchWriter:
+    """
+    Write-behind queue for audit rows.
+
+    submit() only enqueues the row tuple; a background thread groups rows and
+    writes them with a single executemany (pymysql turns it into a multi-row
+    INSERT) when batch_size rows are waiting or flush_interval seconds have
+    passed. When the queue is full, rows are dropped and counted unless the
+    caller asks to block.
+    """
+
+    def __init__(self, name, query, batch_size=AUDIT_BATCH_SIZE,
+                 flush_interval=AUDIT_FLUSH_INTERVAL, max_queue=AUDIT_QUEUE_SIZE,
+                 connection_factory=None):
+        self.name = name
+        self.query = query
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._connection_factory = connection_factory or get_db_connection
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {
+            'submitted': 0,
+            'written': 0,
+            'dropped': 0,
+            'batches': 0,
+            'failed': 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f"audit-{self.name}", daemon=True)
+            self._thread.start()
+
+    def submit(self, row, block=False, timeout=None):
+        """Enqueues one row. Returns False when the row was dropped because the queue is full."""
+        try:
+            self._queue.put(row, block=block, timeout=timeout)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('submitted')
+        return True
+
+    def _write(self, batch):
+        try:
+            with self._connection_factory() as conn:
+                with conn.cursor() as cursor:
+                    cursor.executemany(self.query, batch)
+                conn.commit()
+            self._count('written', len(batch))
+            self._count('batches')
+        except Exception as e:
+            self._count('failed', len(batch))
+            print(f"Waring: Fail to write {len(batch)} {self.name} audit rows: {e}")
+
+    def _run(self):
+        batch = []
+        deadline = None
+        stopping = False
+        while not stopping:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if batch and (stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+                deadline = None
+
+        # Esvazia o que ainda estiver na fila antes de encerrar
+        remaining = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                remaining.append(item)
+        for start in range(0, len(remaining), self.batch_size):
+            self._write(remaining[start:start + self.batch_size])
+
+    def close(self, timeout=10.0):
+        """Flushes every queued row and stops the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.stats)
+        data['queued'] = self._queue.qsize()
+        data['batch_size'] = self.batch_size
+        data['flush_interval'] = self.flush_interval
+        return data
+
+
+llm_log_writer = BatchWriter(
+    "llm_register",
+    """
+    insert into llm_register (User_id, Prompt_use, LLM_Aswer, LLM_Model)
+    values (%s, %s, %s, %s)
+    """,
+)
@@ -0,0 +1,63 @@
+"""
+Concurrent throughput of async handlers: blocking pymysql call inside the
+event loop vs. the same call awaited through database.run_db.
+
+Uso:
+    python benchmarks/bench_async_db.py                 # query simulada (time.sleep)
+    python benchmarks/bench_async_db.py --real          # SELECT SLEEP() no MySQL local
+    python benchmarks/bench_async_db.py -n 200 --latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection, run_db, POOL_MAX_SIZE  # noqa: E402
+
+
+def simulated_query(latency):
+    time.sleep(latency)
+
+
+def real_query(latency):
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT SLEEP(%s)", (latency,))
+            cursor.fetchall()
+
+
+async def blocking_handler(query, latency):
+    # Comportamento antigo: a chamada bloqueia o event loop inteiro
+    query(latency)
+
+
+async def offloaded_handler(query, latency):
+    await run_db(query, latency)
+
+
+async def run(handler, query, requests, latency):
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(query, latency) for _ in range(requests)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--requests", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.01, help="query latency in seconds")
+    parser.add_argument("--real", action="store_true", help="use the configured MySQL instead of time.sleep")
+    args = parser.parse_args()
+
+    query = real_query if args.real else simulated_query
+    print(f"{args.requests} concurrent requests, {args.latency * 1000:.0f} ms per query, "
+          f"db executor size {POOL_MAX_SIZE}")
+    for name, handler in (("blocking", blocking_handler), ("run_db", offloaded_handler)):
+        elapsed = asyncio.run(run(handler, query, args.requests, args.latency))
+        print(f"{name:>8}: {elapsed:7.3f} s  {args.requests / elapsed:9.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
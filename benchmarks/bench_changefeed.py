@@ -0,0 +1,125 @@
+"""
+Broadcast latency of the inventory change feed (in-process, no network).
+
+For each subscriber count, opens that many idle subscribers on
+`changefeed.ChangeFeed.stream()` (the same generator the SSE endpoint
+serves), delivers events at --rate per second the way the inventory_changes
+poller does and measures the delay from delivery until each subscriber has
+the frame: p50/p99/max, the time to reach the last subscriber, and the
+memory held per idle subscriber. Also checks a resume with a Last-Event-ID
+replays only the missed events. The table round trip (write-behind flush +
+poll interval) is not included.
+
+Uso:
+    python benchmarks/bench_changefeed.py --subscribers 100 1000 10000 --events 200
+    python benchmarks/bench_changefeed.py --subscribers 1000 10000 --json benchmarks/results/changefeed.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from changefeed import ChangeFeed  # noqa: E402
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run(subscribers, events, rate):
+    feed = ChangeFeed(history=max(events, 1000))
+    feed.bind(asyncio.get_running_loop())
+    latencies = []
+    last_delivery = {}
+
+    def on_batch(batch):
+        now = time.perf_counter()
+        for version, _, published_at in batch:
+            latencies.append(now - published_at)
+            last_delivery[version] = now
+
+    async def subscriber():
+        async for _ in feed.stream(on_batch=on_batch):
+            pass
+
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tasks = [asyncio.create_task(subscriber()) for _ in range(subscribers)]
+    while feed.subscribers < subscribers:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.05)
+    idle_bytes = (tracemalloc.get_traced_memory()[0] - before) / subscribers
+    tracemalloc.stop()
+
+    published = {}
+    for index in range(events):
+        version = index + 1
+        published[version] = time.perf_counter()
+        feed.deliver([(version, 'sold', {'id': index}, feed.origin)])
+        await asyncio.sleep(1 / rate)
+    deadline = time.perf_counter() + 30
+    while len(latencies) < subscribers * events and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+
+    # Resume: quem volta com o id da metade recebe só a outra metade
+    replayed = []
+    middle = feed.event_id(events // 2)
+    stream = feed.stream(middle)
+    await stream.__anext__()
+    replayed.append(await stream.__anext__())
+    await stream.aclose()
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    fanout = [last_delivery[version] - published[version] for version in published if version in last_delivery]
+    return {
+        "subscribers": subscribers,
+        "events": events,
+        "delivered": len(latencies),
+        "expected": subscribers * events,
+        "latency_p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+        "latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "latency_max_ms": round(max(latencies) * 1000, 3),
+        "last_subscriber_p50_ms": round(percentile(fanout, 0.5) * 1000, 3),
+        "last_subscriber_max_ms": round(max(fanout) * 1000, 3),
+        "idle_bytes_per_subscriber": round(idle_bytes),
+        "resume_replayed_events": replayed[0].count(b"event: sold"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--events", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=50.0, help="events per second")
+    parser.add_argument("--json", help="save the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for count in args.subscribers:
+        result = asyncio.run(run(count, args.events, args.rate))
+        results.append(result)
+        print(f"{count:>6} subscribers: p50 {result['latency_p50_ms']:.3f} ms, p99 {result['latency_p99_ms']:.3f} ms, "
+              f"last subscriber p50 {result['last_subscriber_p50_ms']:.3f} ms, "
+              f"{result['idle_bytes_per_subscriber']} bytes/idle subscriber, "
+              f"delivered {result['delivered']}/{result['expected']}, "
+              f"resume replayed {result['resume_replayed_events']}/{args.events - args.events // 2}")
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Flash-sale benchmark for the checkout engine against the local MySQL.
+
+Fires N concurrent checkouts at one car (everyone races for the same row)
+and at many cars (one buyer per car), then reports throughput, latency
+percentiles and checks that every car has exactly one winner.
+
+The seller and client ids must exist in `users`. Test vehicles are
+inserted before the run and removed afterwards (use --keep to leave them).
+
+Uso:
+    python benchmarks/bench_checkout.py -n 200 --workers 32 --seller-id 1 --client-id 2
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import checkout  # noqa: E402
+from database import get_db_connection  # noqa: E402
+
+
+def create_cars(seller_id, count):
+    ids = []
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            for _ in range(count):
+                cursor.execute(
+                    """
+                    insert into vehicles (Seller_ID, Type_Seller, Mark, Model, Year, Mileage, Price, Fuel_type, Color, Status, description)
+                    values (%s, 'Person', 'Bench', 'Flash', 2024, 0, 50000, 'Flex', 'Preto', 'New', 'checkout benchmark')
+                    """,
+                    (seller_id,),
+                )
+                ids.append(cursor.lastrowid)
+        conn.commit()
+    return ids
+
+
+def cleanup(car_ids):
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            placeholders = ', '.join(['%s'] * len(car_ids))
+            cursor.execute(f"delete from sells where Car_id in ({placeholders})", car_ids)
+            cursor.execute(f"delete from vehicles where id in ({placeholders})", car_ids)
+        conn.commit()
+
+
+def count_sales(car_ids):
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            placeholders = ', '.join(['%s'] * len(car_ids))
+            cursor.execute(
+                f"select Car_id, count(*) as sales from sells where Car_id in ({placeholders}) group by Car_id",
+                car_ids,
+            )
+            return {row['Car_id']: row['sales'] for row in cursor.fetchall()}
+
+
+def one_checkout(client_id, car_id, use_keys):
+    key = uuid.uuid4().hex if use_keys else None
+    started = time.perf_counter()
+    try:
+        checkout.process_checkout(client_id, car_id, key)
+        outcome = 'won'
+    except checkout.VehicleUnavailable:
+        outcome = 'lost'
+    except Exception as e:
+        outcome = f'error: {type(e).__name__}'
+    return outcome, time.perf_counter() - started
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_scenario(name, targets, client_id, workers, use_keys):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        started = time.perf_counter()
+        results = list(pool.map(lambda car_id: one_checkout(client_id, car_id, use_keys), targets))
+        elapsed = time.perf_counter() - started
+
+    latencies = [latency * 1000 for _, latency in results]
+    outcomes = {}
+    for outcome, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    cars = sorted(set(targets))
+    sales = count_sales(cars)
+    exactly_one = all(sales.get(car_id, 0) == 1 for car_id in cars)
+
+    print(f"\n== {name}: {len(targets)} checkouts over {len(cars)} car(s), {workers} workers")
+    print(f"throughput: {len(targets) / elapsed:9.1f} checkouts/s ({elapsed:.3f} s)")
+    print(f"latency ms: p50 {percentile(latencies, 50):.2f}  p95 {percentile(latencies, 95):.2f}  "
+          f"p99 {percentile(latencies, 99):.2f}  max {max(latencies):.2f}  mean {statistics.mean(latencies):.2f}")
+    print(f"outcomes:   {outcomes}")
+    print(f"exactly one winner per car: {'OK' if exactly_one else 'FAILED'}")
+    return exactly_one
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--checkouts", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--seller-id", type=int, default=1)
+    parser.add_argument("--client-id", type=int, default=1)
+    parser.add_argument("--idempotency-keys", action="store_true", help="send a unique key with every request")
+    parser.add_argument("--keep", action="store_true", help="don't delete the benchmark vehicles and sales")
+    args = parser.parse_args()
+
+    hot_car = create_cars(args.seller_id, 1)
+    many_cars = create_cars(args.seller_id, args.checkouts)
+    try:
+        ok = run_scenario("one hot car", hot_car * args.checkouts, args.client_id, args.workers, args.idempotency_keys)
+        ok &= run_scenario("many cars", many_cars, args.client_id, args.workers, args.idempotency_keys)
+        print(f"\nengine counters: {checkout.stats.snapshot()}")
+    finally:
+        if not args.keep:
+            cleanup(hot_car + many_cars)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Photo upload benchmark against a running API.
+
+Uploads N distinct synthetic JPEGs (made with Pillow) to one vehicle with
+--workers concurrent clients and reports the upload throughput (MB/s and
+per-request latency), then polls /api/photos/stats until the variant
+process pool drains: peak queue depth, time to drain and average variant
+time per photo.
+
+Uso:
+    python benchmarks/bench_photos.py --url http://127.0.0.1:8000 --vehicle-id 1 -n 100 --workers 8
+"""
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from PIL import Image
+
+
+def synthetic_jpeg(seed, size):
+    # Ruído + gradiente: cada foto tem conteúdo (e hash) diferente e comprime como uma foto real
+    rng = random.Random(seed)
+    image = Image.effect_noise(size, 64).convert('RGB')
+    overlay = Image.linear_gradient('L').resize(size).convert('RGB')
+    image = Image.blend(image, overlay, rng.uniform(0.3, 0.7))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=rng.randint(80, 95))
+    return buffer.getvalue()
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--vehicle-id", type=int, required=True)
+    parser.add_argument("-n", type=int, default=50, help="number of photos")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent uploads")
+    parser.add_argument("--size", default="3000x2000", help="photo size in pixels")
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds to wait for the pool to drain")
+    parser.add_argument("--json", help="save the results to this file")
+    args = parser.parse_args()
+
+    size = tuple(int(part) for part in args.size.split('x'))
+    payloads = [synthetic_jpeg(seed, size) for seed in range(args.n)]
+    total_bytes = sum(len(payload) for payload in payloads)
+    print(f"{args.n} photos, {total_bytes / 1e6:.1f} MB")
+
+    with httpx.Client(base_url=args.url, timeout=60.0) as client:
+        before = client.get("/api/photos/stats").json()
+
+        def upload(payload):
+            started = time.perf_counter()
+            response = client.post(f"/vehicle/{args.vehicle_id}/photos",
+                                   files={"file": ("photo.jpg", payload, "image/jpeg")})
+            return response.status_code, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            results = list(executor.map(upload, payloads))
+        upload_seconds = time.perf_counter() - started
+
+        peak_queue = 0
+        deadline = time.perf_counter() + args.timeout
+        while True:
+            stats = client.get("/api/photos/stats").json()
+            peak_queue = max(peak_queue, stats['queue_depth'])
+            if stats['queue_depth'] == 0 or time.perf_counter() > deadline:
+                break
+            time.sleep(0.05)
+        drain_seconds = time.perf_counter() - started
+
+    latencies = [seconds for code, seconds in results if code == 201]
+    jobs = stats['variant_jobs'] - before['variant_jobs']
+    report = {
+        "photos": args.n,
+        "errors": sum(1 for code, _ in results if code != 201),
+        "upload_mb_per_second": round(total_bytes / upload_seconds / 1e6, 2),
+        "upload_p50_ms": round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        "upload_p95_ms": round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        "peak_queue_depth": max(peak_queue, stats['max_queue_depth']),
+        "drained": stats['queue_depth'] == 0,
+        "seconds_until_all_variants": round(drain_seconds, 3),
+        "variant_jobs": jobs,
+        "variant_failures": stats['variant_failures'] - before['variant_failures'],
+        "avg_variant_ms": round((stats['variant_seconds'] - before['variant_seconds']) / jobs * 1000, 2) if jobs else None,
+        "server": stats,
+    }
+    for key, value in report.items():
+        if key != "server":
+            print(f"{key:<28} {value}")
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Worker cold-start benchmark.
+
+* import time of `main` in a fresh interpreter (and, for reference, of the
+  Gemini SDK that is now only imported in the background warm-up);
+* per uvicorn worker started as a subprocess: time until /health/live
+  answers, until /health/ready is 200 (needs the database) and until the
+  first real request (/api/vehicles/available) is served.
+
+Uso:
+    python benchmarks/bench_startup.py --runs 5
+    python benchmarks/bench_startup.py --runs 5 --json benchmarks/results/startup.json
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+
+
+def import_seconds(module, env):
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", IMPORT_SNIPPET.format(module=module)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(client, url, accept, deadline, process):
+    while time.perf_counter() < deadline and process.poll() is None:
+        try:
+            if client.get(url).status_code in accept:
+                return time.perf_counter()
+        except httpx.TransportError:
+            pass
+        time.sleep(0.01)
+    return None
+
+
+def worker_start(env, timeout):
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-W", "ignore", "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = started + timeout
+    result = {}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            live = wait_for(client, "/health/live", (200,), deadline, process)
+            ready = wait_for(client, "/health/ready", (200,), deadline, process) if live else None
+            first = wait_for(client, "/api/vehicles/available?limit=20", (200,), deadline, process) if live else None
+            warm = wait_for_warm(client, deadline) if ready else None
+        if process.poll() is not None:
+            print(f"worker exited with code {process.returncode}")
+        for name, moment in (("live", live), ("ready", ready), ("first_request", first), ("warm", warm)):
+            result[f"{name}_s"] = round(moment - started, 4) if moment else None
+    finally:
+        process.terminate()
+        process.wait(10)
+    return result
+
+
+def wait_for_warm(client, deadline):
+    while time.perf_counter() < deadline:
+        if client.get("/health/ready").json().get("warm"):
+            return time.perf_counter()
+        time.sleep(0.02)
+    return None
+
+
+def summary(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {"min": round(min(values), 4), "median": round(statistics.median(values), 4), "max": round(max(values), 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for each worker")
+    parser.add_argument("--json", help="save the results to this file")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    report = {"imports": {}, "workers": {}}
+
+    for module in ("main", "google.generativeai"):
+        try:
+            timings = [import_seconds(module, env) for _ in range(args.runs)]
+        except subprocess.CalledProcessError:
+            print(f"import {module}: not available")
+            continue
+        report["imports"][module] = summary(timings)
+        print(f"import {module:<22} median {statistics.median(timings) * 1000:8.1f} ms")
+
+    runs = [worker_start(env, args.timeout) for _ in range(args.runs)]
+    for key in ("live_s", "ready_s", "first_request_s", "warm_s"):
+        report["workers"][key] = summary([run.get(key) for run in runs])
+        stats = report["workers"][key]
+        text = f"median {stats['median'] * 1000:8.1f} ms" if stats else "not reached (database/LLM configured?)"
+        print(f"worker {key:<22} {text}")
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+HTTP load test for the API with a realistic request mix.
+
+By default it starts `main:app` with uvicorn on a free local port (using the
+MySQL configured in .env, seeded by benchmarks/seed.py); --url targets an
+already running server instead. For each concurrency level it runs the mix
+for --duration seconds and reports RPS, latency percentiles and error rate
+per endpoint. Results are saved as JSON; --compare prints the change
+against a previous run.
+
+Uso:
+    python benchmarks/seed.py --users 1000 --vehicles 20000
+    python benchmarks/load_test.py --concurrency 1 8 32 --duration 20
+    python benchmarks/load_test.py --compare benchmarks/results/<anterior>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import httpx
+import uvicorn
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# O mix faz logins repetidos do mesmo IP; sem isso o rate limit de login do
+# servidor em processo responderia 429. Precisa vir antes de importar o app,
+# que lê as configurações uma única vez.
+for _name in ("LOGIN_IP_BURST", "LOGIN_IP_PER_MINUTE", "LOGIN_EMAIL_BURST", "LOGIN_EMAIL_PER_MINUTE"):
+    os.environ.setdefault(_name, "1000000")
+
+from seed import EMAIL_DOMAIN, EMAIL_PREFIX  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Peso de cada operação no mix (proporcional)
+DEFAULT_MIX = {
+    "list_available": 50,
+    "profile": 20,
+    "login": 15,
+    "register": 5,
+    "checkout": 10,
+}
+
+
+class Workload:
+    def __init__(self, users, password, rng):
+        self.users = users
+        self.password = password
+        self.rng = rng
+        self.cursors = [None]
+        self.available_ids = []
+        self.user_ids = []
+
+    def email(self):
+        return f"{EMAIL_PREFIX}{self.rng.randrange(self.users)}{EMAIL_DOMAIN}"
+
+    async def prepare(self, client):
+        # Descobre ids reais de usuários e veículos para montar as requisições
+        cursor = None
+        for _ in range(20):
+            params = {"limit": 200}
+            if cursor:
+                params["cursor"] = cursor
+            response = await client.get("/api/vehicles/available", params=params)
+            self.available_ids.extend(vehicle['id'] for vehicle in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+            self.cursors.append(cursor)
+        self.rng.shuffle(self.available_ids)
+        for _ in range(min(self.users, 50)):
+            response = await client.post("/login/", json={"email": self.email(), "password": self.password})
+            if response.status_code == 200:
+                self.user_ids.append(response.json()["User_ID"])
+        if not self.user_ids:
+            raise SystemExit("Could not log in any seeded user; run benchmarks/seed.py first.")
+
+    def request(self, operation):
+        """Returns (method, url, kwargs, accepted status codes)."""
+        if operation == "list_available":
+            params = {"limit": 50}
+            cursor = self.rng.choice(self.cursors)
+            if cursor:
+                params["cursor"] = cursor
+            if self.rng.random() < 0.3:
+                params["max_price"] = self.rng.randint(20, 200) * 500
+            return "GET", "/api/vehicles/available", {"params": params}, (200,)
+        if operation == "profile":
+            return "GET", f"/profile/{self.rng.choice(self.user_ids)}", {}, (200,)
+        if operation == "login":
+            return "POST", "/login/", {"json": {"email": self.email(), "password": self.password}}, (200,)
+        if operation == "register":
+            body = {
+                "name": "Bench Register",
+                "email": f"{EMAIL_PREFIX}reg_{uuid.uuid4().hex}{EMAIL_DOMAIN}",
+                "password": self.password,
+                "account_type": "Person",
+                "phone_number": f"{self.rng.randrange(10**9, 10**10)}",
+            }
+            return "POST", "/register/", {"json": body}, (200,)
+        if operation == "checkout":
+            car_id = self.available_ids.pop() if self.available_ids else self.rng.randint(1, 10**6)
+            body = {"client_id": self.rng.choice(self.user_ids), "car_id": car_id, "total_value": 0}
+            # 404 = carro já vendido/inexistente: resultado esperado, não erro
+            return "POST", "/api/vendas/checkout", {"json": body}, (200, 404)
+        raise ValueError(operation)
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+def summarize(samples, elapsed):
+    latencies = [latency for latency, _ in samples]
+    errors = sum(1 for _, ok in samples if not ok)
+    return {
+        "requests": len(samples),
+        "rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": max(latencies) if latencies else None,
+    }
+
+
+async def run_level(base_url, workload, mix, concurrency, duration):
+    operations = list(mix)
+    weights = [mix[name] for name in operations]
+    samples = {name: [] for name in operations}
+    deadline = time.perf_counter() + duration
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        async def worker():
+            while time.perf_counter() < deadline:
+                operation = workload.rng.choices(operations, weights)[0]
+                method, url, kwargs, accepted = workload.request(operation)
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, url, **kwargs)
+                    ok = response.status_code in accepted
+                except httpx.HTTPError:
+                    ok = False
+                samples[operation].append(((time.perf_counter() - started) * 1000, ok))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    result = {name: summarize(values, elapsed) for name, values in samples.items()}
+    result["total"] = summarize([s for values in samples.values() for s in values], elapsed)
+    return result
+
+
+def start_server():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    config = uvicorn.Config("main:app", host="127.0.0.1", port=port, log_level="warning", app_dir=ROOT)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+def print_level(concurrency, result, previous=None):
+    print(f"\n== concurrency {concurrency}")
+    print(f"{'endpoint':<16}{'reqs':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}")
+    for name, stats in result.items():
+        fmt = lambda v: f"{v:10.1f}" if v is not None else f"{'-':>10}"  # noqa: E731
+        line = (f"{name:<16}{stats['requests']:>8}{stats['rps']:>10.1f}{fmt(stats['p50_ms'])}"
+                f"{fmt(stats['p95_ms'])}{fmt(stats['p99_ms'])}{stats['error_rate']:>9.2%}")
+        if previous and name in previous and previous[name]['rps']:
+            change = (stats['rps'] - previous[name]['rps']) / previous[name]['rps']
+            line += f"   rps {change:+.1%} vs baseline"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="target a running server instead of starting one")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per concurrency level")
+    parser.add_argument("--users", type=int, default=1000, help="seeded Person accounts (see seed.py)")
+    parser.add_argument("--password", default="bench123")
+    parser.add_argument("--mix", default=None,
+                        help="weights as name=weight,... (names: %s)" % ", ".join(DEFAULT_MIX))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="JSON file for the results (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    args = parser.parse_args()
+
+    mix = dict(DEFAULT_MIX)
+    if args.mix:
+        mix = {name: float(weight) for name, weight in (item.split("=") for item in args.mix.split(","))}
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        server, thread, base_url = start_server()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = {level["concurrency"]: level["result"] for level in json.load(fh)["levels"]}
+
+    workload = Workload(args.users, args.password, random.Random(args.seed))
+    try:
+        async def prepare():
+            async with httpx.AsyncClient(base_url=base_url, timeout=30.0) as client:
+                await workload.prepare(client)
+        asyncio.run(prepare())
+
+        levels = []
+        for concurrency in args.concurrency:
+            result = asyncio.run(run_level(base_url, workload, mix, concurrency, args.duration))
+            levels.append({"concurrency": concurrency, "result": result})
+            print_level(concurrency, result, (baseline or {}).get(concurrency))
+    finally:
+        if server is not None:
+            server.should_exit = True
+            thread.join(10)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "target": base_url if args.url else "in-process uvicorn",
+        "duration": args.duration,
+        "mix": mix,
+        "levels": levels,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"load_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"\nresults saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Micro-benchmarks that don't need a database:
+
+* VehicleResponse serialization of N synthetic rows, through the same path
+  FastAPI uses for response_model (validate + jsonable_encoder + json.dumps),
+  through a TypeAdapter dump_json and through the trusted-row orjson path of
+  serialization.encode_rows, with the CPU saved per 10k rows;
+* bcrypt hash/verify cost for a range of work factors;
+* facet counts of the columnar inventory engine over --inventory vehicles,
+  plus its memory per vehicle;
+* "similar vehicles" queries (by vehicle and by preferences) over the same stock.
+
+Uso:
+    python benchmarks/micro.py --rows 10000 --rounds 10 11 12 --inventory 100000 --json benchmarks/results/micro.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from decimal import Decimal
+from typing import List
+
+import bcrypt # type: ignore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+import serialization  # noqa: E402
+from inventory import InventoryEngine  # noqa: E402
+from similarity import SimilarityIndex  # noqa: E402
+from main import VehicleResponse  # noqa: E402
+
+
+MARKS = ('Fiat', 'Volkswagen', 'Chevrolet', 'Toyota', 'Hyundai', 'Renault')
+FUELS = ('Flex', 'Gasolina', 'Diesel', 'Elétrico')
+COLORS = ('Prata', 'Preto', 'Branco', 'Cinza', 'Vermelho')
+
+
+def synthetic_rows(count):
+    return [
+        {
+            'id': i, 'Seller_ID': i % 100, 'Mark': MARKS[i % len(MARKS)], 'Model': f'Modelo {i % 40}',
+            'Year': 2005 + i % 20, 'Mileage': i * 7 % 200000, 'Price': Decimal(f"{20000 + i * 37 % 180000}.00"),
+            'Fuel_type': FUELS[i % len(FUELS)], 'Color': COLORS[i % len(COLORS)], 'Status': 'Used',
+            'Description': 'único dono, revisado', 'Inventory_Status': 'Available',
+        }
+        for i in range(count)
+    ]
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), statistics.median(timings)
+
+
+def bench_serialization(rows, repeat):
+    adapter = TypeAdapter(List[VehicleResponse])
+
+    def fastapi_path():
+        models = [VehicleResponse.model_validate(row) for row in rows]
+        json.dumps(jsonable_encoder(models)).encode('utf-8')
+
+    def adapter_path():
+        adapter.dump_json(adapter.validate_python(rows))
+
+    def trusted_path():
+        serialization.encode_rows(rows, VehicleResponse, strict=False)
+
+    paths = [("fastapi_response_model", fastapi_path), ("type_adapter", adapter_path)]
+    if serialization.orjson is not None:
+        paths.append(("orjson_trusted", trusted_path))
+
+    results = {}
+    for name, func in paths:
+        best, median = best_of(func, repeat)
+        results[name] = {"best_ms": round(best * 1000, 2), "median_ms": round(median * 1000, 2),
+                         "us_per_row": round(best / len(rows) * 1e6, 3)}
+        print(f"{name:<24} {len(rows)} rows: best {best * 1000:8.2f} ms  median {median * 1000:8.2f} ms  "
+              f"({best / len(rows) * 1e6:.2f} us/row)")
+    baseline = results["fastapi_response_model"]["us_per_row"]
+    for name, data in results.items():
+        # us/row * 10k rows = ms de CPU por 10k linhas
+        data["cpu_ms_saved_per_10k_rows"] = round((baseline - data["us_per_row"]) * 10, 2)
+        if name != "fastapi_response_model":
+            print(f"{name:<24} saves {data['cpu_ms_saved_per_10k_rows']:8.2f} ms of CPU per 10k rows")
+    return results
+
+
+def bench_bcrypt(rounds_list, repeat):
+    results = {}
+    password = b"bench123"
+    for rounds in rounds_list:
+        salt = bcrypt.gensalt(rounds)
+        hashed = bcrypt.hashpw(password, salt)
+        hash_best, _ = best_of(lambda: bcrypt.hashpw(password, salt), repeat)
+        verify_best, _ = best_of(lambda: bcrypt.checkpw(password, hashed), repeat)
+        results[str(rounds)] = {"hash_ms": round(hash_best * 1000, 2), "verify_ms": round(verify_best * 1000, 2)}
+        print(f"bcrypt rounds={rounds:<3} hash {hash_best * 1000:8.2f} ms  verify {verify_best * 1000:8.2f} ms")
+    return results
+
+
+def bench_inventory(rows, repeat):
+    engine = InventoryEngine()
+    started = time.perf_counter()
+    engine.rebuild(rows)
+    load_ms = (time.perf_counter() - started) * 1000
+    results = {"vehicles": len(rows), "load_ms": round(load_ms, 2)}
+    queries = {
+        "no_filters": {},
+        "mark_price": {"mark": "fiat", "max_price": 80000},
+        "combined": {"fuel_type": "flex", "min_year": 2012, "max_mileage": 100000, "color": "prata"},
+    }
+    for name, filters in queries.items():
+        best, median = best_of(lambda: engine.facets(filters), repeat)
+        results[f"facets_{name}_ms"] = round(best * 1000, 3)
+        print(f"facets {name:<18} {len(rows)} vehicles: best {best * 1000:8.3f} ms  median {median * 1000:8.3f} ms")
+    memory = engine.memory()
+    results["memory"] = memory
+    print(f"inventory memory: {memory['bytes_per_vehicle']} bytes/vehicle "
+          f"({memory['column_bytes_per_vehicle']} in columns), load {load_ms:.1f} ms")
+    return results
+
+
+def bench_similarity(rows, repeat):
+    index = SimilarityIndex()
+    started = time.perf_counter()
+    index.rebuild(rows)
+    load_ms = (time.perf_counter() - started) * 1000
+    by_vehicle, _ = best_of(lambda: index.similar_to(rows[len(rows) // 2]['id'], 10), repeat)
+    preferences = {'mark': 'Toyota', 'fuel': 'Flex', 'price': 60000, 'year': 2018, 'text': 'revisado'}
+    by_preferences, _ = best_of(lambda: index.by_preferences(preferences, 10), repeat)
+    print(f"similar {len(rows)} vehicles: by vehicle {by_vehicle * 1000:.2f} ms, by preferences "
+          f"{by_preferences * 1000:.2f} ms, build {load_ms:.1f} ms, {index.snapshot()['bytes_per_vehicle']} bytes/vehicle")
+    return {"vehicles": len(rows), "load_ms": round(load_ms, 2), "by_vehicle_ms": round(by_vehicle * 1000, 3),
+            "by_preferences_ms": round(by_preferences * 1000, 3), "index": index.snapshot()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12])
+    parser.add_argument("--inventory", type=int, default=100000, help="vehicles in the facets benchmark")
+    parser.add_argument("--json", help="save the results to this file")
+    args = parser.parse_args()
+
+    report = {
+        "serialization": bench_serialization(synthetic_rows(args.rows), args.repeat),
+        "bcrypt": bench_bcrypt(args.rounds, max(1, args.repeat // 2)),
+        "inventory": bench_inventory(synthetic_rows(args.inventory), args.repeat),
+        "similarity": bench_similarity(synthetic_rows(args.inventory), args.repeat),
+    }
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Seeds the local MySQL with a synthetic, reproducible dataset for the benchmarks.
+
+Every generated user has the email bench_<n>@example.com and the password
+given by --password (default 'bench123'), so the load test can log in.
+Rows are tagged so --reset can remove them again.
+
+Uso:
+    python benchmarks/seed.py --users 1000 --companies 100 --vehicles 20000 --sales 2000
+    python benchmarks/seed.py --reset
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import bcrypt # type: ignore
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection  # noqa: E402
+from passwords import BCRYPT_ROUNDS  # noqa: E402
+
+EMAIL_PREFIX = "bench_"
+EMAIL_DOMAIN = "@example.com"
+DESCRIPTION_TAG = "[bench]"
+
+MARKS = {
+    "Fiat": ["Uno", "Argo", "Mobi", "Toro", "Pulse"],
+    "Volkswagen": ["Gol", "Polo", "T-Cross", "Nivus", "Virtus"],
+    "Chevrolet": ["Onix", "Tracker", "S10", "Spin", "Cruze"],
+    "Toyota": ["Corolla", "Hilux", "Yaris", "SW4", "Etios"],
+    "Hyundai": ["HB20", "Creta", "Tucson", "i30", "Azera"],
+    "Renault": ["Kwid", "Duster", "Sandero", "Logan", "Captur"],
+}
+FUELS = ["Flex", "Gasolina", "Diesel", "Elétrico", "Híbrido"]
+COLORS = ["Branco", "Preto", "Prata", "Cinza", "Vermelho", "Azul"]
+WORDS = ["único dono", "revisado", "econômico", "completo", "baixa quilometragem",
+         "multimídia", "teto solar", "câmbio automático", "pneus novos", "garantia"]
+
+BATCH = 1000
+
+
+def _batched_insert(cursor, query, rows):
+    for start in range(0, len(rows), BATCH):
+        cursor.executemany(query, rows[start:start + BATCH])
+
+
+def seed(users, companies, vehicles, sales, password, rng):
+    # Um único hash serve para todos: o custo do bcrypt não entra no tempo de seed
+    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(BCRYPT_ROUNDS)).decode('utf-8')
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            started = time.perf_counter()
+            user_rows = []
+            for n in range(users + companies):
+                account_type = "Company" if n >= users else "Person"
+                user_rows.append((
+                    f"Bench User {n}", f"{EMAIL_PREFIX}{n}{EMAIL_DOMAIN}", password_hash,
+                    account_type, f"{rng.randrange(10**9, 10**10)}",
+                ))
+            _batched_insert(cursor, """
+                insert into users (name, email, Password_hash, Account_Type, Phone_Number)
+                values (%s, %s, %s, %s, %s)
+            """, user_rows)
+
+            cursor.execute(
+                "select id, Account_Type from users where email like %s order by id",
+                (f"{EMAIL_PREFIX}%{EMAIL_DOMAIN}",),
+            )
+            created = cursor.fetchall()
+            person_ids = [row['id'] for row in created if row['Account_Type'] == 'Person']
+            company_ids = [row['id'] for row in created if row['Account_Type'] == 'Company']
+
+            _batched_insert(cursor, """
+                insert into companies (user_id, company_name, cnpj) values (%s, %s, %s)
+            """, [(user_id, f"Bench Motors {user_id}", f"{rng.randrange(10**13, 10**14)}") for user_id in company_ids])
+
+            sellers = person_ids + company_ids
+            vehicle_rows = []
+            for _ in range(vehicles):
+                mark = rng.choice(list(MARKS))
+                description = f"{DESCRIPTION_TAG} " + ", ".join(rng.sample(WORDS, 3))
+                vehicle_rows.append((
+                    rng.choice(sellers), "Person", mark, rng.choice(MARKS[mark]), rng.randint(2005, 2025),
+                    rng.randint(0, 250000), rng.randint(20, 400) * 500, rng.choice(FUELS),
+                    rng.choice(COLORS), rng.choice(["New", "Used"]), description,
+                ))
+            _batched_insert(cursor, """
+                insert into vehicles (Seller_ID, Type_Seller, Mark, Model, Year, Mileage, Price, Fuel_type, Color, Status, description)
+                values (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, vehicle_rows)
+
+            cursor.execute("select id, Price from vehicles where description like %s", (f"{DESCRIPTION_TAG}%",))
+            vehicle_ids = cursor.fetchall()
+            sold = rng.sample(vehicle_ids, min(sales, len(vehicle_ids)))
+            _batched_insert(cursor, """
+                insert into sells (Client_id, Car_id, Total_value, Purchase_Status) values (%s, %s, %s, 'Completed')
+            """, [(rng.choice(person_ids), row['id'], row['Price']) for row in sold])
+            sold_ids = [row['id'] for row in sold]
+            for start in range(0, len(sold_ids), BATCH):
+                chunk = sold_ids[start:start + BATCH]
+                cursor.execute(
+                    f"update vehicles set Inventory_Status = 'Sold' where id in ({', '.join(['%s'] * len(chunk))})",
+                    chunk,
+                )
+        conn.commit()
+
+    print(f"seeded {users} persons, {companies} companies, {vehicles} vehicles, {len(sold)} sales "
+          f"in {time.perf_counter() - started:.1f} s")
+
+
+def reset():
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                delete s from sells s join vehicles v on v.id = s.Car_id where v.description like %s
+            """, (f"{DESCRIPTION_TAG}%",))
+            cursor.execute("delete from vehicles where description like %s", (f"{DESCRIPTION_TAG}%",))
+            pattern = f"{EMAIL_PREFIX}%{EMAIL_DOMAIN}"
+            cursor.execute("""
+                delete c from companies c join users u on u.id = c.user_id where u.email like %s
+            """, (pattern,))
+            cursor.execute("delete from users where email like %s", (pattern,))
+        conn.commit()
+    print("benchmark data removed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000, help="Person accounts")
+    parser.add_argument("--companies", type=int, default=100, help="Company accounts")
+    parser.add_argument("--vehicles", type=int, default=20000)
+    parser.add_argument("--sales", type=int, default=2000)
+    parser.add_argument("--password", default="bench123")
+    parser.add_argument("--seed", type=int, default=42, help="random seed (same seed, same dataset)")
+    parser.add_argument("--reset", action="store_true", help="remove previously seeded benchmark data")
+    args = parser.parse_args()
+
+    if args.reset:
+        reset()
+        return
+    seed(args.users, args.companies, args.vehicles, args.sales, args.password, random.Random(args.seed))
+
+
+if __name__ == "__main__":
+    main()
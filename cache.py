@@ -0,0 +1,148 @@
+from collections import OrderedDict
+import hashlib
+import threading
+import time
+
+
+def make_etag(body):
+    """Strong ETag for a pre-encoded response body."""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """Checks an If-None-Match header value (may be a list or '*') against an ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = [value.strip() for value in if_none_match.split(',')]
+    return etag in candidates or f'W/{etag}' in candidates
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL and an optional memory bound.
+
+    Each entry carries a size (e.g. the length of a pre-encoded response body);
+    when max_entries or max_bytes is exceeded the least recently used entries
+    are evicted first.
+
+    generation is bumped by every invalidation; a reader that captured it
+    before going to the database passes it to set() so a result computed
+    before a concurrent write is not cached. delete(key) bumps it even when
+    the key is not cached (a reader may be loading that key right now) but
+    only rejects the pending set() of that key: it leaves a tombstone with
+    the new generation. invalidate_where() and clear() can't tell which
+    pending keys they cover, so they reject every pending set().
+    """
+
+    def __init__(self, max_entries=1024, ttl=60.0, max_bytes=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.generation = 0
+        self._floor = 0  # set() com geração anterior a esta é descartado (invalidação em massa)
+        self._tombstones = OrderedDict()  # key -> geração do último delete, no máximo max_entries
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+    def _drop(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.stats['misses'] += 1
+                return default
+            value, expires_at, _ = item
+            if expires_at <= time.monotonic():
+                self._drop(key)
+                self.stats['expirations'] += 1
+                self.stats['misses'] += 1
+                return default
+            self._data.move_to_end(key)
+            self.stats['hits'] += 1
+            return value
+
+    def set(self, key, value, size=0, ttl=None, generation=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if generation is not None and (generation < self._floor
+                                           or generation < self._tombstones.get(key, 0)):
+                return
+            if key in self._data:
+                self._drop(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                # Maior que o cache inteiro: não vale a pena guardar
+                return
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while self._data and (
+                len(self._data) > self.max_entries
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self.stats['evictions'] += 1
+
+    def keys(self):
+        """Snapshot of the current keys (may include entries that already expired)."""
+        with self._lock:
+            return list(self._data.keys())
+
+    def delete(self, key):
+        with self._lock:
+            self.generation += 1
+            self._tombstones[key] = self.generation
+            self._tombstones.move_to_end(key)
+            if len(self._tombstones) > self.max_entries:
+                # A lápide mais antiga sai; o piso sobe até ela, então nenhum set() pendente escapa
+                _, dropped = self._tombstones.popitem(last=False)
+                self._floor = max(self._floor, dropped)
+            if key in self._data:
+                self._drop(key)
+                self.stats['invalidations'] += 1
+
+    def invalidate_where(self, predicate):
+        """Removes every entry for which predicate(key, value) is true."""
+        with self._lock:
+            self.generation += 1
+            self._floor = self.generation
+            self._tombstones.clear()
+            doomed = [key for key, (value, _, _) in self._data.items() if predicate(key, value)]
+            for key in doomed:
+                self._drop(key)
+            self.stats['invalidations'] += len(doomed)
+            return len(doomed)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._floor = self.generation
+            self._tombstones.clear()
+            self.stats['invalidations'] += len(self._data)
+            self._data.clear()
+            self._bytes = 0
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.stats)
+            data['entries'] = len(self._data)
+            data['bytes'] = self._bytes
+        data['max_entries'] = self.max_entries
+        data['max_bytes'] = self.max_bytes
+        data['ttl'] = self.ttl
+        return data
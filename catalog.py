@@ -0,0 +1,186 @@
+import base64
+import json
+from decimal import Decimal
+
+# Apenas as colunas que o VehicleResponse usa (evita o select *)
+VEHICLE_COLUMNS = (
+    "id, Seller_ID, Mark, Model, Year, Mileage, Price, Fuel_type, Color, Status, "
+    "description AS Description, Inventory_Status"
+)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Ordenações estáveis: sempre desempatam pelo id
+SORT_COLUMNS = {
+    'id': None,
+    'price': 'Price',
+    'year': 'Year',
+}
+
+# Índices recomendados para a tabela vehicles. Todos começam pelo
+# Inventory_Status (filtro fixo da listagem) e terminam no id (desempate do keyset).
+RECOMMENDED_INDEXES = (
+    "CREATE INDEX idx_vehicles_status_id ON vehicles (Inventory_Status, id)",
+    "CREATE INDEX idx_vehicles_status_price_id ON vehicles (Inventory_Status, Price, id)",
+    "CREATE INDEX idx_vehicles_status_year_id ON vehicles (Inventory_Status, Year, id)",
+    "CREATE INDEX idx_vehicles_status_mark_model ON vehicles (Inventory_Status, Mark, Model, Price, id)",
+    "CREATE INDEX idx_vehicles_status_fuel_price ON vehicles (Inventory_Status, Fuel_type, Price, id)",
+)
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor can't be decoded or doesn't match the sort."""
+
+
+def encode_cursor(sort, row):
+    column = SORT_COLUMNS[sort]
+    value = row[column] if column else None
+    if isinstance(value, Decimal):
+        value = str(value)
+    payload = json.dumps([sort, value, row['id']], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, value, last_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise InvalidCursorError("Invalid cursor.")
+    if cursor_sort != sort or not isinstance(last_id, int):
+        raise InvalidCursorError("Cursor does not match the requested sort.")
+    return value, last_id
+
+
+def build_listing_query(filters, sort='id', descending=False, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Builds the keyset-paginated listing query for available vehicles.
+
+    filters keys: mark, model, min_year, max_year, min_price, max_price,
+    max_mileage, fuel_type, color (None values are ignored). Fetches limit + 1
+    rows so the caller can tell whether there is a next page.
+    """
+    if sort not in SORT_COLUMNS:
+        raise InvalidCursorError(f"Unknown sort '{sort}'.")
+
+    clauses = ["Inventory_Status = 'Available'"]
+    params = []
+
+    equals = (('mark', 'Mark'), ('model', 'Model'), ('fuel_type', 'Fuel_type'), ('color', 'Color'))
+    for key, column in equals:
+        if filters.get(key):
+            clauses.append(f"{column} = %s")
+            params.append(filters[key])
+
+    ranges = (
+        ('min_year', 'Year', '>='),
+        ('max_year', 'Year', '<='),
+        ('min_price', 'Price', '>='),
+        ('max_price', 'Price', '<='),
+        ('max_mileage', 'Mileage', '<='),
+    )
+    for key, column, op in ranges:
+        if filters.get(key) is not None:
+            clauses.append(f"{column} {op} %s")
+            params.append(filters[key])
+
+    column = SORT_COLUMNS[sort]
+    direction = 'DESC' if descending else 'ASC'
+    op = '<' if descending else '>'
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort)
+        if column:
+            clauses.append(f"({column} {op} %s OR ({column} = %s AND id {op} %s))")
+            params.extend([value, value, last_id])
+        else:
+            clauses.append(f"id {op} %s")
+            params.append(last_id)
+
+    order_by = f"{column} {direction}, id {direction}" if column else f"id {direction}"
+    query = (
+        f"select {VEHICLE_COLUMNS} from vehicles where {' and '.join(clauses)} "
+        f"order by {order_by} limit %s"
+    )
+    params.append(limit + 1)
+    return query, params
+
+
+def paginate(rows, sort, limit):
+    """Splits the limit + 1 rows into (page, next_cursor)."""
+    if len(rows) > limit:
+        page = rows[:limit]
+        return page, encode_cursor(sort, page[-1])
+    return rows, None
+
+
+def row_from_vehicle_in(vehicle_id, vehicle, inventory_status='Available'):
+    """
+    Builds the VehicleResponse-shaped row for a just-inserted VehicleIn,
+    so in-memory structures can be updated without re-reading the database.
+    """
+    try:
+        year = int(vehicle.year)
+    except (TypeError, ValueError):
+        year = vehicle.year
+    return {
+        'id': vehicle_id,
+        'Seller_ID': vehicle.seller_id,
+        'Mark': vehicle.mark,
+        'Model': vehicle.model,
+        'Year': year,
+        'Mileage': vehicle.mileage,
+        'Price': Decimal(str(vehicle.price)),
+        'Fuel_type': vehicle.fuel_type,
+        'Color': vehicle.color,
+        'Status': vehicle.status,
+        'Description': vehicle.description,
+        'Inventory_Status': inventory_status,
+    }
+
+
+def normalize_filters(filters):
+    """Drops empty filters and normalizes values so equivalent queries share a cache key."""
+    normalized = {}
+    for key, value in filters.items():
+        if value is None or value == '':
+            continue
+        if isinstance(value, str):
+            value = value.strip().lower()
+        elif isinstance(value, (int, float, Decimal)) and key in ('min_price', 'max_price'):
+            value = float(value)
+        normalized[key] = value
+    return normalized
+
+
+def listing_cache_key(filters, sort, descending, cursor, limit):
+    return (tuple(sorted(filters.items())), sort, descending, cursor or '', limit)
+
+
+def matches_filters(row, filters):
+    """True when a vehicle row would be returned by a listing with these (normalized) filters."""
+    equals = (('mark', 'Mark'), ('model', 'Model'), ('fuel_type', 'Fuel_type'), ('color', 'Color'))
+    for key, column in equals:
+        if key in filters and str(row.get(column) or '').strip().lower() != filters[key]:
+            return False
+    ranges = (
+        ('min_year', 'Year', 1),
+        ('max_year', 'Year', -1),
+        ('min_price', 'Price', 1),
+        ('max_price', 'Price', -1),
+        ('max_mileage', 'Mileage', -1),
+    )
+    for key, column, sign in ranges:
+        if key not in filters:
+            continue
+        try:
+            value = float(row.get(column))
+        except (TypeError, ValueError):
+            # Valor que não dá para comparar: na dúvida considera que casa
+            continue
+        if sign > 0 and value < float(filters[key]):
+            return False
+        if sign < 0 and value > float(filters[key]):
+            return False
+    return True
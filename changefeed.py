@@ -0,0 +1,319 @@
+import asyncio
+from bisect import bisect_right
+import json
+import threading
+import time
+import uuid
+
+from audit import BatchWriter
+from database import get_db_connection
+from settings import settings
+
+# Eventos guardados para quem reconecta; quem ficou mais atrás recebe um "reset"
+CHANGEFEED_HISTORY = settings.changefeed_history
+# Intervalo do comentário de keep-alive (um único timer acorda todos os assinantes)
+CHANGEFEED_HEARTBEAT = settings.changefeed_heartbeat
+# Cada worker lê as mudanças de todos em inventory_changes a cada intervalo
+CHANGEFEED_POLL_INTERVAL = settings.changefeed_poll_interval
+CHANGEFEED_POLL_BATCH = 1000
+# Tempo que um buraco na sequência espera por uma transação ainda aberta antes de ser pulado
+CHANGEFEED_GAP_WAIT = settings.changefeed_gap_wait
+
+# Campos do veículo que vão no evento "added" para o navegador (a tabela guarda a linha
+# inteira, que os outros workers aplicam nos índices)
+ADDED_FIELDS = ('id', 'Mark', 'Model', 'Year', 'Mileage', 'Price', 'Fuel_type', 'Color')
+# Só estes tipos viram frames SSE; os demais são avisos internos entre workers
+STREAMED_KINDS = ('added', 'sold')
+
+PING = b": ping\n\n"
+
+CHANGES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS inventory_changes (
+    Version BIGINT AUTO_INCREMENT PRIMARY KEY,
+    Kind VARCHAR(16) NOT NULL,
+    Payload TEXT NOT NULL,
+    Origin VARCHAR(32) NOT NULL,
+    Created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+_SELECT_CHANGES = """
+    select Version, Kind, Payload, Origin from inventory_changes
+    where Version > %s
+    order by Version
+    limit %s
+"""
+
+_PRUNE_CHANGES = "delete from inventory_changes where Version <= %s"
+
+
+def _frame(event_id, kind, data):
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str)
+    return f"id: {event_id}\nevent: {kind}\ndata: {payload}\n\n".encode('utf-8')
+
+
+class ChangeFeed:
+    """
+    Inventory change events (added / sold) streamed to subscribers
+    as Server-Sent Events, plus internal events between workers
+    (email_known) that are never streamed.
+
+    Every worker appends its events to the inventory_changes table (through
+    a write-behind batch writer) and polls the table for the events of all
+    workers, so the AUTO_INCREMENT version is global: a client can resume
+    with Last-Event-ID on any worker. Each event is encoded once into its
+    SSE frame and kept in a bounded history. Delivery swaps one asyncio.Event
+    that every idle subscriber waits on; woken subscribers copy the new
+    frames from the shared history, so there are no per-subscriber queues.
+
+    Events written by other workers are also passed to on_remote([(kind,
+    data)]), so every worker keeps its in-memory structures in step with
+    writes handled elsewhere. Events older than the first poll (already in
+    the data loaded at startup) and the worker's own events are not.
+    """
+
+    def __init__(self, history=CHANGEFEED_HISTORY, writer=None):
+        self.history = history
+        self.writer = writer
+        self.origin = uuid.uuid4().hex[:12]
+        self.on_remote = None
+        self.version = 0
+        self.subscribers = 0
+        self._events = []  # (version, frame, published_at) em ordem de versão
+        self._floor = 0  # o histórico tem todos os eventos com versão acima desta
+        self._loaded = False
+        self._apply_after = 0  # versões até aqui já estavam no banco quando o worker carregou
+        self._gap_since = None
+        self._pruned = 0
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+        self.stats = {
+            'published': 0,
+            'delivered': 0,
+            'polls': 0,
+            'skipped_gaps': 0,
+            'applied_remote': 0,
+            'connections': 0,
+            'resumed': 0,
+            'resets': 0,
+            'max_subscribers': 0,
+        }
+
+    def bind(self, loop):
+        """Sets the event loop that serves the subscribers (call from the lifespan)."""
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+
+    def event_id(self, version):
+        return str(version)
+
+    def publish(self, kind, data):
+        """Queues an event for inventory_changes; it reaches subscribers on the next poll of each worker."""
+        if self.writer is None:
+            return False
+        with self._lock:
+            self.stats['published'] += 1
+        return self.writer.submit((kind, json.dumps(data, ensure_ascii=False, default=str), self.origin))
+
+    def added(self, row):
+        return self.publish('added', dict(row))
+
+    def sold(self, vehicle_id):
+        return self.publish('sold', {'id': vehicle_id})
+
+    def email_known(self, email):
+        # Interno: os outros workers tiram o email do cache negativo do login
+        return self.publish('email_known', {'email': email})
+
+    def _start(self, cursor):
+        # Primeira leitura: parte das últimas `history` versões, sem reenviar a tabela inteira
+        cursor.execute("select coalesce(max(Version), 0) as version from inventory_changes")
+        latest = cursor.fetchone()['version']
+        with self._lock:
+            self.version = self._floor = max(0, latest - self.history)
+        self._apply_after = latest
+        self._loaded = True
+
+    def poll(self):
+        """
+        Reads the events written after the last seen version (by any worker)
+        and delivers them. Blocking: call through run_db.
+        """
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                first = not self._loaded
+                if first:
+                    self._start(cursor)
+                cursor.execute(_SELECT_CHANGES, (self.version, CHANGEFEED_POLL_BATCH))
+                rows = cursor.fetchall()
+                if self.version - self._pruned >= self.history:
+                    # Mantém na tabela o dobro do histórico; qualquer worker pode podar
+                    cursor.execute(_PRUNE_CHANGES, (self.version - 2 * self.history,))
+                    self._pruned = self.version
+            conn.commit()
+
+        events = []
+        expected = None if first else self.version + 1
+        now = time.monotonic()
+        for row in rows:
+            if expected is not None and row['Version'] != expected:
+                # Versão menor ainda não commitada (ou desfeita): espera um pouco antes de pular
+                if self._gap_since is None:
+                    self._gap_since = now
+                if now - self._gap_since < CHANGEFEED_GAP_WAIT:
+                    break
+                with self._lock:
+                    self.stats['skipped_gaps'] += 1
+            self._gap_since = None
+            events.append((row['Version'], row['Kind'], json.loads(row['Payload']), row['Origin']))
+            expected = row['Version'] + 1
+        with self._lock:
+            self.stats['polls'] += 1
+        self.deliver(events)
+        return len(events)
+
+    def deliver(self, events):
+        """
+        Adds (version, kind, data, origin) events, in version order, to the
+        history, applies the other workers' ones through on_remote and wakes
+        the subscribers.
+        """
+        if not events:
+            return
+        remote = [(kind, data) for version, kind, data, origin in events
+                  if origin != self.origin and version > self._apply_after]
+        if remote and self.on_remote is not None:
+            # Antes de acordar os assinantes: quem reage ao evento já encontra os índices em dia
+            try:
+                self.on_remote(remote)
+            except Exception as e:
+                print(f"Warning: could not apply {len(remote)} change feed events: {e}")
+            with self._lock:
+                self.stats['applied_remote'] += len(remote)
+        published_at = time.perf_counter()
+        with self._lock:
+            for version, kind, data, _ in events:
+                if kind not in STREAMED_KINDS:
+                    continue
+                if kind == 'added':
+                    data = {field: data.get(field) for field in ADDED_FIELDS}
+                self._events.append((version, _frame(self.event_id(version), kind, {'v': version, **data}),
+                                     published_at))
+            self.version = events[-1][0]
+            # Corta o histórico em lote (amortizado) em vez de a cada evento
+            if len(self._events) > 2 * self.history:
+                drop = len(self._events) - self.history
+                self._floor = self._events[drop - 1][0]
+                del self._events[:drop]
+            self.stats['delivered'] += len(events)
+        self._notify()
+
+    def _notify(self):
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._wake()
+        else:
+            loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        # Roda no event loop: troca o Event e acorda de uma vez quem esperava o anterior
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        wakeup.set()
+
+    def since(self, version):
+        """Events after version as (version, frame, published_at), or None if they left the history."""
+        with self._lock:
+            if version < self._floor:
+                return None
+            return self._events[bisect_right(self._events, version, key=lambda event: event[0]):]
+
+    def resume_point(self, last_event_id):
+        """Version to stream from for a client's last event id, and whether it must reset."""
+        if not last_event_id:
+            return self.version, False
+        try:
+            version = int(last_event_id)
+        except ValueError:
+            return self.version, True
+        # Uma versão à frente desta vem de um worker que leu a tabela antes: os eventos chegam no próximo poll
+        if version < 0 or self.since(version) is None:
+            return self.version, True
+        return version, False
+
+    async def heartbeat(self, interval=CHANGEFEED_HEARTBEAT):
+        """Wakes every subscriber periodically so idle streams send a keep-alive."""
+        while True:
+            await asyncio.sleep(interval)
+            self._wake()
+
+    async def stream(self, last_event_id=None, on_batch=None):
+        """
+        SSE byte chunks for one subscriber: a hello (or reset) frame, then the
+        missed events, then new events as they are delivered. on_batch(events)
+        is called with each delivered batch (used by the benchmark).
+        """
+        if self._loop is None:
+            self.bind(asyncio.get_running_loop())
+        version, reset = self.resume_point(last_event_id)
+        with self._lock:
+            self.subscribers += 1
+            self.stats['connections'] += 1
+            self.stats['resumed'] += bool(last_event_id) and not reset
+            self.stats['max_subscribers'] = max(self.stats['max_subscribers'], self.subscribers)
+        try:
+            yield self._control_frame('reset' if reset else 'hello', version)
+            while True:
+                wakeup = self._wakeup
+                events = self.since(version)
+                if events is None:
+                    # Ficou para trás do histórico: o cliente recarrega a listagem e segue daqui
+                    version = self.version
+                    yield self._control_frame('reset', version)
+                    continue
+                if events:
+                    version = events[-1][0]
+                    if on_batch is not None:
+                        on_batch(events)
+                    yield b''.join(frame for _, frame, _ in events)
+                    continue
+                await wakeup.wait()
+                if self.version <= version:
+                    yield PING
+        finally:
+            with self._lock:
+                self.subscribers -= 1
+
+    def _control_frame(self, kind, version):
+        if kind == 'reset':
+            with self._lock:
+                self.stats['resets'] += 1
+        return _frame(self.event_id(version), kind, {'v': version})
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.stats)
+            data['version'] = self.version
+            data['subscribers'] = self.subscribers
+            data['history'] = min(len(self._events), self.history)
+        if self.writer is not None:
+            writer = self.writer.snapshot()
+            data['queued'] = writer['queued']
+            data['write_failures'] = writer['failed'] + writer['dropped']
+        return data
+
+
+change_writer = BatchWriter(
+    "inventory_changes",
+    "insert into inventory_changes (Kind, Payload, Origin) values (%s, %s, %s)",
+    flush_interval=settings.changefeed_flush_interval,
+    max_queue=settings.changefeed_queue_size,
+)
+
+changefeed = ChangeFeed(writer=change_writer)
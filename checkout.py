@@ -0,0 +1,206 @@
+import random
+import threading
+import time
+
+import pymysql # type: ignore
+
+from database import get_db_connection
+from settings import settings
+
+# Erros do MySQL que valem uma nova tentativa
+ER_LOCK_WAIT_TIMEOUT = 1205
+ER_LOCK_DEADLOCK = 1213
+ER_DUP_ENTRY = 1062
+RETRYABLE_ERRORS = (ER_LOCK_WAIT_TIMEOUT, ER_LOCK_DEADLOCK)
+
+CHECKOUT_MAX_RETRIES = settings.checkout_max_retries
+CHECKOUT_BACKOFF = settings.checkout_backoff
+
+# Tabela usada pelas chaves de idempotência (o header Idempotency-Key do checkout)
+IDEMPOTENCY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkout_idempotency (
+    Idempotency_Key VARCHAR(128) NOT NULL PRIMARY KEY,
+    Client_id INT NOT NULL,
+    Car_id INT NOT NULL,
+    Sell_id INT NULL,
+    Total_value DECIMAL(12, 2) NULL,
+    Created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+class CheckoutError(Exception):
+    status_code = 400
+
+
+class VehicleNotFound(CheckoutError):
+    status_code = 404
+
+    def __init__(self):
+        super().__init__("Vehicle not found.")
+
+
+class VehicleUnavailable(CheckoutError):
+    status_code = 404
+
+    def __init__(self, current_status):
+        self.current_status = current_status
+        super().__init__(f"Vehicle status is {current_status}. Cannot proceed with checkout")
+
+
+class IdempotencyConflict(CheckoutError):
+    status_code = 422
+
+    def __init__(self):
+        super().__init__("Idempotency-Key was already used for a different checkout.")
+
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.data = {
+            'attempts': 0,
+            'succeeded': 0,
+            'lost_race': 0,
+            'not_found': 0,
+            'replayed': 0,
+            'retries': 0,
+            'deadlocks': 0,
+            'lock_timeouts': 0,
+            'gave_up': 0,
+        }
+
+    def count(self, name):
+        with self._lock:
+            self.data[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.data)
+
+
+stats = _Stats()
+
+
+def _backoff(attempt):
+    # Backoff exponencial com jitter completo, para os compradores não colidirem de novo juntos
+    time.sleep(random.uniform(0, CHECKOUT_BACKOFF * (2 ** attempt)))
+
+
+def _replay(cursor, idempotency_key, client_id, car_id):
+    cursor.execute(
+        "select Client_id, Car_id, Sell_id, Total_value from checkout_idempotency where Idempotency_Key = %s",
+        (idempotency_key,),
+    )
+    previous = cursor.fetchone()
+    if not previous or previous['Sell_id'] is None:
+        return None
+    if previous['Client_id'] != client_id or previous['Car_id'] != car_id:
+        raise IdempotencyConflict()
+    stats.count('replayed')
+    return {
+        'sell_id': previous['Sell_id'],
+        'car_id': previous['Car_id'],
+        'final_price': float(previous['Total_value']),
+        'replayed': True,
+    }
+
+
+def _attempt(conn, client_id, car_id, idempotency_key, on_sold):
+    with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+        conn.begin()
+
+        if idempotency_key:
+            try:
+                # Se outra requisição com a mesma chave estiver em andamento, este
+                # insert espera o commit dela e então falha com chave duplicada
+                cursor.execute(
+                    "insert into checkout_idempotency (Idempotency_Key, Client_id, Car_id) values (%s, %s, %s)",
+                    (idempotency_key, client_id, car_id),
+                )
+            except pymysql.err.IntegrityError as e:
+                if e.args[0] != ER_DUP_ENTRY:
+                    raise
+                conn.rollback()
+                replayed = _replay(cursor, idempotency_key, client_id, car_id)
+                if replayed is None:
+                    raise IdempotencyConflict()
+                return replayed
+
+        # Compare-and-set: só um comprador consegue trocar Available -> Sold
+        cursor.execute(
+            "update vehicles set Inventory_Status = 'Sold' where id = %s and Inventory_Status = 'Available'",
+            (car_id,),
+        )
+        if cursor.rowcount != 1:
+            conn.rollback()
+            cursor.execute("select Inventory_Status from vehicles where id = %s", (car_id,))
+            vehicle = cursor.fetchone()
+            if not vehicle:
+                stats.count('not_found')
+                raise VehicleNotFound()
+            stats.count('lost_race')
+            raise VehicleUnavailable(vehicle['Inventory_Status'])
+
+        # A linha já está travada pelo update; ler o preço não espera ninguém
+        cursor.execute("select Seller_ID, Price from vehicles where id = %s", (car_id,))
+        vehicle = cursor.fetchone()
+        final_price = float(vehicle['Price'])
+
+        cursor.execute(
+            """
+            insert into sells (Client_id, Car_id, Total_value, Purchase_Status)
+            values (%s, %s, %s, %s)
+            """,
+            (client_id, car_id, final_price, 'Completed'),
+        )
+        sell_id = cursor.lastrowid
+
+        if idempotency_key:
+            cursor.execute(
+                "update checkout_idempotency set Sell_id = %s, Total_value = %s where Idempotency_Key = %s",
+                (sell_id, final_price, idempotency_key),
+            )
+
+        if on_sold is not None:
+            on_sold(cursor, vehicle, sell_id)
+
+        conn.commit()
+        stats.count('succeeded')
+        return {
+            'sell_id': sell_id,
+            'car_id': car_id,
+            'final_price': final_price,
+            'replayed': False,
+        }
+
+
+def process_checkout(client_id, car_id, idempotency_key=None, on_sold=None,
+                     max_retries=CHECKOUT_MAX_RETRIES):
+    """
+    Sells car_id to client_id in one short transaction.
+
+    The vehicle is claimed with a conditional UPDATE (compare-and-set), so under
+    contention exactly one buyer wins and the others fail fast with
+    VehicleUnavailable instead of queueing on a FOR UPDATE lock. Deadlocks and
+    lock-wait timeouts are retried with jittered exponential backoff. With an
+    idempotency key, a repeated request returns the original sale instead of
+    selling again. on_sold(cursor, vehicle, sell_id) runs inside the transaction.
+    """
+    stats.count('attempts')
+    attempt = 0
+    while True:
+        try:
+            with get_db_connection() as conn:
+                return _attempt(conn, client_id, car_id, idempotency_key, on_sold)
+        except pymysql.err.OperationalError as e:
+            code = e.args[0] if e.args else None
+            if code not in RETRYABLE_ERRORS:
+                raise
+            stats.count('deadlocks' if code == ER_LOCK_DEADLOCK else 'lock_timeouts')
+            if attempt >= max_retries:
+                stats.count('gave_up')
+                raise
+            stats.count('retries')
+            _backoff(attempt)
+            attempt += 1
@@ -0,0 +1,165 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import threading
+import time
+
+from cache import make_etag, etag_matches
+from database import get_db_connection
+from search_index import normalize
+import serialization
+from settings import settings
+
+# Empresas com os dados do usuário dono da conta, em uma única leitura
+DIRECTORY_QUERY = """
+    select c.user_id, c.company_name, c.cnpj, u.email, u.name, u.Phone_Number as phone_number
+    from companies c
+    join users u on u.id = c.user_id
+    order by c.user_id
+"""
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Depois disso o snapshot é reconstruído mesmo sem invalidate() neste processo
+SNAPSHOT_MAX_AGE = settings.companies_snapshot_max_age
+
+
+def _api_row(row):
+    """Shape of GET /api/companies (CompanyResponse)."""
+    return {'user_id': row['user_id'], 'company_name': row['company_name'], 'cnpj': row['cnpj']}
+
+
+def _legacy_row(row):
+    """Shape of GET /companies/."""
+    return {
+        'id': row['user_id'],
+        'email': row['email'],
+        'name': row['name'],
+        'phone_number': row['phone_number'],
+        'company_name': row['company_name'],
+        'cnpj': row['cnpj'],
+    }
+
+
+class Snapshot:
+    """Immutable view of the directory at one version, with both full bodies pre-encoded."""
+
+    def __init__(self, version, rows, built_at):
+        self.version = version
+        self.built_at = built_at
+        self.built_monotonic = time.monotonic()
+        self.last_modified = format_datetime(built_at, usegmt=True)
+        self.api_rows = [_api_row(row) for row in rows]
+        self.ids = [row['user_id'] for row in rows]
+        self.bodies = {
+            'api': serialization.encode_rows(self.api_rows),
+            'legacy': serialization.encode_rows([_legacy_row(row) for row in rows]),
+        }
+        self.etags = {kind: make_etag(body) for kind, body in self.bodies.items()}
+        # (nome normalizado, posição) ordenado, para busca por prefixo com bisect
+        self.names = sorted((normalize(row['company_name'] or ''), index) for index, row in enumerate(rows))
+
+    def page(self, after, limit):
+        """Rows with user_id > after (keyset on the snapshot order) and the next cursor."""
+        start = bisect_right(self.ids, after) if after is not None else 0
+        rows = self.api_rows[start:start + limit]
+        has_more = start + limit < len(self.api_rows)
+        return rows, (str(rows[-1]['user_id']) if rows and has_more else None)
+
+    def search(self, prefix, limit):
+        """Companies whose normalized name starts with prefix, in name order."""
+        prefix = normalize(prefix)
+        start = bisect_left(self.names, (prefix,))
+        end = bisect_left(self.names, (prefix + '\uffff',))
+        return [self.api_rows[index] for _, index in self.names[start:end][:limit]]
+
+    def etag_for(self, *parts):
+        # Derivado do ETag da versão: 304 sem precisar reserializar a página
+        variant = make_etag(repr(parts).encode('utf-8'))[1:9]
+        return self.etags['api'][:-1] + '-' + variant + '"'
+
+    def not_modified(self, headers, etag):
+        """Conditional GET: If-None-Match wins; If-Modified-Since is only checked without it."""
+        if_none_match = headers.get("if-none-match")
+        if if_none_match:
+            return etag_matches(if_none_match, etag)
+        if_modified_since = headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return self.built_at.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def headers(self, etag):
+        return {"ETag": etag, "Last-Modified": self.last_modified, "Cache-Control": "no-cache"}
+
+
+class CompanyDirectory:
+    """
+    Versioned in-memory snapshot of every company, rebuilt only after the
+    write paths that change companies (register_user, update_user_profile)
+    mark it stale, or once it is older than max_age (writes made by other
+    workers or outside the API). Readers of a fresh snapshot never touch the
+    database; the first reader after a write rebuilds it once for everybody.
+    """
+
+    def __init__(self, max_age=SNAPSHOT_MAX_AGE):
+        self.max_age = max_age
+        self._snapshot = None
+        self._generation = 0
+        self._built_generation = -1
+        self._rebuild_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.stats = {'rebuilds': 0, 'invalidations': 0, 'expirations': 0}
+
+    def fresh(self):
+        """Current snapshot if it is up to date, else None (no database access)."""
+        snapshot = self._snapshot
+        if snapshot is None or self._built_generation != self._generation:
+            return None
+        if time.monotonic() - snapshot.built_monotonic > self.max_age:
+            return None
+        return snapshot
+
+    def current(self):
+        snapshot = self.fresh()
+        if snapshot is not None:
+            return snapshot
+        with self._rebuild_lock:
+            # Outro leitor pode ter reconstruído enquanto esperávamos o lock
+            snapshot = self.fresh()
+            if snapshot is not None:
+                return snapshot
+            generation = self._generation
+            if self._snapshot is not None and self._built_generation == generation:
+                self.stats['expirations'] += 1
+            # Sempre no primário: a reconstrução vem logo depois de uma escrita e
+            # uma réplica atrasada geraria um snapshot "novo" sem essa escrita
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(DIRECTORY_QUERY)
+                    rows = cursor.fetchall()
+            version = (self._snapshot.version + 1) if self._snapshot else 1
+            snapshot = Snapshot(version, rows, datetime.now(timezone.utc))
+            self._snapshot = snapshot
+            # Uma escrita durante a leitura deixa o snapshot marcado como velho
+            self._built_generation = generation
+            self.stats['rebuilds'] += 1
+            return snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self.stats['invalidations'] += 1
+
+    def snapshot(self):
+        data = dict(self.stats)
+        current = self._snapshot
+        data['version'] = current.version if current else 0
+        data['companies'] = len(current.ids) if current else 0
+        data['stale'] = self.fresh() is None
+        return data
+
+
+directory = CompanyDirectory()
@@ -1,19 +1,27 @@
 import pymysql.cursors # type: ignore
+import pymysql.connections # type: ignore
 from contextlib import contextmanager
-from dotenv import load_dotenv
-import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import functools
+import threading
+import asyncio
+import time
 
-load_dotenv()
+import metrics
+from settings import settings
 
-host = 'localhost'
-user = 'root'
-password = os.getenv("DB_PASSWORD")
-db = 'venda_carros'
+host = settings.db_host
+user = settings.db_user
+password = settings.db_password
+db = settings.db_name
 charset = 'utf8mb4'
 cursorclass = pymysql.cursors.DictCursor
 
 DB_CONFIG = {
-    'host': 'localhost',
+    'host': host,
+    'port': settings.db_port,
     'user': user,
     'password': password,
     'db': db,
@@ -21,13 +29,578 @@ DB_CONFIG = {
     'cursorclass': cursorclass
 }
 
+# Configuração do pool de conexões (pode ser ajustada pelo .env)
+POOL_MIN_SIZE = settings.db_pool_min_size
+POOL_MAX_SIZE = settings.db_pool_max_size
+POOL_TIMEOUT = settings.db_pool_timeout
+POOL_MAX_LIFETIME = settings.db_pool_max_lifetime
+POOL_MAX_IDLE = settings.db_pool_max_idle
+
+REPLICA_STRATEGY = settings.db_replica_strategy
+REPLICA_MAX_LAG = settings.db_replica_max_lag
+REPLICA_CHECK_INTERVAL = settings.db_replica_check_interval
+READ_YOUR_WRITES_SECONDS = settings.db_read_your_writes_seconds
+# Conexões de streaming (exports) abertas ao mesmo tempo, por processo
+STREAMING_MAX_CONNECTIONS = settings.export_max_concurrent
+
+
+class InstrumentedConnection(pymysql.connections.Connection):
+    """pymysql connection that reports the time of every statement to metrics."""
+
+    committed = False
+    is_replica = False
+
+    def query(self, sql, unbuffered=False):
+        started = time.perf_counter()
+        try:
+            return super().query(sql, unbuffered)
+        finally:
+            metrics.record_sql(sql, time.perf_counter() - started)
+
+    def commit(self):
+        super().commit()
+        # Lido pelo get_db_connection para ligar o read-your-writes do cliente
+        self.committed = True
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be checked out before the timeout."""
+
+
+class _PooledConnection:
+    __slots__ = ('connection', 'created_at', 'last_used')
+
+    def __init__(self, connection):
+        now = time.monotonic()
+        self.connection = connection
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of pymysql connections.
+
+    Connections are reused between requests instead of paying the TCP setup,
+    handshake and auth on every call. On checkout the connection is pinged
+    (reconnecting if needed); connections older than max_lifetime or idle for
+    longer than max_idle are closed. When all max_size connections are in use,
+    callers wait up to timeout seconds and then get a PoolTimeoutError.
+    """
+
+    def __init__(self, config, min_size=1, max_size=10, timeout=5.0,
+                 max_lifetime=1800.0, max_idle=300.0, connect=None):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.config = config
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self._connect = connect or (lambda: InstrumentedConnection(**self.config))
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        self.stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'created': 0,
+            'evictions': 0,
+            'reconnects': 0,
+        }
+
+    def _is_expired(self, entry, now):
+        return now - entry.created_at > self.max_lifetime
+
+    def _close(self, entry):
+        try:
+            entry.connection.close()
+        except Exception:
+            pass
+
+    def _evict_idle(self, now):
+        # Chamado com o lock adquirido; devolve as conexões que devem ser fechadas
+        evicted = []
+        kept = deque()
+        while self._idle:
+            entry = self._idle.popleft()
+            too_old = self._is_expired(entry, now)
+            too_idle = (now - entry.last_used > self.max_idle
+                        and self._size - len(evicted) > self.min_size)
+            if too_old or too_idle:
+                evicted.append(entry)
+            else:
+                kept.append(entry)
+        self._idle = kept
+        if evicted:
+            self._size -= len(evicted)
+            self.stats['evictions'] += len(evicted)
+            self._cond.notify(len(evicted))
+        return evicted
+
+    def _new_entry(self):
+        entry = _PooledConnection(self._connect())
+        with self._cond:
+            self.stats['created'] += 1
+        return entry
+
+    def warm(self):
+        """Opens connections until min_size are available."""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                entry = self._new_entry()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        entry = None
+        evicted = []
+        with self._cond:
+            while True:
+                evicted.extend(self._evict_idle(time.monotonic()))
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    for old in evicted:
+                        self._close(old)
+                    raise PoolTimeoutError(
+                        f"No database connection available after {self.timeout}s "
+                        f"(pool size {self.max_size})."
+                    )
+                if not waited:
+                    waited = True
+                    self.stats['waits'] += 1
+                self._cond.wait(remaining)
+            self.stats['checkouts'] += 1
+
+        for old in evicted:
+            self._close(old)
+
+        try:
+            if entry is None:
+                return self._new_entry()
+            # Health check: ping reconecta caso o servidor tenha derrubado a conexão
+            try:
+                entry.connection.ping(reconnect=True)
+            except Exception:
+                self._close(entry)
+                with self._cond:
+                    self.stats['reconnects'] += 1
+                return self._new_entry()
+            return entry
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, entry, discard=False):
+        now = time.monotonic()
+        if not discard:
+            try:
+                # Nunca devolve uma transação aberta para o pool
+                entry.connection.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            if discard or self._is_expired(entry, now):
+                self._size -= 1
+                if not discard:
+                    self.stats['evictions'] += 1
+                self._cond.notify()
+            else:
+                entry.last_used = now
+                self._idle.append(entry)
+                self._cond.notify()
+                entry = None
+        if entry is not None:
+            self._close(entry)
+
+    def close(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            self._close(entry)
+
+    @property
+    def in_use(self):
+        return self._size - len(self._idle)
+
+    def snapshot(self):
+        with self._cond:
+            data = dict(self.stats)
+            data['size'] = self._size
+            data['idle'] = len(self._idle)
+            data['in_use'] = self._size - len(self._idle)
+            data['max_size'] = self.max_size
+        return data
+
+
+pool = ConnectionPool(
+    DB_CONFIG,
+    min_size=POOL_MIN_SIZE,
+    max_size=POOL_MAX_SIZE,
+    timeout=POOL_TIMEOUT,
+    max_lifetime=POOL_MAX_LIFETIME,
+    max_idle=POOL_MAX_IDLE,
+)
+
+
+def _is_connection_error(e):
+    # Só erros de conexão (códigos 2xxx do cliente) invalidam a conexão;
+    # deadlock e lock wait timeout deixam a conexão utilizável
+    if isinstance(e, pymysql.err.InterfaceError):
+        return True
+    code = e.args[0] if e.args and isinstance(e.args[0], int) else None
+    return code is None or code >= 2000
+
+
+# Identifica o cliente da requisição atual (definido pela dependência db_session do main) para o read-your-writes
+session_key = contextvars.ContextVar("db_session_key", default=None)
+
+
+class Replica:
+    """A read replica: its own pool plus the last health/lag check."""
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.healthy = True
+        self.lag = None
+        self.last_error = None
+        self.last_check = None
+
+    def snapshot(self):
+        data = self.pool.snapshot()
+        data.update(name=self.name, healthy=self.healthy, lag=self.lag, last_error=self.last_error)
+        return data
+
+
+class ConnectionRouter:
+    """
+    Sends reads to the replicas and everything else to the primary.
+
+    Replicas are picked round-robin or by fewest connections in use, skipping
+    those that failed their last check or lag more than max_lag seconds
+    behind the primary; with none available reads go to the primary. After a
+    client commits on the primary its reads stay on the primary for
+    sticky_seconds (read-your-writes), keyed by session_key.
+    """
+
+    def __init__(self, primary, replicas=(), strategy=REPLICA_STRATEGY, max_lag=REPLICA_MAX_LAG,
+                 sticky_seconds=READ_YOUR_WRITES_SECONDS):
+        if strategy not in ('round_robin', 'least_connections'):
+            raise ValueError(f"Unknown replica strategy: {strategy}")
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self.sticky_seconds = sticky_seconds
+        self._next = 0
+        self._recent_writes = {}  # session key -> monotonic time of the last commit
+        self._lock = threading.Lock()
+        self.stats = {
+            'primary_reads': 0,
+            'replica_reads': 0,
+            'sticky_reads': 0,
+            'fallbacks': 0,
+            'replica_failures': 0,
+        }
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def count_read(self, primary):
+        self._count('primary_reads' if primary else 'replica_reads')
+
+    def note_write(self, key=None):
+        key = key if key is not None else session_key.get()
+        if key is None or not self.replicas:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._recent_writes[key] = now
+            if len(self._recent_writes) > 10_000:
+                # Limpa as janelas vencidas para o dicionário não crescer sem limite
+                self._recent_writes = {k: t for k, t in self._recent_writes.items()
+                                       if now - t < self.sticky_seconds}
+
+    def _is_sticky(self):
+        key = session_key.get()
+        if key is None:
+            return False
+        with self._lock:
+            written = self._recent_writes.get(key)
+        return written is not None and time.monotonic() - written < self.sticky_seconds
+
+    def _available(self):
+        return [replica for replica in self.replicas
+                if replica.healthy and (replica.lag is None or replica.lag <= self.max_lag)]
+
+    def choose_replica(self):
+        candidates = self._available()
+        if not candidates:
+            return None
+        if self.strategy == 'least_connections':
+            return min(candidates, key=lambda replica: replica.pool.in_use)
+        with self._lock:
+            self._next += 1
+            return candidates[self._next % len(candidates)]
+
+    def acquire_read(self):
+        """(replica, pooled entry) for a read, or (None, None) when it must go to the primary."""
+        if not self.replicas:
+            return None, None
+        if self._is_sticky():
+            self._count('sticky_reads')
+            return None, None
+        replica = self.choose_replica()
+        if replica is not None:
+            try:
+                return replica, replica.pool.acquire()
+            except Exception as e:
+                # Réplica fora do ar: marca e cai para o primário nesta leitura
+                self.mark_failed(replica, e)
+        self._count('fallbacks')
+        return None, None
+
+    def mark_failed(self, replica, error):
+        replica.healthy = False
+        replica.last_error = str(error)
+        self._count('replica_failures')
+
+    def check_replicas(self):
+        """Refreshes health and replication lag of every replica (blocking)."""
+        for replica in self.replicas:
+            try:
+                entry = replica.pool.acquire()
+                try:
+                    replica.lag = _replication_lag(entry.connection)
+                finally:
+                    replica.pool.release(entry)
+                replica.healthy = True
+                replica.last_error = None
+            except Exception as e:
+                self.mark_failed(replica, e)
+            replica.last_check = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.stats)
+        data['strategy'] = self.strategy
+        data['replicas'] = [replica.snapshot() for replica in self.replicas]
+        data['available_replicas'] = len(self._available())
+        return data
+
+    def close(self):
+        for replica in self.replicas:
+            replica.pool.close()
+
+
+def _replication_lag(connection):
+    """Seconds behind the source, 0 for a server that isn't replicating from anyone."""
+    with connection.cursor(pymysql.cursors.DictCursor) as cursor:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except pymysql.err.ProgrammingError:
+            # MySQL < 8.0.22
+            cursor.execute("SHOW SLAVE STATUS")
+        status = cursor.fetchone()
+    if not status:
+        return 0.0
+    lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+    if lag is None:
+        # Replicação parada: os dados podem estar arbitrariamente velhos
+        raise RuntimeError("replication is not running")
+    return float(lag)
+
+
+def _replica_config(address):
+    replica_host, _, replica_port = address.strip().partition(':')
+    return {**DB_CONFIG, 'host': replica_host, 'port': int(replica_port or 3306)}
+
+
+def _replica_connection(config):
+    connection = InstrumentedConnection(**config)
+    connection.is_replica = True
+    return connection
+
+
+def read_ttl(connection, ttl=None):
+    """
+    TTL for caching a result read through connection: results from a replica
+    may already be up to max_lag seconds old, so they are cached at most that long.
+    """
+    if not getattr(connection, 'is_replica', False):
+        return ttl
+    return REPLICA_MAX_LAG if ttl is None else min(ttl, REPLICA_MAX_LAG)
+
+
+router = ConnectionRouter(pool, [
+    Replica(address.strip(), ConnectionPool(
+        _replica_config(address),
+        connect=functools.partial(_replica_connection, _replica_config(address)),
+        min_size=0,
+        max_size=POOL_MAX_SIZE,
+        timeout=POOL_TIMEOUT,
+        max_lifetime=POOL_MAX_LIFETIME,
+        max_idle=POOL_MAX_IDLE,
+    ))
+    for address in settings.db_replicas.split(',') if address.strip()
+])
+
 @contextmanager
 def get_db_connection():
     #O contextmanager server para gerenciar a conexão com o banco de dados de forma segura
-    connection = None
+    #A conexão vem do pool (primário) e é devolvida (com rollback) ao sair do bloco
+    entry = pool.acquire()
+    broken = False
+    try:
+        yield entry.connection
+    except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+        broken = _is_connection_error(e)
+        raise
+    finally:
+        if getattr(entry.connection, 'committed', False):
+            entry.connection.committed = False
+            router.note_write()
+        pool.release(entry, discard=broken)
+
+
+@contextmanager
+def get_read_connection():
+    """
+    Connection for read-only work: a healthy replica when there is one,
+    the primary for a client inside its read-your-writes window or when no
+    replica is available. Never use it for writes or SELECT ... FOR UPDATE.
+    """
+    replica, entry = router.acquire_read()
+    if replica is None:
+        router.count_read(primary=True)
+        with get_db_connection() as connection:
+            yield connection
+        return
+
+    router.count_read(primary=False)
+    broken = False
+    try:
+        yield entry.connection
+    except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+        broken = _is_connection_error(e)
+        if broken:
+            router.mark_failed(replica, e)
+        raise
+    finally:
+        replica.pool.release(entry, discard=broken)
+
+
+# Executor dedicado às queries chamadas a partir de endpoints async. Com o tamanho máximo
+# do pool, no máximo POOL_MAX_SIZE delas rodam ao mesmo tempo e o excedente espera na fila
+# do executor. O pool é compartilhado com os endpoints síncronos e as tarefas de fundo,
+# então uma thread daqui ainda pode esperar por conexão (até POOL_TIMEOUT, depois PoolTimeoutError).
+db_executor = ThreadPoolExecutor(max_workers=POOL_MAX_SIZE, thread_name_prefix="db")
+
+async def run_db(func, *args, **kwargs):
+    """
+    Runs a blocking database function on the bounded db executor and awaits it,
+    so async endpoints don't freeze the event loop while pymysql waits on MySQL.
+    """
+    loop = asyncio.get_running_loop()
+    # Copia o contexto para as métricas da requisição enxergarem o tempo de SQL
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(db_executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+class StreamingSlots:
+    """
+    Bounds the unpooled streaming connections. acquire() never waits: it
+    returns a slot (release() is idempotent) or None when every slot is
+    taken, so the endpoint can answer 503 before it starts the response.
+    """
+
+    def __init__(self, limit=STREAMING_MAX_CONNECTIONS):
+        self.limit = limit
+        self.in_use = 0
+        self._lock = threading.Lock()
+        self.stats = {'acquired': 0, 'rejected': 0, 'max_in_use': 0}
+
+    def acquire(self):
+        with self._lock:
+            if self.in_use >= self.limit:
+                self.stats['rejected'] += 1
+                return None
+            self.in_use += 1
+            self.stats['acquired'] += 1
+            self.stats['max_in_use'] = max(self.stats['max_in_use'], self.in_use)
+        return _StreamingSlot(self)
+
+    def _release(self):
+        with self._lock:
+            self.in_use -= 1
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.stats)
+            data['in_use'] = self.in_use
+        data['limit'] = self.limit
+        return data
+
+
+class _StreamingSlot:
+    def __init__(self, owner):
+        self._owner = owner
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._owner._release()
+
+
+streaming_slots = StreamingSlots()
+
+
+@contextmanager
+def get_streaming_connection():
+    """
+    Dedicated (unpooled) connection with an unbuffered SSDictCursor, for
+    exports that stream large result sets row by row. If the client goes away
+    mid-stream, closing the socket is cheaper than draining the rest of the
+    result, so this connection is never returned to the pool. Exports are
+    pure reads, so it goes to a replica when one is available. Callers take
+    a streaming_slots slot first, which bounds how many of these exist.
+    """
+    replica = router.choose_replica()
+    config = replica.pool.config if replica is not None else DB_CONFIG
+    connection = InstrumentedConnection(**{**config, 'cursorclass': pymysql.cursors.SSDictCursor})
     try:
-        connection = pymysql.connect(**DB_CONFIG)
         yield connection
     finally:
-        if connection:
-            connection.close()
+        connection.close()
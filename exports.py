@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from database import get_streaming_connection
+
+# Linhas acumuladas por pedaço enviado ao cliente
+EXPORT_FLUSH_ROWS = 500
+
+# O que cada export lê. date_column/seller_column são None quando o filtro não se aplica.
+EXPORTS = {
+    'sells': {
+        'query': "select s.* from sells s join vehicles v on v.id = s.Car_id",
+        'date_column': 's.Purchase_Date',
+        'seller_column': 'v.Seller_ID',
+        'order_by': 's.id',
+    },
+    'vehicles': {
+        'query': "select v.* from vehicles v",
+        'date_column': None,
+        'seller_column': 'v.Seller_ID',
+        'order_by': 'v.id',
+    },
+    'llm_register': {
+        'query': "select l.* from llm_register l",
+        'date_column': 'l.Created_at',
+        'seller_column': None,
+        'order_by': 'l.id',
+    },
+}
+
+
+class ExportFilterError(ValueError):
+    """Raised when a filter is not supported by the requested export."""
+
+
+def build_export_query(table, date_from=None, date_to=None, seller_id=None):
+    spec = EXPORTS[table]
+    clauses = []
+    params = []
+    if date_from is not None or date_to is not None:
+        if spec['date_column'] is None:
+            raise ExportFilterError(f"The {table} export has no date filter.")
+        if date_from is not None:
+            clauses.append(f"{spec['date_column']} >= %s")
+            params.append(date_from)
+        if date_to is not None:
+            clauses.append(f"{spec['date_column']} <= %s")
+            params.append(date_to)
+    if seller_id is not None:
+        if spec['seller_column'] is None:
+            raise ExportFilterError(f"The {table} export has no seller filter.")
+        clauses.append(f"{spec['seller_column']} = %s")
+        params.append(seller_id)
+    query = spec['query']
+    if clauses:
+        query += " where " + " and ".join(clauses)
+    query += f" order by {spec['order_by']}"
+    return query, params
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return value
+
+
+def stream_export(query, params, fmt, slot=None):
+    """
+    Generator of encoded chunks. Rows come from an unbuffered server-side
+    cursor, so memory use doesn't depend on the table size. slot (from
+    database.streaming_slots) is released when the stream ends.
+    """
+    try:
+        yield from _stream_rows(query, params, fmt)
+    finally:
+        if slot is not None:
+            slot.release()
+
+
+def _stream_rows(query, params, fmt):
+    with get_streaming_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            columns = [column[0] for column in cursor.description]
+            buffer = io.StringIO()
+            writer = csv.writer(buffer) if fmt == 'csv' else None
+
+            if writer is not None:
+                writer.writerow(columns)
+                # Cabeçalho sai imediatamente, antes da primeira linha
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+
+            pending = 0
+            for row in cursor:
+                if writer is not None:
+                    writer.writerow([_plain(row[column]) for column in columns])
+                else:
+                    buffer.write(json.dumps({k: _plain(v) for k, v in row.items()}, ensure_ascii=False))
+                    buffer.write('\n')
+                pending += 1
+                if pending >= EXPORT_FLUSH_ROWS:
+                    yield buffer.getvalue().encode('utf-8')
+                    buffer.seek(0)
+                    buffer.truncate()
+                    pending = 0
+            if pending:
+                yield buffer.getvalue().encode('utf-8')
@@ -0,0 +1,88 @@
+import threading
+import time
+
+from settings import settings
+
+# Passos do startup sem os quais o worker não deve receber tráfego ('search_index'
+# inclui a matriz de similaridade, montada das mesmas linhas)
+REQUIRED_STEPS = ('database', 'schema', 'search_index', 'inventory', 'companies')
+# Tempo que o worker pode ficar sem ficar pronto (com os passos sendo repetidos) antes de falhar o liveness
+LIVENESS_DEADLINE = settings.startup_liveness_deadline
+
+
+class WorkerState:
+    """
+    Startup progress of this worker for the liveness/readiness probes.
+
+    Each startup step is recorded with its duration and error (if any). The
+    worker is ready once every required step succeeded, and warm once the
+    optional background steps (LLM SDK warm-up) finished as well. Failed
+    steps are retried in the background; a worker still not ready
+    liveness_deadline seconds after startup reports itself as not alive.
+    """
+
+    def __init__(self, required=REQUIRED_STEPS, liveness_deadline=LIVENESS_DEADLINE):
+        self.required = tuple(required)
+        self.liveness_deadline = liveness_deadline
+        self.created_at = time.monotonic()
+        self.started_at = None
+        self.shutting_down = False
+        self._steps = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def begin(self, name):
+        with self._lock:
+            self._pending.add(name)
+
+    def record(self, name, seconds, error=None):
+        with self._lock:
+            self._pending.discard(name)
+            attempts = self._steps.get(name, {}).get('attempts', 0) + 1
+            self._steps[name] = {
+                'ok': error is None,
+                'seconds': round(seconds, 4),
+                'error': str(error) if error is not None else None,
+                'attempts': attempts,
+            }
+
+    def mark_started(self):
+        self.started_at = time.monotonic()
+
+    @property
+    def ready(self):
+        with self._lock:
+            steps = dict(self._steps)
+        if self.started_at is None or self.shutting_down:
+            return False
+        return all(steps.get(name, {}).get('ok') for name in self.required)
+
+    @property
+    def alive(self):
+        # Pronto, ainda no startup ou dentro do prazo de novas tentativas
+        if self.started_at is None or self.shutting_down or self.ready:
+            return True
+        return time.monotonic() - self.started_at < self.liveness_deadline
+
+    @property
+    def warm(self):
+        with self._lock:
+            pending = bool(self._pending)
+        return self.ready and not pending
+
+    def snapshot(self):
+        with self._lock:
+            steps = {name: dict(step) for name, step in self._steps.items()}
+            pending = sorted(self._pending)
+        return {
+            'ready': self.ready,
+            'alive': self.alive,
+            'warm': self.warm,
+            'startup_seconds': round(self.started_at - self.created_at, 4) if self.started_at else None,
+            'uptime_seconds': round(time.monotonic() - self.created_at, 1),
+            'steps': steps,
+            'pending': pending,
+        }
+
+
+worker_state = WorkerState()
@@ -0,0 +1,170 @@
+import codecs
+import csv
+import json
+import uuid
+
+from pydantic import ValidationError
+
+from database import get_db_connection
+import seller_stats
+from settings import settings
+
+IMPORT_CHUNK_SIZE = settings.import_chunk_size
+MAX_CHUNK_SIZE = 5000
+# Limite do relatório de erros, para a memória não crescer com arquivos ruins
+MAX_REPORTED_ERRORS = 1000
+
+VEHICLE_INSERT_COLUMNS = (
+    "Seller_ID, Type_Seller, Mark, Model, Year, Mileage, Price, Fuel_type, Color, Status, description, Import_Batch"
+)
+_ROW_PLACEHOLDER = "(" + ", ".join(["%s"] * 12) + ")"
+
+# Marca as linhas de cada importação: os ids são relidos por ela, porque com
+# innodb_autoinc_lock_mode=2 um INSERT de várias linhas não recebe ids consecutivos
+IMPORT_BATCH_COLUMN = """
+ALTER TABLE vehicles
+    ADD COLUMN Import_Batch CHAR(32) NULL,
+    ADD KEY idx_vehicles_import_batch (Import_Batch)
+"""
+
+_SELECT_BATCH_IDS = "select id from vehicles where Import_Batch = %s and id >= %s order by id"
+
+
+class ImportFormatError(ValueError):
+    """
+    Raised when the uploaded file isn't valid CSV/NDJSON at all. report holds
+    what was already committed before the error (None if nothing was read).
+    """
+
+    def __init__(self, message, report=None):
+        super().__init__(message)
+        self.report = report
+
+
+def detect_format(filename, content_type, requested=None):
+    if requested:
+        return requested
+    name = (filename or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in (content_type or ''):
+        return 'ndjson'
+    return 'csv'
+
+
+def _iter_records(binary_file, fmt):
+    """Yields (line_number, dict) one record at a time, reading the file incrementally."""
+    text = codecs.getreader('utf-8-sig')(binary_file)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        if not reader.fieldnames:
+            raise ImportFormatError("CSV file has no header row.")
+        for record in reader:
+            # Campos vazios viram None (ex.: description opcional)
+            yield reader.line_num, {key: (value if value != '' else None) for key, value in record.items()}
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, e
+                continue
+            yield line_number, record
+    else:
+        raise ImportFormatError(f"Unsupported format '{fmt}'.")
+
+
+def _insert_chunk(chunk, batch):
+    """
+    Inserts one chunk as a single multi-row INSERT in its own transaction;
+    returns the new ids in the chunk's order.
+    """
+    query = (
+        f"insert into vehicles ({VEHICLE_INSERT_COLUMNS}) values "
+        + ", ".join([_ROW_PLACEHOLDER] * len(chunk))
+    )
+    params = []
+    for _, vehicle in chunk:
+        params.extend((
+            vehicle.seller_id, "Person", vehicle.mark, vehicle.model, vehicle.year, vehicle.mileage,
+            vehicle.price, vehicle.fuel_type, vehicle.color, vehicle.status, vehicle.description, batch,
+        ))
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            # lastrowid é o menor id deste INSERT; os chunks anteriores do lote ficaram abaixo dele
+            cursor.execute(_SELECT_BATCH_IDS, (batch, cursor.lastrowid))
+            ids = [row['id'] for row in cursor.fetchall()]
+            if len(ids) != len(chunk):
+                raise RuntimeError(f"Expected {len(chunk)} new vehicle ids, found {len(ids)}.")
+            listed = {}
+            for _, vehicle in chunk:
+                listed[vehicle.seller_id] = listed.get(vehicle.seller_id, 0) + 1
+            for seller_id, count in listed.items():
+                seller_stats.record_listed(cursor, seller_id, count)
+        conn.commit()
+    return ids
+
+
+def import_vehicles(binary_file, fmt, model, chunk_size=IMPORT_CHUNK_SIZE, on_inserted=None):
+    """
+    Streams vehicle records from a CSV/NDJSON file, validates each against
+    model (VehicleIn) and inserts valid rows in chunks of chunk_size.
+
+    Only one chunk is held in memory at a time. The rows are tagged with
+    an Import_Batch id and each chunk's ids are read back by it, so
+    on_inserted([(vehicle_id, vehicle)]) is called once per chunk, after it
+    commits.
+
+    If the file turns unreadable halfway, the rows not yet flushed are
+    dropped and ImportFormatError carries the report of the committed chunks.
+    """
+    report = {'inserted': 0, 'failed': 0, 'errors': [], 'errors_truncated': False}
+    batch = uuid.uuid4().hex
+
+    def record_error(line_number, message):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'line': line_number, 'error': message})
+        else:
+            report['errors_truncated'] = True
+
+    def flush(chunk):
+        try:
+            ids = _insert_chunk(chunk, batch)
+        except Exception as e:
+            for line_number, _ in chunk:
+                record_error(line_number, f"Database error: {e}")
+            return
+        report['inserted'] += len(chunk)
+        if on_inserted is not None:
+            on_inserted([(vehicle_id, vehicle) for vehicle_id, (_, vehicle) in zip(ids, chunk)])
+
+    chunk = []
+    try:
+        for line_number, record in _iter_records(binary_file, fmt):
+            if isinstance(record, Exception):
+                record_error(line_number, f"Invalid JSON: {record}")
+                continue
+            if not isinstance(record, dict):
+                record_error(line_number, "Record must be an object.")
+                continue
+            try:
+                chunk.append((line_number, model(**record)))
+            except ValidationError as e:
+                record_error(line_number, '; '.join(
+                    f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+                ))
+                continue
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+    except ImportFormatError as e:
+        raise ImportFormatError(str(e), report if report['inserted'] or report['failed'] else None)
+    except (UnicodeDecodeError, csv.Error) as e:
+        # O chunk pendente não é gravado: o que entrou é só o que já está no relatório
+        raise ImportFormatError(f"Could not read the file: {e}", report)
+
+    if chunk:
+        flush(chunk)
+    return report
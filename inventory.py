@@ -0,0 +1,293 @@
+import sys
+import threading
+
+import numpy as np
+
+import catalog
+
+# Faixas dos facets de ano (em anos) e de preço (limites inferiores; a última é aberta)
+YEAR_BUCKET = 5
+PRICE_EDGES = (0, 20000, 40000, 60000, 80000, 100000, 150000, 200000, 300000)
+
+INVENTORY_QUERY = (
+    "select id, Mark, Model, Year, Mileage, Price, Fuel_type, Color "
+    "from vehicles where Inventory_Status = 'Available'"
+)
+
+# Códigos de 16 bits bastam para marca/combustível/cor; modelo pode passar de 65 mil valores
+_CATEGORICAL = (
+    ('mark', 'Mark', np.uint16),
+    ('model', 'Model', np.uint32),
+    ('fuel_type', 'Fuel_type', np.uint16),
+    ('color', 'Color', np.uint16),
+)
+_NUMERIC = (('price', np.float64), ('year', np.int16), ('mileage', np.int32), ('id', np.int64))
+# Filtros que cada facet ignora ao contar (facet "disjuntivo": mostra as outras opções)
+_FACET_OWN_FILTERS = {
+    'Mark': ('mark', 'model'),
+    'Fuel_type': ('fuel_type',),
+    'Color': ('color',),
+    'year': ('min_year', 'max_year'),
+    'price': ('min_price', 'max_price'),
+}
+
+
+def _key(value):
+    return str(value or '').strip().lower()
+
+
+def _number(value, default=0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class _Dictionary:
+    """Dictionary encoding of a text column: normalized value -> small integer code."""
+
+    def __init__(self):
+        self.codes = {}
+        self.labels = []  # rótulo original (primeira grafia vista) por código
+
+    def encode(self, value):
+        key = _key(value)
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = len(self.labels)
+            self.labels.append(str(value or '').strip())
+        return code
+
+    def nbytes(self):
+        return (sys.getsizeof(self.codes) + sys.getsizeof(self.labels)
+                + sum(sys.getsizeof(label) * 2 for label in self.labels))
+
+
+class InventoryEngine:
+    """
+    Available vehicles kept as NumPy columns (price, year, mileage and
+    dictionary-encoded mark/model/fuel/color), so combined filters and facet
+    counts are answered with vectorized masks instead of GROUP BY queries.
+
+    Sold vehicles are only flagged dead (and compacted away once they are a
+    quarter of the rows); new ones are appended to arrays that grow by
+    doubling, so deltas are O(1) amortized.
+    """
+
+    def __init__(self, capacity=1024):
+        self._lock = threading.Lock()
+        self._reset(capacity)
+
+    def _reset(self, capacity):
+        self._size = 0
+        self._dead = 0
+        self._positions = {}  # vehicle id -> linha
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in _NUMERIC}
+        self._codes = {name: np.zeros(capacity, dtype=dtype) for name, _, dtype in _CATEGORICAL}
+        self._dicts = {name: _Dictionary() for name, _, _ in _CATEGORICAL}
+        self.version = 0
+
+    def __len__(self):
+        return self._size - self._dead
+
+    def _grow(self, needed):
+        capacity = len(self._alive)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+
+        def resized(array):
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            return grown
+
+        self._alive = resized(self._alive)
+        self._columns = {name: resized(array) for name, array in self._columns.items()}
+        self._codes = {name: resized(array) for name, array in self._codes.items()}
+
+    def _append(self, row):
+        vehicle_id = int(row['id'])
+        if vehicle_id in self._positions:
+            return
+        index = self._size
+        self._grow(index + 1)
+        self._alive[index] = True
+        self._columns['id'][index] = vehicle_id
+        self._columns['price'][index] = _number(row.get('Price'))
+        self._columns['year'][index] = int(_number(row.get('Year')))
+        self._columns['mileage'][index] = int(_number(row.get('Mileage')))
+        for name, column, _ in _CATEGORICAL:
+            self._codes[name][index] = self._dicts[name].encode(row.get(column))
+        self._positions[vehicle_id] = index
+        self._size += 1
+
+    def rebuild(self, rows):
+        # Monta as colunas inteiras de uma vez (carga do startup)
+        rows = list({int(row['id']): row for row in rows}.values())
+        count = len(rows)
+        with self._lock:
+            version = self.version
+            self._reset(max(1024, count))
+            self._columns['id'][:count] = [int(row['id']) for row in rows]
+            self._columns['price'][:count] = [_number(row.get('Price')) for row in rows]
+            self._columns['year'][:count] = [int(_number(row.get('Year'))) for row in rows]
+            self._columns['mileage'][:count] = [int(_number(row.get('Mileage'))) for row in rows]
+            for name, column, _ in _CATEGORICAL:
+                encode = self._dicts[name].encode
+                self._codes[name][:count] = [encode(row.get(column)) for row in rows]
+            self._alive[:count] = True
+            self._positions = {int(row['id']): index for index, row in enumerate(rows)}
+            self._size = count
+            self.version = version + 1
+
+    def add(self, row):
+        with self._lock:
+            self._append(row)
+            self.version += 1
+
+    def remove(self, vehicle_id):
+        with self._lock:
+            index = self._positions.pop(vehicle_id, None)
+            if index is None:
+                return
+            self._alive[index] = False
+            self._dead += 1
+            self.version += 1
+            if self._dead > 1024 and self._dead * 4 > self._size:
+                self._compact()
+
+    def _compact(self):
+        keep = np.flatnonzero(self._alive[:self._size])
+        for name in self._columns:
+            self._columns[name][:len(keep)] = self._columns[name][keep]
+        for name in self._codes:
+            self._codes[name][:len(keep)] = self._codes[name][keep]
+        self._alive[:len(keep)] = True
+        self._alive[len(keep):self._size] = False
+        self._size = len(keep)
+        self._dead = 0
+        self._positions = {int(vehicle_id): index for index, vehicle_id in enumerate(self._columns['id'][:self._size])}
+
+    def _masks(self, filters):
+        """One boolean mask per active (normalized) filter, over the used rows."""
+        n = self._size
+        masks = {}
+        for name, _, _ in _CATEGORICAL:
+            if name in filters:
+                code = self._dicts[name].codes.get(filters[name])
+                masks[name] = (self._codes[name][:n] == code) if code is not None else np.zeros(n, dtype=bool)
+        ranges = (
+            ('min_year', 'year', np.greater_equal),
+            ('max_year', 'year', np.less_equal),
+            ('min_price', 'price', np.greater_equal),
+            ('max_price', 'price', np.less_equal),
+            ('max_mileage', 'mileage', np.less_equal),
+        )
+        for key, column, compare in ranges:
+            if key in filters:
+                masks[key] = compare(self._columns[column][:n], float(filters[key]))
+        return masks
+
+    @staticmethod
+    def _combine(alive, masks, skip=()):
+        mask = alive.copy()
+        for key, partial in masks.items():
+            if key not in skip:
+                mask &= partial
+        return mask
+
+    def _dictionary_counts(self, name, mask):
+        counts = np.bincount(self._codes[name][:self._size][mask], minlength=len(self._dicts[name].labels))
+        labels = self._dicts[name].labels
+        ranked = sorted(((labels[code], int(count)) for code, count in enumerate(counts) if count),
+                        key=lambda item: (-item[1], item[0]))
+        return dict(ranked)
+
+    def _year_counts(self, mask):
+        years = self._columns['year'][:self._size][mask]
+        years = years[years > 0]
+        if not len(years):
+            return {}
+        starts = (years // YEAR_BUCKET) * YEAR_BUCKET
+        values, counts = np.unique(starts, return_counts=True)
+        return {f"{start}-{start + YEAR_BUCKET - 1}": int(count) for start, count in zip(values, counts)}
+
+    def _price_counts(self, mask):
+        prices = self._columns['price'][:self._size][mask]
+        buckets = np.searchsorted(PRICE_EDGES, prices, side='right') - 1
+        counts = np.bincount(buckets[buckets >= 0], minlength=len(PRICE_EDGES))
+        result = {}
+        for index, count in enumerate(counts):
+            if not count:
+                continue
+            low = PRICE_EDGES[index]
+            label = f"{low}-{PRICE_EDGES[index + 1]}" if index + 1 < len(PRICE_EDGES) else f"{low}+"
+            result[label] = int(count)
+        return result
+
+    def facets(self, filters):
+        """
+        Total of vehicles matching filters and facet counts by Mark, Fuel_type,
+        Color, year bucket and price bucket. Each facet ignores its own filter,
+        so the UI can show the alternatives to the current selection.
+        """
+        filters = catalog.normalize_filters(filters)
+        with self._lock:
+            alive = self._alive[:self._size]
+            masks = self._masks(filters)
+            selected = self._combine(alive, masks)
+            prices = self._columns['price'][:self._size][selected]
+            result = {
+                'total': int(selected.sum()),
+                'version': self.version,
+                'price_range': {'min': float(prices.min()), 'max': float(prices.max())} if len(prices) else None,
+                'facets': {
+                    'Mark': self._dictionary_counts('mark', self._combine(alive, masks, _FACET_OWN_FILTERS['Mark'])),
+                    'Fuel_type': self._dictionary_counts(
+                        'fuel_type', self._combine(alive, masks, _FACET_OWN_FILTERS['Fuel_type'])),
+                    'Color': self._dictionary_counts('color', self._combine(alive, masks, _FACET_OWN_FILTERS['Color'])),
+                    'year': self._year_counts(self._combine(alive, masks, _FACET_OWN_FILTERS['year'])),
+                    'price': self._price_counts(self._combine(alive, masks, _FACET_OWN_FILTERS['price'])),
+                },
+            }
+        return result
+
+    def memory(self):
+        with self._lock:
+            arrays = [self._alive, *self._columns.values(), *self._codes.values()]
+            array_bytes = sum(array.nbytes for array in arrays)
+            used_bytes = sum(array.itemsize * self._size for array in arrays)
+            dict_bytes = sum(d.nbytes() for d in self._dicts.values())
+            # Mapa id -> linha: entrada do dict mais os dois ints
+            position_bytes = sys.getsizeof(self._positions) + len(self._positions) * 2 * 28
+            vehicles = self._size - self._dead
+        total = array_bytes + dict_bytes + position_bytes
+        return {
+            'vehicles': vehicles,
+            'capacity': len(self._alive),
+            'dead_rows': self._dead,
+            'column_bytes_per_vehicle': round(used_bytes / self._size, 1) if self._size else 0.0,
+            'array_bytes': array_bytes,
+            'dictionary_bytes': dict_bytes,
+            'id_map_bytes': position_bytes,
+            'total_bytes': total,
+            'bytes_per_vehicle': round(total / vehicles, 1) if vehicles else 0.0,
+        }
+
+    def snapshot(self):
+        data = self.memory()
+        data['version'] = self.version
+        return data
+
+
+inventory = InventoryEngine()
+
+
+def load_inventory(conn):
+    """Rebuilds the global engine from the available vehicles in the database."""
+    with conn.cursor() as cursor:
+        cursor.execute(INVENTORY_QUERY)
+        inventory.rebuild(cursor.fetchall())
+    return len(inventory)
@@ -0,0 +1,331 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+import asyncio
+import re
+import threading
+import time
+
+from cache import TTLCache
+import metrics
+from search_index import normalize
+from settings import settings
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+# Chamadas ao provedor rodam em um executor próprio, fora do event loop
+LLM_WORKERS = settings.llm_workers
+
+
+def build_prompt(preferences):
+    return f"""
+        Você é um assistente de compra de carros.
+        Analise o pedido do usuário para sugerir até 10(ou se especificar a quantidade) modelos de carros no mercado brasileiro com uma breve justificativa para cada.
+        Pedido: '{preferences}'
+        Responda em português e de forma amigável.
+       """
+
+
+class LLMProvider:
+    """
+    Interface for the text-generation backend used by /suggest_car/.
+    Implementations must be safe to call concurrently.
+    """
+
+    model_name = None
+    # False enquanto o SDK ainda não foi importado/configurado (ver warm_up)
+    ready = True
+
+    def warm_up(self):
+        """Blocking one-time setup (SDK import, client); safe to call from a worker thread."""
+
+    async def generate(self, prompt):
+        raise NotImplementedError
+
+    async def stream(self, prompt):
+        """Yields the answer in chunks; providers without streaming send it in one piece."""
+        yield await self.generate(prompt)
+
+
+class GeminiProvider(LLMProvider):
+    """
+    Google Gemini client, configured and built once and reused by every request.
+
+    The SDK is heavy to import, so it is only loaded by warm_up() (started in
+    the background after startup) or by the first call, in the provider's
+    executor and never on the event loop.
+    """
+
+    def __init__(self, api_key, model_name=DEFAULT_MODEL, workers=LLM_WORKERS):
+        self.model_name = model_name
+        self._api_key = api_key
+        self._model = None
+        self._init_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm")
+
+    @property
+    def ready(self):
+        return self._model is not None
+
+    def _client(self):
+        if self._model is None:
+            with self._init_lock:
+                if self._model is None:
+                    import google.generativeai as genai
+
+                    genai.configure(api_key=self._api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def warm_up(self):
+        self._client()
+
+    async def generate(self, prompt):
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(self._executor, lambda: self._client().generate_content(prompt))
+        return response.text
+
+    async def stream(self, prompt):
+        # O SDK entrega um iterador bloqueante; uma thread do executor consome
+        # os chunks e os repassa para o event loop por uma fila
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        done = object()
+        # Sinalizado quando o consumidor para (cliente desconectou): a thread deixa de puxar tokens
+        cancel = threading.Event()
+
+        def put(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                pass  # event loop já encerrado
+
+        def produce():
+            try:
+                for chunk in self._client().generate_content(prompt, stream=True):
+                    if cancel.is_set():
+                        break
+                    if chunk.text:
+                        put(chunk.text)
+            except Exception as e:
+                put(e)
+            finally:
+                put(done)
+
+        loop.run_in_executor(self._executor, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            cancel.set()
+
+
+class FakeProvider(LLMProvider):
+    """
+    Local stand-in for tests and benchmarks: answers after a fixed latency
+    without any network call and counts how many upstream calls were made.
+    """
+
+    def __init__(self, latency=0.0, answer=None, model_name="fake-llm", token_delay=0.0):
+        self.model_name = model_name
+        self.latency = latency
+        self.token_delay = token_delay
+        self.answer = answer or (lambda prompt: f"Sugestões para: {prompt.strip()}")
+        self.calls = 0
+
+    async def generate(self, prompt):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.answer(prompt)
+
+    async def stream(self, prompt):
+        # Gerador de tokens local: latência até o primeiro token e um atraso por palavra
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for token in re.findall(r"\S+\s*", self.answer(prompt)):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield token
+
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_preferences(preferences):
+    """Accent-folded, lowercase, punctuation-free form used as the cache key."""
+    return ' '.join(_WORD_RE.findall(normalize(preferences)))
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class SuggestionService:
+    """
+    Caches LLM suggestions by normalized preferences and coalesces concurrent
+    identical requests into a single upstream call.
+
+    With similarity_threshold set, a miss also looks for a cached prompt whose
+    word set has Jaccard similarity >= threshold (e.g. 0.8).
+    """
+
+    def __init__(self, provider, cache=None, similarity_threshold=None):
+        self.provider = provider
+        self.cache = cache or TTLCache(max_entries=1024, ttl=3600.0)
+        self.similarity_threshold = similarity_threshold
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'upstream_calls': 0,
+            'cache_hits': 0,
+            'similar_hits': 0,
+            'coalesced': 0,
+            'errors': 0,
+            'streams': 0,
+            'stream_ttfb_seconds': 0.0,
+            'stream_total_seconds': 0.0,
+            'stream_ttfb_max': 0.0,
+            'stream_total_max': 0.0,
+        }
+
+    @property
+    def model_name(self):
+        return self.provider.model_name
+
+    def _find_similar(self, key):
+        words = set(key.split())
+        best_key, best_score = None, 0.0
+        for candidate in self.cache.keys():
+            if candidate[0] != self.model_name:
+                continue
+            score = _jaccard(words, set(candidate[1].split()))
+            if score > best_score:
+                best_key, best_score = candidate, score
+        if best_key is not None and best_score >= self.similarity_threshold:
+            return self.cache.get(best_key)
+        return None
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    async def suggest(self, preferences):
+        key = (self.model_name, normalize_preferences(preferences))
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._count('cache_hits')
+            return cached
+
+        if self.similarity_threshold:
+            similar = self._find_similar(key[1])
+            if similar is not None:
+                self._count('similar_hits')
+                return similar
+
+        # Coalescing: quem chegar com o mesmo pedido espera a mesma chamada
+        task = self._inflight.get(key)
+        if task is not None:
+            self._count('coalesced')
+        else:
+            # A chamada roda numa task própria: se o cliente que a iniciou desconectar,
+            # só a espera dele é cancelada e os demais recebem a resposta normalmente
+            task = asyncio.get_running_loop().create_task(self._fetch(key, preferences))
+            # Evita o aviso de "exception was never retrieved" quando ninguém mais espera
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key, preferences):
+        try:
+            self._count('upstream_calls')
+            llm_started = time.perf_counter()
+            try:
+                text = await self.provider.generate(build_prompt(preferences))
+            finally:
+                metrics.record_llm(time.perf_counter() - llm_started)
+            self.cache.set(key, text, size=len(text))
+            return text
+        except Exception:
+            self._count('errors')
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def stream(self, preferences):
+        """
+        Yields the suggestion in chunks as the provider produces them and
+        caches the full text when it completes. A cached answer is sent as a
+        single chunk. Streams are not coalesced. Closing this generator
+        closes the provider stream, which stops pulling tokens.
+        """
+        key = (self.model_name, normalize_preferences(preferences))
+        started = time.perf_counter()
+        first_chunk_at = None
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._count('cache_hits')
+            chunks = None
+        else:
+            self._count('upstream_calls')
+            chunks = []
+
+        try:
+            if chunks is None:
+                first_chunk_at = time.perf_counter()
+                yield cached
+            else:
+                async with aclosing(self.provider.stream(build_prompt(preferences))) as stream:
+                    async for chunk in stream:
+                        if first_chunk_at is None:
+                            first_chunk_at = time.perf_counter()
+                        chunks.append(chunk)
+                        yield chunk
+                text = ''.join(chunks)
+                self.cache.set(key, text, size=len(text))
+        except Exception:
+            self._count('errors')
+            raise
+        finally:
+            finished = time.perf_counter()
+            ttfb = (first_chunk_at or finished) - started
+            if chunks is not None:
+                metrics.record_llm(finished - started)
+            with self._lock:
+                self.stats['streams'] += 1
+                self.stats['stream_ttfb_seconds'] += ttfb
+                self.stats['stream_total_seconds'] += finished - started
+                self.stats['stream_ttfb_max'] = max(self.stats['stream_ttfb_max'], ttfb)
+                self.stats['stream_total_max'] = max(self.stats['stream_total_max'], finished - started)
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.stats)
+        if data['streams']:
+            data['stream_ttfb_avg'] = data['stream_ttfb_seconds'] / data['streams']
+            data['stream_total_avg'] = data['stream_total_seconds'] / data['streams']
+        data['model'] = self.model_name
+        data['cache'] = self.cache.snapshot()
+        data['inflight'] = len(self._inflight)
+        return data
+
+
+def create_provider(api_key, model_name=DEFAULT_MODEL):
+    """LLM_PROVIDER=fake selects the local fake provider (benchmarks, offline dev)."""
+    if settings.llm_provider.lower() == "fake":
+        return FakeProvider(
+            latency=settings.llm_fake_latency,
+            token_delay=settings.llm_fake_token_delay,
+        )
+    if not api_key:
+        return None
+    return GeminiProvider(api_key, model_name)
@@ -1,21 +1,208 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, File, Header, Query, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
-from database import get_db_connection
-import bcrypt # type: ignore
-import os
+from database import get_db_connection, get_read_connection, read_ttl, run_db, pool as db_pool, router as db_router
+from database import session_key as db_session_key, streaming_slots, REPLICA_CHECK_INTERVAL
+from passwords import password_hasher
+import catalog
+from search_index import search_index, load_search_index
+from inventory import inventory, load_inventory
+from similarity import similarity_index
+from changefeed import changefeed, change_writer, CHANGEFEED_POLL_INTERVAL
+import photos
+from photos import photo_store
+from cache import TTLCache, make_etag, etag_matches
+from settings import settings
+from health import worker_state
+from llm import SuggestionService, create_provider
+from audit import llm_log_writer
+import checkout as checkout_engine
+import profiles
+import imports
+import exports
+import seller_stats
+import schema
+import companies
+from companies import directory as company_directory
+import serialization
+from ratelimit import login_guard, client_ip, RateLimitExceeded, retry_after_header
+import asyncio
+import metrics
+import time
+from contextlib import aclosing, asynccontextmanager
 import pymysql # type: ignore
-from dotenv import load_dotenv
-import google.generativeai as genai
 from datetime import datetime
 from decimal import Decimal
+import json
 from starlette import status
+from starlette.background import BackgroundTask
 
-load_dotenv()
-api_key = os.getenv("OPENAI_API_KEY")
 
-app = FastAPI()
+# Cache das respostas da listagem de veículos (TTL + LRU + limite de memória)
+listing_cache = TTLCache(
+    max_entries=settings.listing_cache_max_entries,
+    ttl=settings.listing_cache_ttl,
+    max_bytes=settings.listing_cache_max_bytes,
+)
+
+# Cliente da LLM criado uma única vez (o SDK só é importado no warm-up ou no
+# primeiro uso); respostas em cache por preferência normalizada
+_llm_provider = create_provider(settings.openai_api_key)
+suggestion_service = SuggestionService(
+    _llm_provider,
+    cache=TTLCache(
+        max_entries=settings.llm_cache_max_entries,
+        ttl=settings.llm_cache_ttl,
+        max_bytes=settings.llm_cache_max_bytes,
+    ),
+    similarity_threshold=settings.llm_cache_similarity or None,
+) if _llm_provider else None
+
+async def _startup_step(name, func):
+    # Cada passo roda fora do event loop; falhas ficam registradas para o /health/ready
+    worker_state.begin(name)
+    started = time.perf_counter()
+    try:
+        await run_db(func)
+    except Exception as e:
+        worker_state.record(name, time.perf_counter() - started, e)
+        print(f"Warning: startup step '{name}' failed: {e}")
+        return False
+    worker_state.record(name, time.perf_counter() - started)
+    return True
+
+async def _retry_startup_steps(failed):
+    # Repete os passos que falharam, na ordem original (o índice depende do banco),
+    # com backoff exponencial até todos passarem; o worker fica pronto quando terminar
+    delay = settings.startup_retry_initial
+    while failed:
+        await asyncio.sleep(delay)
+        remaining = []
+        for name, func in failed:
+            if not await _startup_step(name, func):
+                remaining.append((name, func))
+        failed = remaining
+        delay = min(delay * 2, settings.startup_retry_max)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    llm_log_writer.start()
+    change_writer.start()
+    
+    def _load_indexes():
+        with get_db_connection() as conn:
+            loaded = load_search_index(conn)
+        # Vetores de similaridade montados a partir das linhas recém-carregadas: no mesmo
+        # passo, para uma nova tentativa do índice refazer também a similaridade
+        similarity_index.rebuild(search_index.rows())
+        return loaded
+    
+    def _load_inventory():
+        with get_db_connection() as conn:
+            return load_inventory(conn)
+    
+    def _load_photos():
+        with get_db_connection() as conn:
+            return photo_store.load(conn)
+    
+    startup_steps = [
+        # Abre as conexões mínimas do pool antes de receber requisições
+        ('database', db_pool.warm),
+        # Tabelas que o cadastro, a importação e o checkout usam (cria se faltarem)
+        ('schema', schema.ensure_schema),
+        # Últimos eventos do feed de mudanças, para quem reconecta logo após o deploy
+        ('changefeed', changefeed.poll),
+        ('search_index', _load_indexes),
+        ('inventory', _load_inventory),
+        ('companies', company_directory.current),
+        # Fotos cujas variantes não ficaram prontas voltam para a fila
+        ('photos', _load_photos),
+    ]
+    failed_steps = []
+    for name, func in startup_steps:
+        if not await _startup_step(name, func):
+            failed_steps.append((name, func))
+    
+    async def _warm_llm():
+        # Importa o SDK da LLM em segundo plano: o worker já atende enquanto isso
+        worker_state.begin('llm')
+        started = time.perf_counter()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, _llm_provider.warm_up)
+        except Exception as e:
+            worker_state.record('llm', time.perf_counter() - started, e)
+            print(f"Warning: LLM warm-up failed: {e}")
+        else:
+            worker_state.record('llm', time.perf_counter() - started)
+    
+    async def _reconcile_seller_stats():
+        # Corrige periodicamente qualquer diferença entre os contadores e as vendas reais;
+        # só o worker que segura o lock nomeado roda o GROUP BY
+        while True:
+            await asyncio.sleep(seller_stats.SELLER_STATS_RECONCILE_INTERVAL)
+            try:
+                if await run_db(seller_stats.reconcile_lock.acquire):
+                    await run_db(seller_stats.reconcile)
+            except Exception as e:
+                print(f"Warning: seller stats reconciliation failed: {e}")
+    
+    async def _check_replicas():
+        # Atualiza saúde e atraso das réplicas; as que falham ou atrasam saem do rodízio
+        while True:
+            try:
+                await run_db(db_router.check_replicas)
+            except Exception as e:
+                print(f"Warning: replica health check failed: {e}")
+            await asyncio.sleep(REPLICA_CHECK_INTERVAL)
+    
+    async def _follow_changes():
+        # Lê em inventory_changes os eventos de todos os workers e acorda os assinantes deste
+        while True:
+            try:
+                await run_db(changefeed.poll)
+            except Exception as e:
+                print(f"Warning: change feed poll failed: {e}")
+            await asyncio.sleep(CHANGEFEED_POLL_INTERVAL)
+    
+    # Assinantes do feed de mudanças esperam neste loop; o heartbeat mantém as conexões vivas
+    changefeed.bind(asyncio.get_running_loop())
+    background = [
+        asyncio.create_task(_reconcile_seller_stats()),
+        asyncio.create_task(changefeed.heartbeat()),
+        asyncio.create_task(_follow_changes()),
+    ]
+    if db_router.replicas:
+        background.append(asyncio.create_task(_check_replicas()))
+    if _llm_provider is not None and settings.llm_warmup:
+        background.append(asyncio.create_task(_warm_llm()))
+    if failed_steps:
+        background.append(asyncio.create_task(_retry_startup_steps(failed_steps)))
+    worker_state.mark_started()
+    yield
+    worker_state.shutting_down = True
+    for task in background:
+        task.cancel()
+    # Grava o que ainda estiver na fila de auditoria antes de fechar o pool
+    llm_log_writer.close()
+    change_writer.close()
+    password_hasher.shutdown()
+    photo_store.shutdown()
+    seller_stats.reconcile_lock.release()
+    db_router.close()
+    db_pool.close()
+
+async def db_session(request: Request):
+    """
+    Chave do read-your-writes: as leituras deste cliente logo após um commit vão ao primário.
+    Dependência (e não middleware) porque só depois do roteamento se conhece o usuário:
+    sem autenticação nesta API, é o {user_id} das rotas de perfil; nas demais, o IP.
+    """
+    user_id = request.path_params.get('user_id')
+    db_session_key.set(f"user:{user_id}" if user_id is not None else f"ip:{client_ip(request)}")
+
+app = FastAPI(lifespan=lifespan, dependencies=[Depends(db_session)])
 
 origins = [
     "http://localhost:3000",
@@ -30,8 +217,47 @@ app.add_middleware(
     allow_credentials=True, # Permite cookies, headers de autorização, etc.
     allow_methods=["*"],    # Permite todos os métodos (GET, POST, PUT, DELETE, etc.)
     allow_headers=["*"],    # Permite todos os headers
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified"], # Cursor da próxima página e validadores de cache
 )
 
+class MetricsMiddleware:
+    """
+    Latência por rota + tempo de SQL, nº de queries, bcrypt e LLM da requisição.
+    ASGI puro: as respostas em streaming (SSE, exportações) passam direto, sem o
+    buffer e a task extra do BaseHTTPMiddleware; a latência vale até os headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        data = metrics.start_request()
+        started = time.perf_counter()
+        recorded = False
+
+        def record(status_code):
+            nonlocal recorded
+            if recorded:
+                return
+            recorded = True
+            route_path = getattr(scope.get("route"), "path", "unmatched")
+            metrics.finish_request(data, scope["method"], route_path, status_code, time.perf_counter() - started)
+
+        async def send_with_metrics(message):
+            if message["type"] == "http.response.start":
+                record(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            record(500)
+
+app.add_middleware(MetricsMiddleware)
+
 class UserIn(BaseModel):
     name: str
     email:str
@@ -81,10 +307,77 @@ class VehicleResponse(BaseModel):
     Status: str
     Description: Optional[str] = None
     Inventory_Status: str
+    Thumbnails: List[str] = []
     
     class Config:
         from_attributes = True 
 
+class SimilarVehicleResponse(VehicleResponse):
+    Similarity: float
+
+
+def _vehicles_added(rows, publish=True):
+    """Atualiza as estruturas em memória depois que veículos são cadastrados (após o commit)."""
+    for row in rows:
+        search_index.add(row)
+        inventory.add(row)
+        similarity_index.add(row)
+        if publish:
+            changefeed.added(row)
+    # Só invalida as listagens cujos filtros incluiriam algum carro novo (uma passada por lote)
+    listing_cache.invalidate_where(
+        lambda key, entry: any(catalog.matches_filters(row, entry['filters']) for row in rows))
+
+def _vehicle_added(row):
+    _vehicles_added([row])
+
+def _vehicle_sold(car_id, publish=True):
+    """Atualiza as estruturas em memória depois que um veículo é vendido (após o commit)."""
+    search_index.remove(car_id)
+    inventory.remove(car_id)
+    similarity_index.remove(car_id)
+    if publish:
+        changefeed.sold(car_id)
+    # Com keyset, só as páginas que continham o carro mudam
+    listing_cache.invalidate_where(lambda key, entry: car_id in entry['ids'])
+
+def _apply_remote_changes(events):
+    """
+    Aplica nas estruturas em memória os eventos gravados por outros workers
+    (o worker que tratou a escrita já aplicou e não republica).
+    """
+    added = []
+    for kind, data in events:
+        if kind == 'added':
+            # O JSON traz o preço como texto; os índices comparam Decimal
+            added.append({**data, 'Price': Decimal(str(data['Price']))})
+        elif kind == 'sold':
+            # Mantém a ordem: cadastros anteriores entram antes da venda
+            if added:
+                _vehicles_added(added, publish=False)
+                added = []
+            _vehicle_sold(data['id'], publish=False)
+        elif kind == 'email_known':
+            login_guard.forget_unknown(data['email'])
+    if added:
+        _vehicles_added(added, publish=False)
+
+changefeed.on_remote = _apply_remote_changes
+
+def _email_registered(email):
+    """
+    Email que passou a existir (cadastro ou troca no perfil): sai do cache
+    negativo do login aqui e, pelo feed, nos outros workers.
+    """
+    login_guard.forget_unknown(email)
+    changefeed.email_known(email)
+
+def _photo_ready(vehicle_id):
+    """Chamado quando as variantes de uma foto ficam prontas (miniatura nova na listagem)."""
+    listing_cache.invalidate_where(lambda key, entry: vehicle_id in entry['ids'])
+
+photo_store.on_ready = _photo_ready
+
 class CompanyResponse(BaseModel):
     user_id: int
     company_name: str
@@ -101,18 +394,107 @@ class SearchLLM(BaseModel):
     preferences: str
     
     
+@app.get("/health/live")
+def liveness():
+    """
+    Liveness: o processo está de pé e o event loop responde. Falha (503) quando
+    os passos obrigatórios do startup seguem falhando além do prazo
+    (STARTUP_LIVENESS_DEADLINE), para o orquestrador reiniciar o worker.
+    """
+    if not worker_state.alive:
+        return JSONResponse({"status": "startup failed", "steps": worker_state.snapshot()['steps']},
+                            status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+def readiness():
+    """
+    Readiness: 200 quando o pool, as tabelas obrigatórias, o índice de busca (e a matriz de similaridade), o motor de facets e o diretório de empresas
+    estão prontos (503 antes disso ou durante o shutdown). "warm" indica que
+    também o warm-up em segundo plano da LLM terminou.
+    """
+    data = worker_state.snapshot()
+    if suggestion_service is not None:
+        data['llm_ready'] = _llm_provider.ready
+    status_code = status.HTTP_200_OK if data['ready'] else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(data, status_code=status_code)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """
+    Métricas no formato de texto do Prometheus: histogramas por rota e por query,
+    mais os contadores do pool, do bcrypt, dos caches e do checkout.
+    """
+    sources = [
+        ("db_pool", "Database connection pool counter.", db_pool.snapshot),
+        ("db_router", "Read/write router counter.", db_router.snapshot),
+        ("db_streaming", "Streaming (export) connection slots.", streaming_slots.snapshot),
+        ("password_hasher", "Password hashing pool counter.", password_hasher.snapshot),
+        ("listing_cache", "Vehicle listing cache counter.", listing_cache.snapshot),
+        ("profile_cache", "Profile cache counter.", profiles.profile_cache.snapshot),
+        ("checkout", "Checkout engine counter.", checkout_engine.stats.snapshot),
+        ("audit_llm_register", "llm_register audit queue counter.", llm_log_writer.snapshot),
+        ("login_guard", "Login rate limiter counter.", login_guard.snapshot),
+        ("company_directory", "Companies directory snapshot counter.", company_directory.snapshot),
+        ("inventory", "Columnar inventory engine size.", inventory.snapshot),
+        ("similarity_index", "Similar-vehicles index size.", similarity_index.snapshot),
+        ("photos", "Photo upload and variant pool counter.", photo_store.snapshot),
+        ("changefeed", "Inventory change feed counter.", changefeed.snapshot),
+    ]
+    if suggestion_service is not None:
+        sources.append(("llm_suggestions", "LLM suggestion service counter.", suggestion_service.snapshot))
+    return PlainTextResponse(metrics.render(sources), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/db/pool")
+def db_pool_stats():
+    """
+    Retorna os contadores do pool de conexões (checkouts, waits, evictions...).
+    """
+    return db_pool.snapshot()
+
+@app.get("/api/db/replicas")
+def db_replica_stats():
+    """
+    Retorna o estado das réplicas de leitura (saúde, atraso, pool) e os
+    contadores do roteador (leituras no primário/réplicas, fallbacks...).
+    """
+    return db_router.snapshot()
+
+@app.get("/api/auth/hasher")
+def password_hasher_stats():
+    """
+    Retorna as métricas do pool de hashing (fila, latência média, rehashes).
+    """
+    return password_hasher.snapshot()
+
+@app.get("/api/auth/rate-limit")
+def login_guard_stats():
+    """
+    Retorna os contadores do rate limit de login (aceitas, rejeitadas por IP/email...).
+    """
+    return login_guard.snapshot()
+
+@app.get("/api/vehicles/cache")
+def listing_cache_stats():
+    """
+    Retorna os contadores do cache da listagem (hits, misses, evictions...).
+    """
+    return listing_cache.snapshot()
+
 @app.post("/register/")
-def register_user(user: UserIn):
+async def register_user(user: UserIn):
     
     if len(user.password) < 6:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Type a password with 6 or more characters")
     
-    hashed_password = bcrypt.hashpw(user.password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
     phone_number_request = user.phone_number
     
     if len(phone_number_request) != 10 or phone_number_request.isdigit() is False:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Please type a valid phone number.")
     
+    # O bcrypt roda no pool dedicado, sem ocupar o threadpool das requisições
+    hashed_password = await password_hasher.hash(user.password)
+    
     query_user = """
         insert into users (name, email, Password_hash, users.Account_Type, users.Phone_Number)
         values (%s, %s, %s, %s, %s)
@@ -130,7 +512,7 @@ def register_user(user: UserIn):
         values (%s, %s, %s)
     """
     
-    try:
+    def _insert_user():
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(query_user, users_data)
@@ -149,6 +531,13 @@ def register_user(user: UserIn):
                     cursor.execute(query_company, company_data)
                     
                 conn.commit()
+                return new_user_id
+    
+    try:
+        new_user_id = await run_db(_insert_user)
+        _email_registered(user.email)
+        if user.account_type == 'Company':
+            company_directory.invalidate()
         return {
             'Message': 'User succefully registered.', 
             'User_ID': new_user_id,
@@ -162,13 +551,27 @@ def register_user(user: UserIn):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"The user couldn't be register: {e}")  
     
+async def _enforce_login_limits(action, email, request):
+    """Token buckets por IP e por email; barra o excesso antes de qualquer DB ou bcrypt."""
+    try:
+        await login_guard.check(action, email, client_ip(request))
+    except RateLimitExceeded as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e),
+                            headers=retry_after_header(e))
+
 @app.post("/login/")
-def login(user_credentials: UserLogin):
+async def login(user_credentials: UserLogin, request: Request):
     """
     Autentica o usuário pelo email e senha (hashing).
     Retorna User_ID e Account_Type se o login for bem-sucedido.
+    Tentativas em excesso por IP ou por email recebem 429 com Retry-After.
     """
     
+    await _enforce_login_limits("login", user_credentials.email, request)
+    # Email que acabou de se mostrar inexistente: responde sem ir ao banco
+    if login_guard.is_unknown(user_credentials.email):
+        raise HTTPException(status_code=401, detail="Invalid credentials.")
+    
     # 1. Busca o usuário e o HASH da senha
     query = """
     SELECT id, email, Password_hash, Account_Type FROM users WHERE email = %s
@@ -178,23 +581,41 @@ def login(user_credentials: UserLogin):
     account_type = None
     stored_hash = None 
     
-    try:
+    def _find_user():
         with get_db_connection() as conn:
             with conn.cursor(pymysql.cursors.DictCursor) as cursor:
                 cursor.execute(query, (user_credentials.email,))
-                user_found = cursor.fetchone()
+                return cursor.fetchone()
+    
+    def _update_hash(new_hash):
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("UPDATE users SET Password_hash = %s WHERE id = %s", (new_hash, user_id))
+                conn.commit()
+    
+    try:
+        user_found = await run_db(_find_user)
                 
-                if user_found:
-                    user_id = user_found['id']
-                    account_type = user_found['Account_Type']
-                    stored_hash = user_found['Password_hash']
-                else:
-                    raise HTTPException(status_code=401, detail="Invalid credentials.")
+        if user_found:
+            user_id = user_found['id']
+            account_type = user_found['Account_Type']
+            stored_hash = user_found['Password_hash']
+        else:
+            login_guard.remember_unknown(user_credentials.email)
+            raise HTTPException(status_code=401, detail="Invalid credentials.")
         
         # 2. COMPARAÇÃO USANDO BCRYPT (COMPARANDO HASHES)
         # Se você está usando Password_hash, o bcrypt.checkpw é obrigatório.
-        if not bcrypt.checkpw(user_credentials.password.encode('utf-8'), stored_hash.encode('utf-8')):
+        if not await password_hasher.verify(user_credentials.password, stored_hash):
              raise HTTPException(status_code=401, detail="Invalid credentials.")
+        
+        # Se o hash foi gerado com outro custo, aproveita a senha em texto para regravar
+        if password_hasher.needs_rehash(stored_hash):
+            try:
+                await run_db(_update_hash, await password_hasher.hash(user_credentials.password))
+                password_hasher.record_rehash()
+            except Exception as e:
+                print(f"Warning: Fail to rehash password for user {user_id}: {e}")
 
         # 3. Retorna sucesso
         return {
@@ -210,11 +631,17 @@ def login(user_credentials: UserLogin):
         raise HTTPException(status_code=401, detail="Invalid credentials.") 
 
 @app.post("/auth/reset-password")
-def reset_password(data: PasswordResetIn):
+async def reset_password(data: PasswordResetIn, request: Request):
     """
     Redefine a senha diretamente após validação de email e senhas.
+    Usa o mesmo rate limit do login (por IP e por email).
     """
     
+    await _enforce_login_limits("reset_password", data.email, request)
+    if login_guard.is_unknown(data.email):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, 
+                            detail="Email não encontrado.")
+    
     # 1. Validação de Senhas
     # ATENÇÃO: Verifique as chaves new_password/newPassword/confirm_password
     if data.new_password != data.confirm_password:
@@ -225,36 +652,41 @@ def reset_password(data: PasswordResetIn):
          raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, 
                             detail="A senha deve ter pelo menos 6 caracteres.")
     
-    # 2. Conecta e Inicia Transação
-    try:
-        # Usa o gerenciador de contexto para a conexão
+    def _find_user_id():
         with get_db_connection() as conn:
             with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-                
-                # 3. Encontra o ID do usuário pelo email
                 find_user_query = "SELECT id FROM users WHERE email = %s"
                 cursor.execute(find_user_query, (data.email,))
-                user_record = cursor.fetchone()
-                
-                if not user_record:
-                    # Se não achou o usuário, informa erro de forma genérica.
-                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, 
-                                        detail="Email não encontrado.")
-
-                user_id = user_record['id']
-                
-                # 4. Hasheia a nova senha (APENAS PARA USO EM PROJETO PESSOAL, O HASH É MELHOR)
-                # nova_senha_hashed = hash_password(data.new_password)
-                password_bytes = data.new_password.encode('utf-8') # SUBSTITUA PELA VERSÃO HASH SE USAR BCrypt/etc
-                new_password_hashed = bcrypt.hashpw(password_bytes, bcrypt.gensalt())
-                new_password_hashed_for_db = new_password_hashed.decode('utf-8')
-                
-                # 5. Atualiza a senha no DB
+                return cursor.fetchone()
+    
+    def _update_password(user_id, new_password_hashed_for_db):
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
                 update_query = "UPDATE users SET Password_hash = %s WHERE id = %s"
                 cursor.execute(update_query, (new_password_hashed_for_db, user_id))
                 conn.commit()
-                
-                return {"message": "Sua senha foi redefinida com sucesso."}
+    
+    # 2. Conecta e Inicia Transação
+    try:
+        # 3. Encontra o ID do usuário pelo email
+        user_record = await run_db(_find_user_id)
+        
+        if not user_record:
+            login_guard.remember_unknown(data.email)
+            # Se não achou o usuário, informa erro de forma genérica.
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, 
+                                detail="Email não encontrado.")
+
+        user_id = user_record['id']
+        
+        # 4. Hasheia a nova senha no pool do bcrypt (fora da conexão com o banco)
+        new_password_hashed_for_db = await password_hasher.hash(data.new_password)
+        
+        # 5. Atualiza a senha no DB
+        await run_db(_update_password, user_id, new_password_hashed_for_db)
+        profiles.invalidate_profile(user_id)
+        
+        return {"message": "Sua senha foi redefinida com sucesso."}
 
     except HTTPException as e:
         raise e
@@ -353,14 +785,18 @@ def update_user_profile(user_id: int, user_data: UserUpdateIn):
 
             # 3. Finaliza Transação
             conn.commit()
+            profiles.invalidate_profile(user_id)
+            if 'email' in user_updates:
+                _email_registered(user_updates['email'])
+            if is_company:
+                company_directory.invalidate()
             return {"message": "Perfil atualizado com sucesso!"}
 
     except HTTPException as e:
-        if conn: conn.rollback()
+        # O rollback é feito pelo pool ao devolver a conexão
         raise e
     except Exception as e:
         print(f"Erro ao atualizar perfil: {e}")
-        if conn: conn.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
                             detail="Erro interno ao tentar atualizar o perfil.")
 
@@ -368,41 +804,20 @@ def update_user_profile(user_id: int, user_data: UserUpdateIn):
     
 @app.get("/profile/{user_id}")
 def get_user_profile(user_id: int):
-    
-    query_user = """
-        select id, name, email, Account_Type, Phone_Number
-        from users
-        where id = %s
+    """
+    Perfil do usuário (com os dados da empresa para contas Company),
+    lido em um único JOIN e mantido em cache por usuário.
     """
     try:
-        with get_db_connection() as conn:
-            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-                cursor.execute(query_user, (user_id,))
-                user_data = cursor.fetchone()
-
-                if not user_data:
-                    raise HTTPException(status_code=404, detail="User not found.")
-                
-                # 2. Se for uma Empresa, busca os dados adicionais (companies)
-                if user_data['Account_Type'] == 'Company':
-                    query_company = """
-                    SELECT company_name, cnpj
-                    FROM companies
-                    WHERE user_id = %s
-                    """
-                    cursor.execute(query_company, (user_id,))
-                    company_data = cursor.fetchone()
-                    
-                    if company_data:
-                        # Junta os dicionários para formar o perfil completo
-                        user_data.update(company_data)
-
-                # Remove o hash da senha (embora não devesse estar na query_user, é bom ter certeza)
-                if 'Password_hash' in user_data:
-                    del user_data['Password_hash']
-                    
-                return user_data
+        user_data = profiles.load_profile(user_id)
+        
+        if not user_data:
+            raise HTTPException(status_code=404, detail="User not found.")
+        
+        return profiles.profile_view(user_data)
 
+    except HTTPException as e:
+        raise e
     except Exception as e:
         # Garante que qualquer erro de DB ou lógica seja capturado
         raise HTTPException(status_code=500, detail=f"Database error when loading profile: {e}")
@@ -415,216 +830,557 @@ async def register_vehicle(vehicle: VehicleIn):
     """
     seller_type = "Person"
     
-    try:
+    def _insert_vehicle():
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(query_vehicle, (vehicle.seller_id, seller_type, vehicle.mark, vehicle.model, vehicle.year, vehicle.mileage, vehicle.price, vehicle.fuel_type, vehicle.color, vehicle.status, vehicle.description))
+                vehicle_id = cursor.lastrowid
+                seller_stats.record_listed(cursor, vehicle.seller_id)
                 conn.commit()
+                return vehicle_id
+    
+    try:
+        vehicle_id = await run_db(_insert_vehicle)
+        _vehicle_added(catalog.row_from_vehicle_in(vehicle_id, vehicle))
         
         return {"Message": "Vehicle successfully registered."}
     
     except Exception as e:
         raise  HTTPException(status_code=500, detail=f"Fail to register this vehicle: {e}")
     
-@app.get("/api/vehicles/available", response_model=List[VehicleResponse])
-def list_vehicle(mark: Optional[str] = None, min_price: Optional[float] = None):
-    base_query = "select * from vehicles where Inventory_Status = 'Available'"
-    params = []
+@app.post("/vehicle/import")
+async def import_vehicles(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    chunk_size: int = Query(imports.IMPORT_CHUNK_SIZE, ge=1, le=imports.MAX_CHUNK_SIZE),
+):
+    """
+    Importação em lote de veículos (CSV com cabeçalho ou NDJSON, campos do VehicleIn).
+    O arquivo é lido de forma incremental e inserido em transações de chunk_size linhas;
+    a resposta traz quantas linhas entraram e o erro de cada linha rejeitada.
+    Se o arquivo ficar ilegível no meio, o 400 traz também o relatório dos chunks já gravados.
+    """
+    fmt = imports.detect_format(file.filename, file.content_type, format)
     
-    if mark:
-        base_query += " and Mark = %s"
-        params.append(mark)
+    def _on_inserted(inserted):
+        _vehicles_added([catalog.row_from_vehicle_in(vehicle_id, vehicle) for vehicle_id, vehicle in inserted])
     
-    if min_price is not None:
-        base_query += " and Price >= %s"
-        params.append(min_price)
+    try:
+        return await run_db(imports.import_vehicles, file.file, fmt, VehicleIn, chunk_size, _on_inserted)
+    except imports.ImportFormatError as e:
+        if e.report is None:
+            raise HTTPException(status_code=400, detail=str(e))
+        raise HTTPException(status_code=400, detail={"error": str(e), "report": e.report})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Fail to import vehicles: {e}")
+    finally:
+        await file.close()
     
+@app.post("/vehicle/{vehicle_id}/photos", status_code=status.HTTP_201_CREATED)
+async def upload_vehicle_photo(vehicle_id: int, file: UploadFile = File(...)):
+    """
+    Envia uma foto (JPEG, PNG ou WebP) do veículo. O arquivo é gravado em disco em
+    pedaços, com nome pelo hash do conteúdo (a mesma foto não é gravada duas vezes);
+    a miniatura e as variantes WebP são geradas em segundo plano por um pool de processos.
+    """
     try:
-        with get_db_connection() as conn:
-            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-                cursor.execute(base_query, params)
-                vehicles = cursor.fetchall()
-        
-        return vehicles
+        # Pool próprio de upload: arquivos grandes não ocupam o executor do banco
+        return await photo_store.upload(file.file, vehicle_id)
+    except photos.PhotoError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Fail to search this vehicle: {e}")
+        raise HTTPException(status_code=500, detail=f"Fail to store this photo: {e}")
+    finally:
+        await file.close()
+
+@app.get("/vehicle/{vehicle_id}/photos")
+def vehicle_photos(vehicle_id: int):
+    """
+    Fotos do veículo na ordem de envio, com o status das variantes e as URLs de cada uma.
+    """
+    return photo_store.photos(vehicle_id)
+
+@app.get(photos.PHOTO_URL_PREFIX + "/{filename}")
+def serve_photo(filename: str, request: Request):
+    """
+    Serve o original ou uma variante. O nome é o hash do conteúdo, então o cache é
+    "immutable" de um ano; aceita Range e usa sendfile quando o servidor oferece.
+    """
+    found = photo_store.resolve(filename)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Photo not found.")
+    path, media_type = found
+    etag = f'"{filename.split(".")[0]}"'
+    headers = {"Cache-Control": photos.CACHE_CONTROL, "ETag": etag}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+@app.get("/api/photos/stats")
+def photo_stats():
+    """
+    Retorna os contadores das fotos: uploads, bytes e MB/s gravados, fila e tempo do pool de variantes.
+    """
+    return photo_store.snapshot()
     
-@app.get("/api/companies", response_model=List[CompanyResponse])
-def companies_list():
+@app.get("/api/vehicles/available", response_model=List[VehicleResponse])
+def list_vehicle(
+    request: Request,
+    mark: Optional[str] = None,
+    model: Optional[str] = None,
+    min_year: Optional[int] = None,
+    max_year: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    max_mileage: Optional[int] = None,
+    fuel_type: Optional[str] = None,
+    color: Optional[str] = None,
+    sort: str = Query("id", pattern="^(id|price|year)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    limit: int = Query(catalog.DEFAULT_PAGE_SIZE, ge=1, le=catalog.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
     """
-    Retorna a lista completa de todas as empresas registradas.
+    Lista os veículos disponíveis com filtros no servidor e paginação por keyset.
+    O cursor da próxima página vem no header X-Next-Cursor (ausente na última página).
+    As respostas ficam em cache (invalidado pelo cadastro e pela venda) e têm ETag,
+    então um If-None-Match igual recebe 304 sem reserializar a lista.
     """
-    query = "SELECT user_id, company_name, cnpj FROM companies"
+    filters = {
+        'mark': mark,
+        'model': model,
+        'min_year': min_year,
+        'max_year': max_year,
+        'min_price': min_price,
+        'max_price': max_price,
+        'max_mileage': max_mileage,
+        'fuel_type': fuel_type,
+        'color': color,
+    }
     
-    try:
-        # Tenta se conectar ao banco de dados
-        with get_db_connection() as conn:
-            # 🎯 CRÍTICO: Usa DictCursor para retornar os dados como dicionários (JSON)
-            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-                cursor.execute(query)
-                companies = cursor.fetchall()
+    normalized_filters = catalog.normalize_filters(filters)
+    cache_key = catalog.listing_cache_key(normalized_filters, sort, order == "desc", cursor, limit)
+    cached = listing_cache.get(cache_key)
+    
+    if cached is None:
+        try:
+            # Mesmos filtros normalizados da chave do cache (a collation padrão do MySQL ignora maiúsculas)
+            base_query, params = catalog.build_listing_query(normalized_filters, sort, order == "desc", cursor, limit)
+        except catalog.InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # O FastAPI validará a lista 'companies' com o CompanyResponse
-        return companies
+        generation = listing_cache.generation
+        try:
+            with get_read_connection() as conn:
+                with conn.cursor(pymysql.cursors.DictCursor) as db_cursor:
+                    db_cursor.execute(base_query, params)
+                    vehicles = db_cursor.fetchall()
+                ttl = read_ttl(conn)
+            
+            vehicles, next_cursor = catalog.paginate(list(vehicles), sort, limit)
+            # Linhas da nossa própria projeção: vão direto para bytes (STRICT_RESPONSE_VALIDATION valida)
+            body = serialization.encode_rows(photo_store.attach(vehicles), VehicleResponse)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Fail to search this vehicle: {e}")
         
+        cached = {
+            'body': body,
+            'etag': make_etag(body),
+            'next_cursor': next_cursor,
+            'filters': normalized_filters,
+            'ids': frozenset(vehicle['id'] for vehicle in vehicles),
+        }
+        listing_cache.set(cache_key, cached, size=len(body), ttl=ttl, generation=generation)
+    
+    headers = {"ETag": cached['etag'], "Cache-Control": "no-cache"}
+    if cached['next_cursor']:
+        headers["X-Next-Cursor"] = cached['next_cursor']
+    
+    if etag_matches(request.headers.get("if-none-match"), cached['etag']):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return serialization.json_response(cached['body'], headers=headers)
+    
+@app.get("/api/vehicles/facets")
+def vehicle_facets(
+    mark: Optional[str] = None,
+    model: Optional[str] = None,
+    min_year: Optional[int] = None,
+    max_year: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    max_mileage: Optional[int] = None,
+    fuel_type: Optional[str] = None,
+    color: Optional[str] = None,
+):
+    """
+    Contagens para os filtros da listagem (mesmos parâmetros do /api/vehicles/available):
+    total que casa com os filtros e veículos por marca, combustível, cor, faixa de ano
+    e faixa de preço. Servido pelo motor colunar em memória, sem GROUP BY no banco.
+    """
+    filters = {
+        'mark': mark,
+        'model': model,
+        'min_year': min_year,
+        'max_year': max_year,
+        'min_price': min_price,
+        'max_price': max_price,
+        'max_mileage': max_mileage,
+        'fuel_type': fuel_type,
+        'color': color,
+    }
+    return inventory.facets(filters)
+
+@app.get("/api/vehicles/changes")
+def vehicle_changes(
+    since: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None, max_length=64),
+):
+    """
+    Feed de mudanças do estoque em Server-Sent Events: "added" e "sold",
+    cada um com a versão global ("v", também o id do evento), a mesma em todos os
+    workers. Ao reconectar, o EventSource manda o Last-Event-ID (ou use ?since=) e
+    recebe só o que perdeu; "reset" indica que o histórico não cobre o pedido e a
+    listagem deve ser recarregada. Para não perder nada, assine antes de buscar a listagem.
+    """
+    return StreamingResponse(
+        changefeed.stream(last_event_id or since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/vehicles/changes/stats")
+def vehicle_changes_stats():
+    """
+    Retorna a versão atual do feed de mudanças, os assinantes conectados e os contadores.
+    """
+    return changefeed.snapshot()
+
+@app.get("/api/vehicles/inventory")
+def inventory_stats():
+    """
+    Retorna o tamanho do motor de facets e a memória usada por veículo.
+    """
+    return inventory.snapshot()
+
+def _similar_response(ranked):
+    # Linhas completas vêm do índice de busca (mesmo conjunto de veículos disponíveis)
+    vehicles = []
+    for vehicle_id, score in ranked:
+        row = search_index.get(vehicle_id)
+        if row is not None:
+            vehicles.append({**row, 'Similarity': round(score, 4)})
+    return serialization.json_response(serialization.encode_rows(photo_store.attach(vehicles), SimilarVehicleResponse))
+
+@app.get("/api/vehicles/similar", response_model=List[SimilarVehicleResponse])
+def similar_by_preferences(
+    mark: Optional[str] = None,
+    fuel_type: Optional[str] = None,
+    color: Optional[str] = None,
+    price: Optional[float] = Query(None, gt=0),
+    year: Optional[int] = None,
+    mileage: Optional[int] = Query(None, ge=0),
+    q: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=50),
+):
+    """
+    Veículos disponíveis mais parecidos com as preferências informadas (marca,
+    combustível, cor, preço, ano, quilometragem e texto livre), calculado
+    localmente sobre o estoque, sem chamar a LLM.
+    """
+    preferences = {'mark': mark, 'fuel': fuel_type, 'color': color, 'price': price,
+                   'year': year, 'mileage': mileage, 'text': q}
+    if all(value is None for value in preferences.values()):
+        raise HTTPException(status_code=400, detail="Inform at least one preference.")
+    return _similar_response(similarity_index.by_preferences(preferences, limit))
+
+@app.get("/api/vehicles/{vehicle_id}/similar", response_model=List[SimilarVehicleResponse])
+def similar_vehicles(vehicle_id: int, limit: int = Query(10, ge=1, le=50)):
+    """
+    Veículos disponíveis mais parecidos com o veículo informado (preço, ano,
+    quilometragem, marca, combustível, cor e descrição).
+    """
+    ranked = similarity_index.similar_to(vehicle_id, limit)
+    if ranked is None:
+        raise HTTPException(status_code=404, detail="Vehicle not found or not available.")
+    return _similar_response(ranked)
+
+@app.get("/api/vehicles/search", response_model=List[VehicleResponse])
+def search_vehicles(q: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=100)):
+    """
+    Busca textual ranqueada (marca, modelo, ano, cor, combustível e descrição)
+    servida pelo índice invertido em memória. Aceita prefixos para type-ahead.
+    """
+    return photo_store.attach(search_index.search(q, limit))
+    
+async def _company_snapshot():
+    # Snapshot em dia não precisa do executor; só a reconstrução vai ao banco
+    snapshot = company_directory.fresh()
+    if snapshot is None:
+        snapshot = await run_db(company_directory.current)
+    return snapshot
+
+def _company_response(request, snapshot, etag, encode):
+    headers = snapshot.headers(etag)
+    if snapshot.not_modified(request.headers, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return serialization.json_response(encode(), headers=headers)
+
+@app.get("/api/companies", response_model=List[CompanyResponse])
+async def companies_list(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=companies.MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+):
+    """
+    Retorna a lista completa de todas as empresas registradas, servida do snapshot
+    em memória (ETag/Last-Modified, 304 com If-None-Match).
+    Com limit/cursor devolve uma página; o cursor seguinte vem no header X-Next-Cursor.
+    """
+    try:
+        snapshot = await _company_snapshot()
     except Exception as e:
         # Trata qualquer erro de banco de dados ou execução
         print(f"Erro ao buscar lista de empresas: {e}")
         # Envia um erro 500 para o frontend
         raise HTTPException(status_code=500, detail=f"Falha ao carregar a lista de empresas. Detalhe: {e}")
     
-@app.post("/api/vendas/checkout")
-async def sells(checkout: SellsIn):
+    if limit is None and cursor is None:
+        return _company_response(request, snapshot, snapshot.etags['api'], lambda: snapshot.bodies['api'])
+    
+    rows, next_cursor = snapshot.page(cursor, limit or companies.DEFAULT_PAGE_SIZE)
+    response = _company_response(request, snapshot, snapshot.etag_for("page", cursor, limit),
+                                 lambda: serialization.encode_rows(rows))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+@app.get("/api/companies/search", response_model=List[CompanyResponse])
+async def search_companies(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=companies.MAX_PAGE_SIZE),
+):
     """
-    Processar a transação de venda de um carro para o banco de dados:
-    1. Verificar o status do carro (deve ser 'Disponível')
-    2. Registrar a venda da tabela 'vendas'
-    3. Atualiza o status do carro para vendidos.
+    Busca de empresas pelo início do nome (sem acento/maiúsculas), em ordem alfabética.
     """
+    try:
+        snapshot = await _company_snapshot()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Falha ao carregar a lista de empresas. Detalhe: {e}")
     
-    query_check = "select Inventory_Status, Price from vehicles where id = %s for update"
-    query_insert_data = """
-        insert into sells (Client_id, Car_id, Total_value, Purchase_Status)
-        values (%s, %s, %s, %s)
+    return _company_response(request, snapshot, snapshot.etag_for("search", q, limit),
+                             lambda: serialization.encode_rows(snapshot.search(q, limit)))
+
+@app.get("/api/companies/directory")
+def company_directory_stats():
     """
+    Retorna a versão do snapshot de empresas e os contadores de reconstrução.
+    """
+    return company_directory.snapshot()
     
-    query_update_vehicle = "update vehicles set Inventory_Status = 'Sold' where id = %s"
+@app.post("/api/vendas/checkout")
+async def sells(checkout: SellsIn, idempotency_key: Optional[str] = Header(None, max_length=128)):
+    """
+    Processar a transação de venda de um carro para o banco de dados:
+    1. Marca o carro como vendido com um UPDATE condicional (só se estiver 'Available')
+    2. Registrar a venda da tabela 'vendas'
+    3. Confirma tudo em uma transação curta, com retry em deadlock/lock timeout.
+    Com o header Idempotency-Key, repetir a mesma requisição devolve a venda original.
+    """
     
-    final_price = 0.0
-    conn = None
+    def _on_sold(cursor, vehicle, sell_id):
+        # Contadores do vendedor atualizados na mesma transação da venda
+        seller_stats.record_sale(cursor, checkout.car_id)
     
     try:
-        with get_db_connection() as conn:
-            conn.begin()
-            with conn.cursor() as cursor:
-                cursor.execute(query_check, checkout.car_id)
-                vehicle = cursor.fetchone()
-                
-                if not vehicle:
-                    conn.rollback()
-                    raise HTTPException(status_code=404, detail="Vehicle not found.")
-                
-                current_status = vehicle['Inventory_Status']
-                final_price = float(vehicle['Price'])
-                
-                if current_status != 'Available':
-                    conn.rollback()
-                    raise HTTPException(status_code=404, detail=f"Vehicle status is {current_status}. Cannot proceed with checkout")
-                
-                
-                purchase_status = 'Completed'
-                purchase_date = (
-                    checkout.client_id,
-                    checkout.car_id,                    
-                    final_price,
-                    purchase_status,                    
-                )
-                
-                cursor.execute(query_insert_data, purchase_date)
-                sell_id = cursor.lastrowid
-                
-                cursor.execute(query_update_vehicle, (checkout.car_id,))
-                conn.commit()
+        # A transação bloqueante roda no executor do banco, fora do event loop
+        result = await run_db(
+            checkout_engine.process_checkout,
+            checkout.client_id,
+            checkout.car_id,
+            idempotency_key,
+            _on_sold,
+        )
+        if not result['replayed']:
+            _vehicle_sold(checkout.car_id)
                 
         return {
             "Message": "Checkout sucessful. Vehicle mark is sold.",
-            "Sell_id": sell_id,
+            "Sell_id": result['sell_id'],
             "Car_id": checkout.car_id,
-            "Value sold": final_price
+            "Value sold": result['final_price']
         }
-    except HTTPException as e:
-        # Rollback já está sendo chamado dentro da exceção HTTP
-        if 'conn' in locals() and conn:
-            conn.rollback() 
-        raise e
+    except checkout_engine.CheckoutError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
         
     except Exception as e:
-        # Outros erros de DB
-        if 'conn' in locals() and conn:
-            conn.rollback() # Garante o rollback em caso de falha de conexão ou query
+        # Outros erros de DB: o pool faz o rollback ao devolver a conexão
         print(f"Checkout error: {e}")
         raise HTTPException(status_code=500, detail=f"Transaction failed: {e}")
     
+@app.get("/api/vendas/checkout/stats")
+def checkout_stats():
+    """
+    Retorna os contadores de contenção do checkout (vitórias, corridas perdidas, retries).
+    """
+    return checkout_engine.stats.snapshot()
+    
+@app.get("/api/export/{table}")
+def export_table(
+    table: str,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    seller_id: Optional[int] = None,
+):
+    """
+    Exporta sells, vehicles ou llm_register em CSV ou NDJSON, em streaming
+    (cursor server-side, memória constante), com filtros de período e vendedor.
+    Cada export usa uma conexão própria; acima de EXPORT_MAX_CONCURRENT responde 503.
+    """
+    if table not in exports.EXPORTS:
+        raise HTTPException(status_code=404, detail=f"Unknown export '{table}'.")
+    try:
+        query, params = exports.build_export_query(table, date_from, date_to, seller_id)
+    except exports.ExportFilterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    slot = streaming_slots.acquire()
+    if slot is None:
+        raise HTTPException(status_code=503, detail="Too many exports running, try again shortly.",
+                            headers={"Retry-After": "5"})
+    
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    filename = f"{table}.{'csv' if format == 'csv' else 'ndjson'}"
+    return StreamingResponse(
+        exports.stream_export(query, params, format, slot),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        # Garante a devolução do slot mesmo se o gerador nunca chegar a rodar
+        background=BackgroundTask(slot.release),
+    )
+    
+@app.get("/seller/{seller_id}/stats")
+async def get_seller_stats(seller_id: int):
+    """
+    Totais do vendedor (receita, unidades vendidas, média de dias até a venda,
+    estoque) lidos da tabela de resumo mantida a cada cadastro e venda.
+    """
+    try:
+        return await run_db(seller_stats.get_seller_stats, seller_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch seller stats: {e}")
+    
 @app.get("/companies/")
-async def companies_list():
-    query = """
-    SELECT id, email, name, phone_number, company_name, cnpj 
-    FROM users 
-    WHERE account_type = 'Company'
+async def companies_directory(request: Request):
+    """
+    Empresas com os dados da conta (email, nome, telefone), do mesmo snapshot
+    do /api/companies.
     """
     try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query)
-                companies = cursor.fetchall()
-        
-        # O DictCursor retorna dicionários, que o FastAPI converte para JSON
-        return companies
+        snapshot = await _company_snapshot()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch companies: {e}")
     
+    return _company_response(request, snapshot, snapshot.etags['legacy'], lambda: snapshot.bodies['legacy'])
+    
 @app.get("/user/{user_id}")
 async def get_user_profile(user_id: int):
-    query = """
-    SELECT id, name, email, account_type, phone_number, company_name, cnpj 
-    FROM users 
-    WHERE id = %s
-    """ 
-    
+    # Mesmo caminho de leitura do /profile/{user_id}; no cache hit nem passa pelo executor
     try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query, (user_id,))
-                user_data = cursor.fetchone()
+        user_data = profiles.get_cached_profile(user_id)
+        if user_data is None:
+            user_data = await run_db(profiles.load_profile, user_id)
                 
-                if user_data is None:
-                    raise HTTPException(status_code=404, detail="User not found")
+        if user_data is None:
+            raise HTTPException(status_code=404, detail="User not found")
         
-        return user_data
+        return profiles.user_view(user_data)
     
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch user profile: {e}")
 
 
+@app.get("/suggest_car/stats")
+def suggestion_stats():
+    """
+    Retorna os contadores do cache de sugestões (hits, chamadas à LLM, coalescing).
+    """
+    if suggestion_service is None:
+        raise HTTPException(status_code=500, detail="Key not configured.")
+    return suggestion_service.snapshot()
+
+@app.get("/api/audit/stats")
+def audit_stats():
+    """
+    Retorna os contadores da fila de auditoria (enfileirados, gravados, descartados).
+    """
+    return {llm_log_writer.name: llm_log_writer.snapshot()}
+
 @app.post("/suggest_car/")
 async def suggest_car(search: SearchLLM, user_id: Optional[str] = None):
-    if not api_key:
+    if suggestion_service is None:
        raise HTTPException(status_code=500, detail="Key not configured.")
    
     llm_sugestion = ""
-    used_model = "gemini-2.5-flash"
+    used_model = suggestion_service.model_name
    
     try:
-       genai.configure(api_key=api_key)
-       
-       prompt = f"""
-        Você é um assistente de compra de carros.
-        Analise o pedido do usuário para sugerir até 10(ou se especificar a quantidade) modelos de carros no mercado brasileiro com uma breve justificativa para cada.
-        Pedido: '{search.preferences}'
-        Responda em português e de forma amigável.
-       """
-       
-       response = genai.GenerativeModel(used_model).generate_content(prompt)
-       llm_sugestion = response.text
+       # Cache + coalescing: pedidos iguais (ou em andamento) não chamam a LLM de novo
+       llm_sugestion = await suggestion_service.suggest(search.preferences)
        
     except Exception as e:
         llm_sugestion = f"Sorry some problem be happend: {e}"
-       
-    query_log = """
-    insert into llm_register (User_id, Prompt_use, LLM_Aswer, LLM_Model)
-    values (%s, %s, %s, %s)
+    
+    # O log vai para a fila de escrita em lote, fora do caminho da resposta
+    if not llm_log_writer.submit((user_id, search.preferences, llm_sugestion, used_model)):
+        print("Waring: LLM log queue is full, record dropped.")
+    
+    return {"Suggestion": llm_sugestion}
+
+
+def _sse_event(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/suggest_car/stream")
+async def suggest_car_stream(search: SearchLLM, user_id: Optional[str] = None):
     """
-    try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query_log, (user_id, search.preferences, llm_sugestion, used_model))
-                conn.commit()
+    Versão em streaming do /suggest_car/ (Server-Sent Events).
+    Cada evento traz um pedaço da resposta em {"token": ...}; ao final vem o
+    evento "done" e a resposta completa é gravada no llm_register. Se o cliente
+    desconecta no meio, o modelo para de gerar e a parte já gerada é gravada.
+    """
+    if suggestion_service is None:
+       raise HTTPException(status_code=500, detail="Key not configured.")
     
-    except Exception as e:
-        print(f"Waring: Fail to register LLM log: {e}")
+    used_model = suggestion_service.model_name
+    
+    async def events():
+        chunks = []
+        try:
+            # aclosing: na desconexão o stream do provedor é fechado já, não pelo GC
+            async with aclosing(suggestion_service.stream(search.preferences)) as stream:
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    yield _sse_event({"token": chunk})
+        except Exception as e:
+            chunks = [f"Sorry some problem be happend: {e}"]
+            yield _sse_event({"error": chunks[0]}, event="error")
+        finally:
+            # Também na desconexão (GeneratorExit/CancelledError): grava a resposta parcial
+            if not llm_log_writer.submit((user_id, search.preferences, ''.join(chunks), used_model)):
+                print("Waring: LLM log queue is full, record dropped.")
         
-    finally:
-        return {"Suggestion": llm_sugestion}
+        yield _sse_event({"done": True}, event="done")
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
    
         
 
@@ -0,0 +1,211 @@
+from collections import deque
+import contextvars
+import re
+import threading
+
+from settings import settings
+
+# Limite opcional (ms) para registrar queries lentas; vazio desliga o log
+SLOW_QUERY_LOG_MS = settings.slow_query_log_ms or None
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+QUANTILES = (0.5, 0.95, 0.99)
+# Amostras recentes guardadas por série para calcular p50/p95/p99
+WINDOW_SIZE = 1024
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{escaped}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Prometheus histogram (cumulative buckets, _sum, _count) per label set,
+    plus a sliding window of recent samples for the p50/p95/p99 summary.
+    """
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        labels = tuple(zip(self.label_names, label_values))
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {
+                    'counts': [0] * len(self.buckets),
+                    'sum': 0.0,
+                    'count': 0,
+                    'window': deque(maxlen=WINDOW_SIZE),
+                }
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][index] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+            series['window'].append(value)
+
+    def quantiles(self, *label_values):
+        labels = tuple(zip(self.label_names, label_values))
+        with self._lock:
+            series = self._series.get(labels)
+            window = sorted(series['window']) if series else []
+        if not window:
+            return {}
+        return {q: window[min(len(window) - 1, int(q * len(window)))] for q in QUANTILES}
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        summary = [
+            f"# HELP {self.name}_quantile {self.help_text} (recent window quantiles)",
+            f"# TYPE {self.name}_quantile summary",
+        ]
+        with self._lock:
+            series_items = [
+                (labels, list(s['counts']), s['sum'], s['count'], sorted(s['window']))
+                for labels, s in self._series.items()
+            ]
+        for labels, counts, total, count, window in series_items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+            for q in QUANTILES:
+                if window:
+                    value = window[min(len(window) - 1, int(q * len(window)))]
+                    summary.append(f"{self.name}_quantile{_format_labels(labels + (('quantile', str(q)),))} {_format_value(value)}")
+        return lines + summary
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route.", ("method", "route", "status"))
+REQUEST_SQL_TIME = Histogram(
+    "http_request_sql_seconds", "Time spent in SQL per request.", ("route",))
+REQUEST_QUERIES = Histogram(
+    "http_request_queries", "Number of SQL queries per request.", ("route",), buckets=COUNT_BUCKETS)
+REQUEST_BCRYPT_TIME = Histogram(
+    "http_request_bcrypt_seconds", "bcrypt time per request.", ("route",))
+REQUEST_LLM_TIME = Histogram(
+    "http_request_llm_seconds", "LLM provider time per request.", ("route",))
+SQL_QUERY_TIME = Histogram(
+    "sql_query_duration_seconds", "SQL query latency by query label.", ("query",))
+
+HISTOGRAMS = (
+    REQUEST_LATENCY, REQUEST_SQL_TIME, REQUEST_QUERIES, REQUEST_BCRYPT_TIME, REQUEST_LLM_TIME, SQL_QUERY_TIME,
+)
+
+# Acumuladores da requisição atual (preenchidos pelos hooks de SQL, bcrypt e LLM)
+_request = contextvars.ContextVar("request_metrics", default=None)
+
+
+def start_request():
+    data = {'sql_seconds': 0.0, 'queries': 0, 'bcrypt_seconds': 0.0, 'llm_seconds': 0.0}
+    _request.set(data)
+    return data
+
+
+def finish_request(data, method, route, status_code, elapsed):
+    REQUEST_LATENCY.observe(elapsed, method, route, str(status_code))
+    REQUEST_SQL_TIME.observe(data['sql_seconds'], route)
+    REQUEST_QUERIES.observe(data['queries'], route)
+    if data['bcrypt_seconds']:
+        REQUEST_BCRYPT_TIME.observe(data['bcrypt_seconds'], route)
+    if data['llm_seconds']:
+        REQUEST_LLM_TIME.observe(data['llm_seconds'], route)
+
+
+_LABEL_RE = re.compile(
+    r"^\s*(select|insert\s+into|replace\s+into|update|delete\s+from|create\s+\w+|begin|commit|rollback|set)\b"
+    r"(?:.*?\bfrom\s+`?(\w+)`?|\s+`?(\w+)`?)?",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def query_label(sql):
+    """'select ... from vehicles ...' -> 'select vehicles'; keeps the label cardinality low."""
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql[:200].decode('utf-8', errors='replace')
+    match = _LABEL_RE.match(sql[:200])
+    if not match:
+        return 'other'
+    verb = match.group(1).split()[0].lower()
+    table = match.group(2) or match.group(3)
+    return f"{verb} {table.lower()}" if table and verb != 'set' else verb
+
+
+def record_sql(sql, seconds):
+    label = query_label(sql)
+    SQL_QUERY_TIME.observe(seconds, label)
+    data = _request.get()
+    if data is not None:
+        data['sql_seconds'] += seconds
+        data['queries'] += 1
+    if SLOW_QUERY_LOG_MS is not None and seconds * 1000 >= SLOW_QUERY_LOG_MS:
+        text = sql.decode('utf-8', errors='replace') if isinstance(sql, (bytes, bytearray)) else sql
+        print(f"Slow query ({seconds * 1000:.1f} ms, {label}): {' '.join(text.split())[:500]}")
+
+
+def record_bcrypt(seconds):
+    data = _request.get()
+    if data is not None:
+        data['bcrypt_seconds'] += seconds
+
+
+def record_llm(seconds):
+    data = _request.get()
+    if data is not None:
+        data['llm_seconds'] += seconds
+
+
+def _render_gauges(prefix, values, help_text):
+    lines = []
+    for key, value in values.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f"{prefix}_{key}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_format_value(value)}")
+    return lines
+
+
+def render(gauge_sources=()):
+    """
+    Prometheus text exposition. gauge_sources is a list of (prefix, help, callable
+    returning a dict of numbers), e.g. the pool and hasher snapshots.
+    """
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for prefix, help_text, source in gauge_sources:
+        try:
+            lines.extend(_render_gauges(prefix, source(), help_text))
+        except Exception as e:
+            lines.append(f"# {prefix} unavailable: {e}")
+    return '\n'.join(lines) + '\n'
+
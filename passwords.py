@@ -0,0 +1,104 @@
+import bcrypt # type: ignore
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+import time
+
+import metrics
+from settings import settings
+
+# Custo do bcrypt (2^rounds iterações) e tamanho do pool dedicado ao hashing
+BCRYPT_ROUNDS = settings.bcrypt_rounds
+BCRYPT_WORKERS = settings.bcrypt_workers
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing/verification on its own bounded thread pool.
+
+    bcrypt releases the GIL while it works, so a small thread pool uses real
+    CPU cores without taking slots from the request threadpool. The work
+    factor is configurable and needs_rehash() tells when a stored hash was
+    made with a different cost.
+    """
+
+    def __init__(self, rounds=BCRYPT_ROUNDS, workers=BCRYPT_WORKERS):
+        self.rounds = rounds
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.stats = {
+            'hash_count': 0,
+            'hash_seconds': 0.0,
+            'verify_count': 0,
+            'verify_seconds': 0.0,
+            'wait_seconds': 0.0,
+            'max_queue_depth': 0,
+            'rehashes': 0,
+        }
+
+    def _hash_sync(self, password):
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(self.rounds)).decode('utf-8')
+
+    @staticmethod
+    def _verify_sync(password, stored_hash):
+        return bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('utf-8'))
+
+    async def _submit(self, op, func, *args):
+        submitted = time.perf_counter()
+        with self._lock:
+            self._pending += 1
+            self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self._pending)
+
+        def work():
+            started = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._pending -= 1
+                    self.stats[f'{op}_count'] += 1
+                    self.stats[f'{op}_seconds'] += finished - started
+                    self.stats['wait_seconds'] += started - submitted
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, work)
+        finally:
+            metrics.record_bcrypt(time.perf_counter() - submitted)
+
+    async def hash(self, password):
+        return await self._submit('hash', self._hash_sync, password)
+
+    async def verify(self, password, stored_hash):
+        return await self._submit('verify', self._verify_sync, password, stored_hash)
+
+    def needs_rehash(self, stored_hash):
+        # Formato: $2b$12$<salt+hash>; o segundo campo é o custo
+        try:
+            return int(stored_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def record_rehash(self):
+        with self._lock:
+            self.stats['rehashes'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.stats)
+            data['queue_depth'] = self._pending
+        data['rounds'] = self.rounds
+        data['workers'] = self.workers
+        for op in ('hash', 'verify'):
+            count = data[f'{op}_count']
+            data[f'{op}_avg_ms'] = round(data[f'{op}_seconds'] / count * 1000, 2) if count else 0.0
+        return data
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+password_hasher = PasswordHasher()
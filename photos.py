@@ -0,0 +1,485 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+
+from cache import TTLCache
+from database import get_db_connection, get_read_connection, read_ttl
+from settings import settings
+import thumbnails
+
+PHOTO_DIR = settings.photo_dir
+PHOTO_URL_PREFIX = settings.photo_url_prefix.rstrip('/')
+PHOTO_MAX_BYTES = settings.photo_max_bytes
+PHOTO_CHUNK_SIZE = settings.photo_chunk_size
+PHOTO_WORKERS = settings.photo_workers
+PHOTO_UPLOAD_WORKERS = settings.photo_upload_workers
+PHOTO_MAX_ATTEMPTS = settings.photo_max_attempts
+PHOTO_CLAIM_TIMEOUT = settings.photo_claim_timeout
+PHOTO_CLAIM_BATCH = 500
+
+# Cache dos arquivos servidos: o nome é o hash do conteúdo, então nunca muda
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+PHOTOS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS vehicle_photos (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    Vehicle_ID INT NOT NULL,
+    Content_Hash CHAR(64) NOT NULL,
+    Extension VARCHAR(8) NOT NULL,
+    Size_Bytes INT NOT NULL,
+    Status VARCHAR(12) NOT NULL DEFAULT 'processing',
+    Attempts INT NOT NULL DEFAULT 0,
+    Claimed_by VARCHAR(64) NULL,
+    Claimed_at TIMESTAMP NULL,
+    Created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_vehicle_photos_hash (Vehicle_ID, Content_Hash),
+    KEY idx_vehicle_photos_content (Content_Hash),
+    KEY idx_vehicle_photos_status (Status, Claimed_at)
+)
+"""
+
+# Status das variantes, compartilhado por todos os workers: 'processing' (Claimed_by indica
+# quem está gerando; NULL = na fila), 'ready' ou 'failed' (terminal, após PHOTO_MAX_ATTEMPTS)
+
+# Quem recebe o upload já reserva a foto para o próprio job (primeira tentativa)
+_INSERT_PHOTO = """
+    insert ignore into vehicle_photos
+        (Vehicle_ID, Content_Hash, Extension, Size_Bytes, Status, Attempts, Claimed_by, Claimed_at)
+    values (%s, %s, %s, %s, %s, %s, %s, if(%s is null, null, current_timestamp))
+"""
+
+_SELECT_PHOTOS = """
+    select Vehicle_ID, Content_Hash, Extension, Status from vehicle_photos
+    where Vehicle_ID in ({placeholders})
+    order by Vehicle_ID, id
+"""
+
+_MARK_READY = """
+    update vehicle_photos set Status = 'ready', Claimed_by = null, Claimed_at = null
+    where Content_Hash = %s
+"""
+
+# Tentativa que falhou: volta para a fila, ou para de vez quando as tentativas acabaram
+_RELEASE_FAILED = """
+    update vehicle_photos
+    set Status = if(Attempts >= %s, 'failed', 'processing'), Claimed_by = null, Claimed_at = null
+    where Content_Hash = %s and Status = 'processing'
+"""
+
+# Reserva atômica: fotos na fila, ou reservadas por um worker que parou no meio do job.
+# Dois workers subindo juntos nunca pegam a mesma linha.
+_CLAIM_UNFINISHED = """
+    update vehicle_photos
+    set Claimed_by = %s, Claimed_at = current_timestamp, Attempts = Attempts + 1
+    where Status = 'processing' and Attempts < %s
+      and (Claimed_by is null or Claimed_at < current_timestamp - interval %s second)
+    limit %s
+"""
+
+_SELECT_CLAIMED = """
+    select Content_Hash, Extension, min(Vehicle_ID) as Vehicle_ID from vehicle_photos
+    where Status = 'processing' and Claimed_by = %s
+    group by Content_Hash, Extension
+"""
+
+CONTENT_TYPES = {'jpg': 'image/jpeg', 'png': 'image/png', 'webp': 'image/webp'}
+
+_FILENAME_RE = re.compile(r"^([0-9a-f]{64})(?:_(thumb|large))?\.(jpg|png|webp)$")
+
+
+class PhotoError(Exception):
+    status_code = 400
+
+
+class VehicleNotFound(PhotoError):
+    status_code = 404
+
+    def __init__(self):
+        super().__init__("Vehicle not found.")
+
+
+class PhotoTooLarge(PhotoError):
+    status_code = 413
+
+    def __init__(self, limit):
+        super().__init__(f"Photo is larger than {limit} bytes.")
+
+
+class UnsupportedPhoto(PhotoError):
+    status_code = 415
+
+    def __init__(self):
+        super().__init__("Only JPEG, PNG and WebP photos are accepted.")
+
+
+def detect_extension(head):
+    """Image type from the first bytes of the file (the client's content type isn't trusted)."""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+class PhotoStore:
+    """
+    Vehicle photos stored on local disk under their SHA-256, so the same
+    image uploaded twice (or for two vehicles) is written once.
+
+    Uploads are copied chunk by chunk to a temporary file while hashing, then
+    renamed to <hash>.<ext>, on a dedicated thread pool so large files don't
+    hold database executor slots. Resized WebP/JPEG variants are made by a
+    process pool off the request path; a photo only shows up in the vehicle
+    thumbnails once its variants exist. on_ready(vehicle_id) is called after
+    that, to invalidate cached listings.
+
+    vehicle_photos is the source of truth for the photo list and the variant
+    status (so every worker agrees); reads go through a short per-vehicle
+    TTL cache. A photo being processed is claimed by one worker (Claimed_by),
+    and after max_attempts failed jobs it stays 'failed'.
+    """
+
+    def __init__(self, root=PHOTO_DIR, url_prefix=PHOTO_URL_PREFIX, max_bytes=PHOTO_MAX_BYTES,
+                 chunk_size=PHOTO_CHUNK_SIZE, workers=PHOTO_WORKERS, upload_workers=PHOTO_UPLOAD_WORKERS,
+                 max_attempts=PHOTO_MAX_ATTEMPTS, claim_timeout=PHOTO_CLAIM_TIMEOUT):
+        self.root = root
+        self.url_prefix = url_prefix
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.upload_workers = upload_workers
+        self.max_attempts = max_attempts
+        self.claim_timeout = claim_timeout
+        # Identifica as reservas deste worker em vehicle_photos.Claimed_by
+        self.worker_id = f"{socket.gethostname()[:48]}:{os.getpid()}"
+        self.on_ready = None
+        self._executor = None
+        self._io = ThreadPoolExecutor(max_workers=upload_workers, thread_name_prefix="photo-upload")
+        self._cache = TTLCache(max_entries=settings.photo_cache_max_entries, ttl=settings.photo_cache_ttl)
+        self._lock = threading.Lock()
+        self._inflight = {}  # hash -> veículos esperando as variantes
+        self._pending = 0
+        self.stats = {
+            'uploads': 0,
+            'deduplicated': 0,
+            'rejected': 0,
+            'upload_bytes': 0,
+            'upload_seconds': 0.0,
+            'variant_jobs': 0,
+            'variant_failures': 0,
+            'claimed': 0,
+            'variant_seconds': 0.0,
+            'variant_wait_seconds': 0.0,
+            'max_queue_depth': 0,
+        }
+
+    def path(self, filename):
+        # Subpasta pelos dois primeiros caracteres do hash: evita diretórios enormes
+        return os.path.join(self.root, filename[:2], filename)
+
+    def resolve(self, filename):
+        """(path, content type) of a stored file, or None for unknown or invalid names."""
+        match = _FILENAME_RE.match(filename)
+        if match is None:
+            return None
+        path = self.path(filename)
+        if not os.path.isfile(path):
+            return None
+        return path, CONTENT_TYPES[match.group(3)]
+
+    def urls(self, content_hash, ext):
+        variants = {f"{name}_{variant_ext}": f"{self.url_prefix}/{thumbnails.variant_filename(content_hash, name, variant_ext)}"
+                    for name, _, variant_ext in thumbnails.VARIANTS}
+        return {'original': f"{self.url_prefix}/{content_hash}.{ext}", **variants}
+
+    def _variant_targets(self, content_hash):
+        return [(self.path(thumbnails.variant_filename(content_hash, name, ext)), side, ext)
+                for name, side, ext in thumbnails.VARIANTS]
+
+    def _has_variants(self, content_hash):
+        return all(os.path.exists(path) for path, _, _ in self._variant_targets(content_hash))
+
+    def _stream_to_disk(self, fileobj):
+        """Copies the upload to a temporary file under root; returns (temp path, sha256, size, ext)."""
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        ext = None
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = fileobj.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    if ext is None:
+                        ext = detect_extension(chunk[:16])
+                        if ext is None:
+                            raise UnsupportedPhoto()
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise PhotoTooLarge(self.max_bytes)
+                    digest.update(chunk)
+                    out.write(chunk)
+            if ext is None:
+                raise UnsupportedPhoto()
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return tmp_path, digest.hexdigest(), size, ext
+
+    async def upload(self, fileobj, vehicle_id):
+        """Runs save() on the upload thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._io, self.save, fileobj, vehicle_id)
+
+    def save(self, fileobj, vehicle_id):
+        """
+        Stores an uploaded photo for vehicle_id (blocking: use upload() from
+        async code) and schedules its variants. Returns the photo description.
+        """
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("select id from vehicles where id = %s", (vehicle_id,))
+                if cursor.fetchone() is None:
+                    raise VehicleNotFound()
+
+        started = time.perf_counter()
+        try:
+            tmp_path, content_hash, size, ext = self._stream_to_disk(fileobj)
+        except PhotoError:
+            with self._lock:
+                self.stats['rejected'] += 1
+            raise
+        filename = f"{content_hash}.{ext}"
+        final_path = self.path(filename)
+        deduplicated = os.path.exists(final_path)
+        if deduplicated:
+            os.unlink(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+        elapsed = time.perf_counter() - started
+        # Variantes já em disco (mesma foto enviada antes, por qualquer worker)
+        ready = self._has_variants(content_hash)
+
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                claimed_by = None if ready else self.worker_id
+                cursor.execute(_INSERT_PHOTO, (vehicle_id, content_hash, ext, size,
+                                               'ready' if ready else 'processing', 0 if ready else 1,
+                                               claimed_by, claimed_by))
+            conn.commit()
+        self._cache.delete(vehicle_id)
+
+        with self._lock:
+            self.stats['uploads'] += 1
+            self.stats['deduplicated'] += deduplicated
+            self.stats['upload_bytes'] += size
+            self.stats['upload_seconds'] += elapsed
+
+        if not ready:
+            self.schedule(content_hash, ext, vehicle_id)
+        return {
+            'hash': content_hash,
+            'size': size,
+            'deduplicated': deduplicated,
+            'status': 'ready' if ready else 'processing',
+            'urls': self.urls(content_hash, ext),
+        }
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: os filhos não herdam as threads e conexões deste processo
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def schedule(self, content_hash, ext, vehicle_id):
+        """Queues the variants of a stored photo (at most one job per hash at a time)."""
+        if self._has_variants(content_hash):
+            self._set_status(content_hash, 'ready', [vehicle_id])
+            return
+        with self._lock:
+            waiting = self._inflight.get(content_hash)
+            if waiting is not None:
+                waiting.add(vehicle_id)
+                return
+            self._inflight[content_hash] = {vehicle_id}
+            self._pending += 1
+            self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self._pending)
+        submitted = time.perf_counter()
+        try:
+            future = self._pool().submit(thumbnails.make_variants, self.path(f"{content_hash}.{ext}"),
+                                         self._variant_targets(content_hash))
+        except Exception as e:
+            self._finish(content_hash, submitted, error=e)
+            return
+        future.add_done_callback(lambda done: self._finish(content_hash, submitted, done))
+
+    def _finish(self, content_hash, submitted, future=None, error=None):
+        if future is not None:
+            error = 'cancelled' if future.cancelled() else future.exception()
+        with self._lock:
+            self._pending -= 1
+            waiting = self._inflight.pop(content_hash, set())
+            self.stats['variant_jobs'] += 1
+            if error is None:
+                seconds = future.result()
+                self.stats['variant_seconds'] += seconds
+                self.stats['variant_wait_seconds'] += max(0.0, time.perf_counter() - submitted - seconds)
+            else:
+                self.stats['variant_failures'] += 1
+                if isinstance(error, BrokenProcessPool):
+                    # Um filho morreu (imagem que derruba o decoder?): o próximo job cria outro pool
+                    self._executor = None
+        if error is not None:
+            print(f"Warning: photo variants for {content_hash} failed: {error}")
+            self._submit_status(content_hash, 'failed')
+            return
+        self._submit_status(content_hash, 'ready', waiting)
+
+    def _submit_status(self, content_hash, status, vehicle_ids=()):
+        # O callback roda na thread do pool de processos: o UPDATE vai para o pool de I/O
+        try:
+            self._io.submit(self._set_status, content_hash, status, vehicle_ids)
+        except RuntimeError:
+            pass  # shutdown em andamento; o startup seguinte refaz pelo status no banco
+
+    def _set_status(self, content_hash, status, vehicle_ids=()):
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    if status == 'ready':
+                        cursor.execute(_MARK_READY, (content_hash,))
+                    else:
+                        cursor.execute(_RELEASE_FAILED, (self.max_attempts, content_hash))
+                conn.commit()
+        except Exception as e:
+            print(f"Warning: could not record photo {content_hash} as {status}: {e}")
+            return
+        # Neste worker a mudança aparece já; nos outros quando o cache expirar (uma tentativa
+        # que falhou pode ter virado 'failed')
+        self._cache.invalidate_where(lambda key, items: any(photo['hash'] == content_hash for photo in items))
+        if status == 'ready':
+            self._mark_ready(content_hash, vehicle_ids)
+
+    def _mark_ready(self, content_hash, vehicle_ids):
+        if self.on_ready is not None:
+            for vehicle_id in vehicle_ids:
+                self.on_ready(vehicle_id)
+
+    def _photo_lists(self, vehicle_ids):
+        """vehicle id -> [{'hash', 'ext', 'status'}] in upload order, from the cache or one query."""
+        found = {}
+        missing = []
+        for vehicle_id in vehicle_ids:
+            items = self._cache.get(vehicle_id)
+            if items is None:
+                missing.append(vehicle_id)
+            else:
+                found[vehicle_id] = items
+        if not missing:
+            return found
+        generation = self._cache.generation
+        loaded = {vehicle_id: [] for vehicle_id in missing}
+        with get_read_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(_SELECT_PHOTOS.format(placeholders=', '.join(['%s'] * len(missing))), missing)
+                rows = cursor.fetchall()
+            ttl = read_ttl(conn)
+        for row in rows:
+            loaded[row['Vehicle_ID']].append({'hash': row['Content_Hash'], 'ext': row['Extension'],
+                                              'status': row['Status']})
+        for vehicle_id, items in loaded.items():
+            self._cache.set(vehicle_id, items, ttl=ttl, generation=generation)
+        found.update(loaded)
+        return found
+
+    def photos(self, vehicle_id):
+        """Every photo of a vehicle with its status and URLs, in upload order."""
+        items = self._photo_lists([vehicle_id])[vehicle_id]
+        return [{'hash': photo['hash'], 'status': photo['status'],
+                 'urls': self.urls(photo['hash'], photo['ext'])} for photo in items]
+
+    def _thumbnail_urls(self, items):
+        return [f"{self.url_prefix}/{thumbnails.variant_filename(photo['hash'], 'thumb', 'webp')}"
+                for photo in items if photo['status'] == 'ready']
+
+    def thumbnails(self, vehicle_id):
+        return self._thumbnail_urls(self._photo_lists([vehicle_id])[vehicle_id])
+
+    def attach(self, rows):
+        """Copies of the vehicle rows with their Thumbnails URLs (the rows may be shared)."""
+        if not rows:
+            return []
+        lists = self._photo_lists(list(dict.fromkeys(row['id'] for row in rows)))
+        return [{**row, 'Thumbnails': self._thumbnail_urls(lists[row['id']])} for row in rows]
+
+    def load(self, conn):
+        """
+        Claims the queued photos (and those whose claim expired: a worker
+        stopped mid-job) and requeues them here; the ones whose variants are
+        already on disk are just marked ready. Each claim counts as an
+        attempt, so a photo that keeps failing ends as 'failed'.
+        """
+        with conn.cursor() as cursor:
+            while True:
+                cursor.execute(_CLAIM_UNFINISHED, (self.worker_id, self.max_attempts,
+                                                   int(self.claim_timeout), PHOTO_CLAIM_BATCH))
+                conn.commit()
+                if cursor.rowcount < PHOTO_CLAIM_BATCH:
+                    break
+            cursor.execute(_SELECT_CLAIMED, (self.worker_id,))
+            rows = cursor.fetchall()
+        with self._lock:
+            self.stats['claimed'] += len(rows)
+        for row in rows:
+            content_hash, ext = row['Content_Hash'], row['Extension']
+            if self._has_variants(content_hash):
+                self._set_status(content_hash, 'ready')
+            elif os.path.exists(self.path(f"{content_hash}.{ext}")):
+                self.schedule(content_hash, ext, row['Vehicle_ID'])
+            else:
+                # Original sumiu do disco: a tentativa conta como falha
+                print(f"Warning: photo {content_hash}.{ext} is missing from {self.root}")
+                self._set_status(content_hash, 'failed')
+        return len(rows)
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.stats)
+            data['queue_depth'] = self._pending
+        data['workers'] = self.workers
+        data['upload_workers'] = self.upload_workers
+        cache = self._cache.snapshot()
+        data['cached_vehicles'] = cache['entries']
+        data['cache_hits'] = cache['hits']
+        data['cache_misses'] = cache['misses']
+        data['upload_mb_per_second'] = (round(data['upload_bytes'] / data['upload_seconds'] / 1e6, 2)
+                                        if data['upload_seconds'] else 0.0)
+        data['avg_variant_ms'] = (round(data['variant_seconds'] / data['variant_jobs'] * 1000, 2)
+                                  if data['variant_jobs'] else 0.0)
+        return data
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._io.shutdown(wait=True)
+
+
+photo_store = PhotoStore()
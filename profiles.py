@@ -0,0 +1,70 @@
+from cache import TTLCache
+from database import get_read_connection, read_ttl
+from settings import settings
+
+# Usuário e empresa em uma única ida ao banco
+PROFILE_QUERY = """
+    select u.id, u.name, u.email, u.Account_Type, u.Phone_Number, c.company_name, c.cnpj
+    from users u
+    left join companies c on c.user_id = u.id
+    where u.id = %s
+"""
+
+profile_cache = TTLCache(
+    max_entries=settings.profile_cache_max_entries,
+    ttl=settings.profile_cache_ttl,
+)
+
+
+def get_cached_profile(user_id):
+    """Returns the cached joined row, or None on a miss (no database access)."""
+    return profile_cache.get(user_id)
+
+
+def load_profile(user_id):
+    """Returns the joined user/company row (from cache or database), or None if the user doesn't exist."""
+    row = profile_cache.get(user_id)
+    if row is not None:
+        return row
+    generation = profile_cache.generation
+    with get_read_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(PROFILE_QUERY, (user_id,))
+            row = cursor.fetchone()
+        ttl = read_ttl(conn)
+    if row is not None:
+        profile_cache.set(user_id, row, ttl=ttl, generation=generation)
+    return row
+
+
+def invalidate_profile(user_id):
+    profile_cache.delete(user_id)
+
+
+def profile_view(row):
+    """Shape returned by GET /profile/{user_id}."""
+    data = {
+        'id': row['id'],
+        'name': row['name'],
+        'email': row['email'],
+        'Account_Type': row['Account_Type'],
+        'Phone_Number': row['Phone_Number'],
+    }
+    # Só contas Company com registro em companies trazem os dados da empresa
+    if row['Account_Type'] == 'Company' and row['company_name'] is not None:
+        data['company_name'] = row['company_name']
+        data['cnpj'] = row['cnpj']
+    return data
+
+
+def user_view(row):
+    """Shape returned by GET /user/{user_id}."""
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'email': row['email'],
+        'account_type': row['Account_Type'],
+        'phone_number': row['Phone_Number'],
+        'company_name': row['company_name'],
+        'cnpj': row['cnpj'],
+    }
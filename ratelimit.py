@@ -0,0 +1,244 @@
+from collections import OrderedDict
+import inspect
+import math
+import threading
+import time
+
+from cache import TTLCache
+from settings import settings
+
+# Tamanho do balde (rajada) e recarga (tentativas por minuto) por email e por IP
+LOGIN_EMAIL_BURST = settings.login_email_burst
+LOGIN_EMAIL_PER_MINUTE = settings.login_email_per_minute
+LOGIN_IP_BURST = settings.login_ip_burst
+LOGIN_IP_PER_MINUTE = settings.login_ip_per_minute
+# Por quanto tempo um email inexistente responde 401 sem consultar o banco
+LOGIN_NEGATIVE_TTL = settings.login_negative_ttl
+# Só confia no X-Forwarded-For quando a API está atrás de um proxy conhecido
+TRUST_PROXY_HEADERS = settings.trust_proxy_headers
+# Tempo máximo de uma chamada ao Redis antes de deixar o login passar
+RATE_LIMIT_REDIS_TIMEOUT = settings.rate_limit_redis_timeout
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, scope, retry_after):
+        super().__init__(f"Too many attempts for this {scope}.")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class RateLimitBackend:
+    """
+    Storage for token buckets. consume() takes cost tokens from the bucket at
+    key (capacity tokens, refilled at rate tokens/second) and returns
+    (allowed, seconds until enough tokens are back). Must be safe to call
+    concurrently; network backends implement it as a coroutine so the event
+    loop never blocks on them.
+    """
+
+    def consume(self, key, capacity, rate, cost=1):
+        raise NotImplementedError
+
+
+class LocalBackend(RateLimitBackend):
+    """
+    In-process buckets; each worker process limits on its own. At most
+    max_keys buckets are kept: the least recently used one is evicted, in
+    O(1), when a new key arrives (an evicted key just starts full again).
+    """
+
+    def __init__(self, max_keys=100_000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets = OrderedDict()  # key -> [tokens, updated_at], do menos para o mais recente
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def consume(self, key, capacity, rate, cost=1):
+        now = self._clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(capacity), now]
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._buckets.move_to_end(key)
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= cost:
+                bucket[0] = tokens - cost
+                return True, 0.0
+            bucket[0] = tokens
+            return False, (cost - tokens) / rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class FakeClock:
+    """Manually advanced clock for LocalBackend in tests."""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def FakeBackend():
+    """LocalBackend driven by a FakeClock (available as backend.clock)."""
+    clock = FakeClock()
+    backend = LocalBackend(clock=clock)
+    backend.clock = clock
+    return backend
+
+
+# Executado atomicamente no Redis; usa o relógio do servidor para que todas as
+# réplicas da API vejam o mesmo tempo
+_REDIS_TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBackend(RateLimitBackend):
+    """
+    Buckets shared by every API process through Redis (one Lua call per
+    attempt), using the asyncio client with connect/read timeouts so a slow
+    Redis can't stall the event loop.
+    """
+
+    def __init__(self, url, prefix="ratelimit:", timeout=RATE_LIMIT_REDIS_TIMEOUT):
+        import redis.asyncio # type: ignore
+
+        self.prefix = prefix
+        self._client = redis.asyncio.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self._script = self._client.register_script(_REDIS_TOKEN_BUCKET)
+
+    async def consume(self, key, capacity, rate, cost=1):
+        allowed, tokens = await self._script(keys=[self.prefix + key], args=[capacity, rate, cost])
+        if allowed:
+            return True, 0.0
+        return False, (cost - float(tokens)) / rate
+
+
+def create_backend():
+    """RATE_LIMIT_BACKEND=redis (with RATE_LIMIT_REDIS_URL) shares the buckets between processes."""
+    if settings.rate_limit_backend.lower() == "redis":
+        return RedisBackend(settings.rate_limit_redis_url)
+    return LocalBackend()
+
+
+def client_ip(request):
+    if TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+class LoginGuard:
+    """
+    Sheds brute-force load on the credential endpoints before any DB or bcrypt
+    work: a token bucket per client IP and another per email, plus a short
+    negative cache of emails that don't exist. The cache is per worker;
+    forget_unknown must reach every worker when an email starts to exist
+    (main broadcasts it through the change feed).
+    """
+
+    def __init__(self, backend, email_burst=LOGIN_EMAIL_BURST, email_per_minute=LOGIN_EMAIL_PER_MINUTE,
+                 ip_burst=LOGIN_IP_BURST, ip_per_minute=LOGIN_IP_PER_MINUTE, negative_ttl=LOGIN_NEGATIVE_TTL):
+        self.backend = backend
+        self.email_limit = (email_burst, email_per_minute / 60.0)
+        self.ip_limit = (ip_burst, ip_per_minute / 60.0)
+        self.unknown_emails = TTLCache(max_entries=100_000, ttl=negative_ttl)
+        self._lock = threading.Lock()
+        self.stats = {
+            'accepted': 0,
+            'rejected_ip': 0,
+            'rejected_email': 0,
+            'unknown_email_hits': 0,
+            'backend_errors': 0,
+        }
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    @staticmethod
+    def _email_key(email):
+        return email.strip().lower()
+
+    async def _consume(self, key, limit):
+        try:
+            result = self.backend.consume(key, *limit)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        except Exception as e:
+            # Backend compartilhado fora do ar: deixa passar em vez de derrubar o login
+            self._count('backend_errors')
+            print(f"Warning: rate limit backend unavailable: {e}")
+            return True, 0.0
+
+    async def check(self, action, email, ip):
+        """Raises RateLimitExceeded when the IP or the email is over its budget for action."""
+        allowed, retry_after = await self._consume(f"{action}:ip:{ip}", self.ip_limit)
+        if not allowed:
+            self._count('rejected_ip')
+            raise RateLimitExceeded("IP", retry_after)
+        allowed, retry_after = await self._consume(f"{action}:email:{self._email_key(email)}", self.email_limit)
+        if not allowed:
+            self._count('rejected_email')
+            raise RateLimitExceeded("email", retry_after)
+        self._count('accepted')
+
+    def is_unknown(self, email):
+        if self.unknown_emails.get(self._email_key(email)) is None:
+            return False
+        self._count('unknown_email_hits')
+        return True
+
+    def remember_unknown(self, email):
+        self.unknown_emails.set(self._email_key(email), True)
+
+    def forget_unknown(self, email):
+        # Cadastro ou troca de email, neste worker ou (pelo feed de mudanças) em outro
+        self.unknown_emails.delete(self._email_key(email))
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.stats)
+        data['unknown_emails_cached'] = len(self.unknown_emails)
+        data['backend'] = type(self.backend).__name__
+        if isinstance(self.backend, LocalBackend):
+            data['local_buckets'] = len(self.backend)
+            data['local_evictions'] = self.backend.evictions
+        return data
+
+
+def retry_after_header(exc):
+    return {"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+
+
+login_guard = LoginGuard(create_backend())
@@ -0,0 +1,73 @@
+import changefeed
+import checkout
+import imports
+import photos
+import seller_stats
+from database import get_db_connection
+
+# Tabelas criadas por esta API (as do schema original vêm do dump do banco).
+# Sem elas o cadastro, a importação, o checkout e o feed de mudanças falham, então o startup as garante.
+REQUIRED_TABLES = (
+    ('seller_stats', seller_stats.SELLER_STATS_SCHEMA),
+    ('checkout_idempotency', checkout.IDEMPOTENCY_SCHEMA),
+    ('vehicle_photos', photos.PHOTOS_SCHEMA),
+    ('inventory_changes', changefeed.CHANGES_SCHEMA),
+)
+
+# Colunas desta API em tabelas do schema original: (tabela, coluna, ALTER que a cria)
+REQUIRED_COLUMNS = (
+    ('vehicles', 'import_batch', imports.IMPORT_BATCH_COLUMN),
+)
+
+
+class SchemaError(RuntimeError):
+    """Raised when a required table is missing and can't be created."""
+
+
+def _existing_tables(cursor):
+    cursor.execute("select table_name as name from information_schema.tables where table_schema = database()")
+    return {row['name'].lower() for row in cursor.fetchall()}
+
+
+def _existing_columns(cursor, table):
+    cursor.execute("select column_name as name from information_schema.columns "
+                   "where table_schema = database() and table_name = %s", (table,))
+    return {row['name'].lower() for row in cursor.fetchall()}
+
+
+def ensure_schema():
+    """
+    Creates the required tables that don't exist yet (CREATE TABLE IF NOT
+    EXISTS), adds this API's columns to the original tables and backfills
+    seller_stats when it was just created. Raises SchemaError naming the
+    table or column when the database user can't create it.
+    Returns the names of the tables created.
+    """
+    created = []
+    errors = []
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            existing = _existing_tables(cursor)
+            for name, ddl in REQUIRED_TABLES:
+                if name in existing:
+                    continue
+                try:
+                    cursor.execute(ddl)
+                except Exception as e:
+                    errors.append(f"Required table '{name}' is missing and could not be created: {e}")
+                else:
+                    created.append(name)
+            for table, column, ddl in REQUIRED_COLUMNS:
+                if table not in existing or column in _existing_columns(cursor, table):
+                    continue
+                try:
+                    cursor.execute(ddl)
+                except Exception as e:
+                    errors.append(f"Required column '{table}.{column}' is missing and could not be added: {e}")
+        conn.commit()
+    if 'seller_stats' in created:
+        # Tabela nova num banco com vendas: os contadores partem do histórico, não de zero
+        seller_stats.reconcile()
+    if errors:
+        raise SchemaError('; '.join(errors))
+    return created
@@ -0,0 +1,154 @@
+import bisect
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from catalog import VEHICLE_COLUMNS
+
+# Peso de cada campo no ranking
+FIELD_WEIGHTS = {
+    'Mark': 3.0,
+    'Model': 3.0,
+    'Year': 2.0,
+    'Color': 1.0,
+    'Fuel_type': 1.0,
+    'Description': 0.5,
+}
+
+# Casamento por prefixo (type-ahead) vale menos que o termo exato
+PREFIX_FACTOR = 0.5
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text):
+    """Lowercases and strips accents, so 'Elétrico' and 'eletrico' are the same term."""
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text):
+    if text is None:
+        return []
+    return _TOKEN_RE.findall(normalize(text))
+
+
+class VehicleSearchIndex:
+    """
+    In-memory inverted index over the available vehicles.
+
+    postings maps term -> {vehicle_id: weight}; the sorted vocabulary lets a
+    query term expand to every indexed term that starts with it (bisect), so
+    lookups cost O(matching terms), not O(catalog).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)
+        self._vocabulary = []
+        self._documents = {}
+        self._doc_terms = {}
+
+    def __len__(self):
+        return len(self._documents)
+
+    def _add_term(self, term, vehicle_id, weight):
+        postings = self._postings[term]
+        if not postings:
+            bisect.insort(self._vocabulary, term)
+        postings[vehicle_id] = postings.get(vehicle_id, 0.0) + weight
+
+    def _remove_terms(self, vehicle_id):
+        for term in self._doc_terms.pop(vehicle_id, ()):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(vehicle_id, None)
+            if not postings:
+                del self._postings[term]
+                position = bisect.bisect_left(self._vocabulary, term)
+                if position < len(self._vocabulary) and self._vocabulary[position] == term:
+                    del self._vocabulary[position]
+
+    def add(self, row):
+        """Indexes (or re-indexes) a vehicle row with the VehicleResponse keys."""
+        vehicle_id = row['id']
+        with self._lock:
+            self._remove_terms(vehicle_id)
+            terms = set()
+            for field, weight in FIELD_WEIGHTS.items():
+                for term in tokenize(row.get(field)):
+                    self._add_term(term, vehicle_id, weight)
+                    terms.add(term)
+            self._doc_terms[vehicle_id] = terms
+            self._documents[vehicle_id] = dict(row)
+
+    def remove(self, vehicle_id):
+        with self._lock:
+            self._remove_terms(vehicle_id)
+            self._documents.pop(vehicle_id, None)
+
+    def get(self, vehicle_id):
+        """The indexed row of an available vehicle, or None."""
+        return self._documents.get(vehicle_id)
+
+    def rows(self):
+        with self._lock:
+            return list(self._documents.values())
+
+    def rebuild(self, rows):
+        with self._lock:
+            self._postings = defaultdict(dict)
+            self._vocabulary = []
+            self._documents = {}
+            self._doc_terms = {}
+            for row in rows:
+                self.add(row)
+
+    def _expand(self, term):
+        start = bisect.bisect_left(self._vocabulary, term)
+        for position in range(start, len(self._vocabulary)):
+            candidate = self._vocabulary[position]
+            if not candidate.startswith(term):
+                break
+            yield candidate
+
+    def search(self, query, limit=20):
+        """
+        Returns up to limit vehicle rows matching every query term (exact or
+        by prefix), best score first.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            scores = None
+            for term in terms:
+                term_scores = {}
+                for candidate in self._expand(term):
+                    factor = 1.0 if candidate == term else PREFIX_FACTOR
+                    for vehicle_id, weight in self._postings[candidate].items():
+                        score = weight * factor
+                        if score > term_scores.get(vehicle_id, 0.0):
+                            term_scores[vehicle_id] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {vid: scores[vid] + s for vid, s in term_scores.items() if vid in scores}
+                if not scores:
+                    return []
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+            return [self._documents[vehicle_id] for vehicle_id, _ in ranked]
+
+
+search_index = VehicleSearchIndex()
+
+
+def load_search_index(conn):
+    """Rebuilds the global index from the available vehicles in the database."""
+    query = f"select {VEHICLE_COLUMNS} from vehicles where Inventory_Status = 'Available'"
+    with conn.cursor() as cursor:
+        cursor.execute(query)
+        search_index.rebuild(cursor.fetchall())
+    return len(search_index)
@@ -0,0 +1,169 @@
+import threading
+
+from database import get_db_connection, get_read_connection, InstrumentedConnection, DB_CONFIG
+from settings import settings
+
+SELLER_STATS_RECONCILE_INTERVAL = settings.seller_stats_reconcile_interval
+# Lock nomeado do MySQL: só o worker que o segura roda a reconciliação
+RECONCILE_LOCK_NAME = f"{settings.db_name}.seller_stats_reconcile"
+
+# Tabela de resumo por vendedor. Os dias até a venda usam vehicles.Created_at
+# (data do anúncio), guardados em segundos para a média não perder precisão.
+SELLER_STATS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS seller_stats (
+    Seller_ID INT NOT NULL PRIMARY KEY,
+    Revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    Units_Sold INT NOT NULL DEFAULT 0,
+    Seconds_To_Sale BIGINT NOT NULL DEFAULT 0,
+    Listed_Count INT NOT NULL DEFAULT 0,
+    Available_Count INT NOT NULL DEFAULT 0,
+    Updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+)
+"""
+
+_RECORD_LISTED = """
+    insert into seller_stats (Seller_ID, Listed_Count, Available_Count)
+    values (%s, %s, %s)
+    on duplicate key update
+        Listed_Count = Listed_Count + values(Listed_Count),
+        Available_Count = Available_Count + values(Available_Count)
+"""
+
+_RECORD_SALE = """
+    insert into seller_stats (Seller_ID, Revenue, Units_Sold, Seconds_To_Sale, Available_Count)
+    select v.Seller_ID, v.Price, 1, greatest(timestampdiff(second, v.Created_at, now()), 0), -1
+    from vehicles v
+    where v.id = %s
+    on duplicate key update
+        Revenue = Revenue + values(Revenue),
+        Units_Sold = Units_Sold + 1,
+        Seconds_To_Sale = Seconds_To_Sale + values(Seconds_To_Sale),
+        Available_Count = Available_Count - 1
+"""
+
+_RECONCILE = """
+    replace into seller_stats (Seller_ID, Revenue, Units_Sold, Seconds_To_Sale, Listed_Count, Available_Count)
+    select
+        v.Seller_ID,
+        coalesce(sum(s.Total_value), 0),
+        count(s.id),
+        coalesce(sum(greatest(timestampdiff(second, v.Created_at, s.Purchase_Date), 0)), 0),
+        count(distinct v.id),
+        count(distinct case when v.Inventory_Status = 'Available' then v.id end)
+    from vehicles v
+    left join sells s on s.Car_id = v.id
+    group by v.Seller_ID
+"""
+
+_SELECT = """
+    select Seller_ID, Revenue, Units_Sold, Seconds_To_Sale, Listed_Count, Available_Count, Updated_at
+    from seller_stats
+    where Seller_ID = %s
+"""
+
+
+def record_listed(cursor, seller_id, count=1):
+    """Counts newly listed vehicles; call inside the insert's transaction."""
+    cursor.execute(_RECORD_LISTED, (seller_id, count, count))
+
+
+def record_sale(cursor, car_id):
+    """Adds a sale to the seller's counters; call inside the checkout transaction."""
+    cursor.execute(_RECORD_SALE, (car_id,))
+
+
+class ReconcileLock:
+    """
+    Elects one API process to run the periodic reconciliation: the winner
+    holds a MySQL named lock (GET_LOCK) on a dedicated connection for as
+    long as it lives. If that process dies, its connection closes, the lock
+    is freed and another worker takes it on its next attempt.
+    """
+
+    def __init__(self, name=RECONCILE_LOCK_NAME):
+        self.name = name
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """True when this process holds (or just took) the lock. Blocking: call through run_db."""
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.ping(reconnect=False)
+                    return True
+                except Exception:
+                    # Conexão perdida = lock perdido; tenta de novo abaixo
+                    self._close()
+            conn = InstrumentedConnection(**DB_CONFIG)
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("select get_lock(%s, 0) as acquired", (self.name,))
+                    acquired = cursor.fetchone()['acquired'] == 1
+            except Exception:
+                conn.close()
+                raise
+            if not acquired:
+                conn.close()
+                return False
+            self._conn = conn
+            return True
+
+    def _close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def release(self):
+        with self._lock:
+            self._close()
+
+    @property
+    def held(self):
+        return self._conn is not None
+
+
+reconcile_lock = ReconcileLock()
+
+
+def reconcile():
+    """Recomputes every seller's counters from sells/vehicles (fixes any drift)."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(_RECONCILE)
+            updated = cursor.rowcount
+        conn.commit()
+    return updated
+
+
+def get_seller_stats(seller_id):
+    """Primary-key lookup on the summary table: constant time whatever the sales volume."""
+    with get_read_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(_SELECT, (seller_id,))
+            row = cursor.fetchone()
+
+    if row is None:
+        return {
+            'seller_id': seller_id,
+            'revenue': 0.0,
+            'units_sold': 0,
+            'avg_days_to_sale': None,
+            'listed_count': 0,
+            'available_count': 0,
+            'updated_at': None,
+        }
+
+    units_sold = row['Units_Sold']
+    return {
+        'seller_id': row['Seller_ID'],
+        'revenue': float(row['Revenue']),
+        'units_sold': units_sold,
+        'avg_days_to_sale': round(row['Seconds_To_Sale'] / units_sold / 86400, 2) if units_sold else None,
+        'listed_count': row['Listed_Count'],
+        'available_count': row['Available_Count'],
+        'updated_at': row['Updated_at'],
+    }
@@ -0,0 +1,56 @@
+from decimal import Decimal
+from functools import lru_cache
+from typing import List
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from settings import settings
+
+try:
+    import orjson # type: ignore
+except ImportError:  # pragma: no cover - orjson é opcional
+    orjson = None
+
+# Liga a validação completa pelo pydantic em todas as respostas de lista
+STRICT_RESPONSE_VALIDATION = settings.strict_response_validation
+
+
+@lru_cache(maxsize=None)
+def list_adapter(model):
+    """TypeAdapter(List[model]), built once per response model."""
+    return TypeAdapter(List[model])
+
+
+def _default(value):
+    # Mesmo formato do pydantic: Decimal vira string ("45000.00")
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def encode_rows(rows, model=None, strict=None):
+    """
+    Encodes a list of rows to JSON bytes.
+
+    Rows coming straight from our own projected queries (keys already match
+    the model) are trusted and dumped directly with orjson. With strict (or
+    STRICT_RESPONSE_VALIDATION, or without orjson) they are validated and
+    dumped by the model's cached TypeAdapter instead.
+    """
+    if strict is None:
+        strict = STRICT_RESPONSE_VALIDATION
+    if model is not None and (strict or orjson is None):
+        adapter = list_adapter(model)
+        return adapter.dump_json(adapter.validate_python(rows))
+    if orjson is not None:
+        return orjson.dumps(rows, default=_default)
+    import json
+    return json.dumps(rows, default=_default, ensure_ascii=False).encode('utf-8')
+
+
+def json_response(body, headers=None, status_code=200):
+    """Response for an already encoded JSON body (skips FastAPI's encoder)."""
+    return Response(content=body, media_type="application/json", headers=headers, status_code=status_code)
@@ -0,0 +1,126 @@
+import os
+from typing import Optional
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+def _half_the_cores():
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+class Settings(BaseSettings):
+    """
+    Every knob of the API, read once from the environment and .env.
+    Field names are the environment variable names in lower case.
+    """
+
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
+
+    # Banco de dados e pool de conexões
+    db_host: str = "localhost"
+    db_port: int = 3306
+    db_user: str = "root"
+    db_password: Optional[str] = None
+    db_name: str = "venda_carros"
+    db_pool_min_size: int = 1
+    db_pool_max_size: int = 10
+    db_pool_timeout: float = 5.0
+    db_pool_max_lifetime: float = 1800.0
+    db_pool_max_idle: float = 300.0
+
+    # Réplicas de leitura: "host:porta,host:porta" (vazio = tudo no primário)
+    db_replicas: str = ""
+    db_replica_strategy: str = "round_robin"  # ou least_connections
+    db_replica_max_lag: float = 5.0
+    db_replica_check_interval: float = 5.0
+    # Janela em que as leituras de quem acabou de escrever vão para o primário
+    db_read_your_writes_seconds: float = 5.0
+
+    # bcrypt
+    bcrypt_rounds: int = 12
+    bcrypt_workers: int = Field(default_factory=_half_the_cores)
+
+    # Caches
+    listing_cache_max_entries: int = 512
+    listing_cache_ttl: float = 60.0
+    listing_cache_max_bytes: int = 32 * 1024 * 1024
+    profile_cache_max_entries: int = 10000
+    profile_cache_ttl: float = 300.0
+    # Idade máxima do snapshot de empresas: pega escritas de outros workers ou feitas fora da API
+    companies_snapshot_max_age: float = 60.0
+
+    # LLM
+    openai_api_key: Optional[str] = None
+    llm_provider: str = "gemini"
+    llm_workers: int = 8
+    llm_fake_latency: float = 0.5
+    llm_fake_token_delay: float = 0.02
+    llm_cache_max_entries: int = 1024
+    llm_cache_ttl: float = 3600.0
+    llm_cache_max_bytes: int = 16 * 1024 * 1024
+    llm_cache_similarity: float = 0.0
+    # Importa e configura o SDK em segundo plano logo após o startup
+    llm_warmup: bool = True
+
+    # Passos do startup que falharam são repetidos com backoff exponencial
+    startup_retry_initial: float = 1.0
+    startup_retry_max: float = 30.0
+    # Sem ficar pronto depois disso o /health/live falha e o orquestrador reinicia o worker
+    startup_liveness_deadline: float = 300.0
+
+    # Auditoria (llm_register)
+    audit_batch_size: int = 100
+    audit_flush_interval: float = 1.0
+    audit_queue_size: int = 10000
+
+    # Checkout
+    checkout_max_retries: int = 5
+    checkout_backoff: float = 0.01
+
+    # Importação, estatísticas e serialização
+    import_chunk_size: int = 500
+    # Exports simultâneos (cada um usa uma conexão própria, fora do pool)
+    export_max_concurrent: int = 4
+    seller_stats_reconcile_interval: float = 3600.0
+    strict_response_validation: bool = False
+    slow_query_log_ms: float = 0.0
+
+    # Rate limit de login
+    login_email_burst: int = 5
+    login_email_per_minute: float = 5.0
+    login_ip_burst: int = 30
+    login_ip_per_minute: float = 60.0
+    login_negative_ttl: float = 30.0
+    trust_proxy_headers: bool = False
+    rate_limit_backend: str = "local"
+    rate_limit_redis_url: str = "redis://localhost:6379/0"
+    rate_limit_redis_timeout: float = 0.5
+
+    # Fotos dos veículos (arquivos locais; o prefixo pode apontar para um CDN)
+    photo_dir: str = "media/photos"
+    photo_url_prefix: str = "/photos"
+    photo_max_bytes: int = 15 * 1024 * 1024
+    photo_chunk_size: int = 1024 * 1024
+    photo_workers: int = Field(default_factory=_half_the_cores)
+    # Threads que gravam os uploads em disco (fora do executor do banco)
+    photo_upload_workers: int = 4
+    # Fotos por veículo lidas de vehicle_photos; TTL curto para os workers concordarem
+    photo_cache_ttl: float = 5.0
+    photo_cache_max_entries: int = 10000
+    # Tentativas de gerar as variantes antes do status terminal 'failed'
+    photo_max_attempts: int = 3
+    # Segundos até a reserva de um worker que parou no meio do job poder ser retomada por outro
+    photo_claim_timeout: float = 900.0
+
+    # Feed de mudanças do estoque (SSE)
+    changefeed_history: int = 10000
+    changefeed_heartbeat: float = 15.0
+    # Os eventos passam pela tabela inventory_changes para chegar a todos os workers
+    changefeed_poll_interval: float = 0.25
+    changefeed_flush_interval: float = 0.05
+    changefeed_queue_size: int = 100000
+    changefeed_gap_wait: float = 2.0
+
+
+settings = Settings()
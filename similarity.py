@@ -0,0 +1,269 @@
+import math
+import threading
+import zlib
+
+import numpy as np
+
+from search_index import normalize, tokenize
+
+# Âncoras das codificações radiais: dois valores próximos ativam as mesmas
+# âncoras, então o produto escalar mede a proximidade (preço em escala log)
+PRICE_ANCHORS = np.log(np.array([10e3, 20e3, 35e3, 50e3, 75e3, 100e3, 150e3, 250e3, 400e3]))
+PRICE_WIDTH = 0.35
+YEAR_ANCHORS = np.arange(1995, 2031, 3, dtype=np.float64)
+YEAR_WIDTH = 2.5
+MILEAGE_ANCHORS = np.array([0, 20e3, 50e3, 80e3, 120e3, 170e3, 230e3, 300e3])
+MILEAGE_WIDTH = 30e3
+
+# Dimensões dos blocos com hashing (marca/combustível/cor/descrição)
+HASHED_DIMS = {'mark': 32, 'fuel': 8, 'color': 16, 'text': 64}
+
+# Peso (ao quadrado) de cada bloco na similaridade final; soma 1
+BLOCK_WEIGHTS = {
+    'price': 0.30,
+    'year': 0.15,
+    'mileage': 0.10,
+    'mark': 0.20,
+    'fuel': 0.10,
+    'color': 0.05,
+    'text': 0.10,
+}
+
+_BLOCK_SIZES = {
+    'price': len(PRICE_ANCHORS),
+    'year': len(YEAR_ANCHORS),
+    'mileage': len(MILEAGE_ANCHORS),
+    **HASHED_DIMS,
+}
+_BLOCKS = {}
+_offset = 0
+for _name in BLOCK_WEIGHTS:
+    _BLOCKS[_name] = slice(_offset, _offset + _BLOCK_SIZES[_name])
+    _offset += _BLOCK_SIZES[_name]
+DIMENSIONS = _offset
+
+
+def _slot(text, dims):
+    # crc32 é estável entre processos (o hash() do Python não é)
+    return zlib.crc32(text.encode('utf-8')) % dims
+
+
+def _number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _radial(values, anchors, width):
+    """(n,) values -> (n, anchors) Gaussian activations; NaN (unknown) gives zeros."""
+    activations = np.exp(-((values[:, None] - anchors[None, :]) / width) ** 2)
+    activations[np.isnan(values)] = 0.0
+    return activations
+
+
+def encode(records):
+    """
+    Feature matrix (float32, one unit-weighted row per record) for dicts with
+    the keys price, year, mileage, mark, fuel, color and text; missing or
+    None values leave their block at zero.
+    """
+    count = len(records)
+    matrix = np.zeros((count, DIMENSIONS), dtype=np.float32)
+    if not count:
+        return matrix
+
+    def numbers(key):
+        return np.array([_number(record.get(key)) if record.get(key) is not None else np.nan
+                         for record in records], dtype=np.float64)
+
+    prices = numbers('price')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        prices = np.where(prices > 0, np.log(prices), np.nan)
+    matrix[:, _BLOCKS['price']] = _radial(prices, PRICE_ANCHORS, PRICE_WIDTH)
+    matrix[:, _BLOCKS['year']] = _radial(numbers('year'), YEAR_ANCHORS, YEAR_WIDTH)
+    matrix[:, _BLOCKS['mileage']] = _radial(numbers('mileage'), MILEAGE_ANCHORS, MILEAGE_WIDTH)
+
+    rows, columns, weights = [], [], []
+    for index, record in enumerate(records):
+        for block in ('mark', 'fuel', 'color'):
+            value = record.get(block)
+            if value:
+                rows.append(index)
+                columns.append(_BLOCKS[block].start + _slot(normalize(value).strip(), HASHED_DIMS[block]))
+                weights.append(1.0)
+        for term in tokenize(record.get('text')):
+            rows.append(index)
+            columns.append(_BLOCKS['text'].start + _slot(term, HASHED_DIMS['text']))
+            weights.append(1.0)
+    if rows:
+        np.add.at(matrix, (np.array(rows), np.array(columns)), np.array(weights, dtype=np.float32))
+
+    # Cada bloco com norma 1 e depois escalado pelo seu peso
+    for block, weight in BLOCK_WEIGHTS.items():
+        part = matrix[:, _BLOCKS[block]]
+        norms = np.linalg.norm(part, axis=1, keepdims=True)
+        np.divide(part, norms, out=part, where=norms > 0)
+        part *= math.sqrt(weight)
+    return matrix
+
+
+def vehicle_features(row):
+    """Feature record of a vehicle row with the VehicleResponse keys."""
+    return {
+        'price': row.get('Price'),
+        'year': row.get('Year'),
+        'mileage': row.get('Mileage'),
+        'mark': row.get('Mark'),
+        'fuel': row.get('Fuel_type'),
+        'color': row.get('Color'),
+        'text': ' '.join(str(row.get(key) or '') for key in ('Model', 'Description')),
+    }
+
+
+class SimilarityIndex:
+    """
+    Feature vectors of the available vehicles in one contiguous float32
+    matrix. A query is a single matrix-vector product followed by an
+    argpartition top-k, so it costs milliseconds even for large stocks.
+
+    Rows are appended on registration and tombstoned on sale (compacted once
+    a quarter of the rows is dead); the capacity doubles when full. Growing
+    and compacting build new arrays, so queries score outside the lock.
+    """
+
+    def __init__(self, capacity=1024):
+        self._lock = threading.Lock()
+        self._reset(capacity)
+
+    def _reset(self, capacity):
+        self._matrix = np.zeros((capacity, DIMENSIONS), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._positions = {}
+        self._size = 0
+        self._dead = 0
+
+    def __len__(self):
+        return self._size - self._dead
+
+    def _grow(self, needed):
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.zeros((capacity, DIMENSIONS), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._matrix, self._ids, self._alive = matrix, ids, alive
+
+    def rebuild(self, rows):
+        rows = list({int(row['id']): row for row in rows}.values())
+        vectors = encode([vehicle_features(row) for row in rows])
+        with self._lock:
+            self._reset(max(1024, len(rows)))
+            count = len(rows)
+            self._matrix[:count] = vectors
+            self._ids[:count] = [int(row['id']) for row in rows]
+            self._alive[:count] = True
+            self._positions = {int(row['id']): index for index, row in enumerate(rows)}
+            self._size = count
+
+    def add(self, row):
+        vector = encode([vehicle_features(row)])[0]
+        vehicle_id = int(row['id'])
+        with self._lock:
+            index = self._positions.get(vehicle_id)
+            if index is None:
+                index = self._size
+                self._grow(index + 1)
+                self._size += 1
+                self._positions[vehicle_id] = index
+            self._matrix[index] = vector
+            self._ids[index] = vehicle_id
+            self._alive[index] = True
+
+    def remove(self, vehicle_id):
+        with self._lock:
+            index = self._positions.pop(vehicle_id, None)
+            if index is None:
+                return
+            self._alive[index] = False
+            self._dead += 1
+            if self._dead > 1024 and self._dead * 4 > self._size:
+                self._compact()
+
+    def _compact(self):
+        # Copia para arrays novos: uma consulta em andamento segue com os antigos intactos
+        keep = np.flatnonzero(self._alive[:self._size])
+        count = len(keep)
+        capacity = len(self._ids)
+        matrix = np.zeros((capacity, DIMENSIONS), dtype=np.float32)
+        matrix[:count] = self._matrix[keep]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:count] = self._ids[keep]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:count] = True
+        self._matrix, self._ids, self._alive = matrix, ids, alive
+        self._size = count
+        self._dead = 0
+        self._positions = {int(vehicle_id): index for index, vehicle_id in enumerate(ids[:count])}
+
+    def vector(self, vehicle_id):
+        with self._lock:
+            index = self._positions.get(vehicle_id)
+            return None if index is None else self._matrix[index].copy()
+
+    def query(self, vector, limit=10, exclude=()):
+        """[(vehicle_id, score)] of the limit most similar available vehicles, best first."""
+        # Sob o lock só as referências; o produto roda fora dele (compactar e crescer
+        # trocam os arrays em vez de reescrevê-los, e linhas novas ficam depois de n)
+        with self._lock:
+            n = self._size
+            matrix = self._matrix[:n]
+            ids = self._ids[:n]
+            dead = ~self._alive[:n]
+            excluded = [self._positions[vehicle_id] for vehicle_id in exclude if vehicle_id in self._positions]
+        k = min(limit, n)
+        if k <= 0:
+            return []
+        scores = matrix @ vector
+        scores[dead] = -np.inf
+        scores[excluded] = -np.inf
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def similar_to(self, vehicle_id, limit=10):
+        """Neighbours of an available vehicle, or None if it isn't in the index."""
+        vector = self.vector(vehicle_id)
+        if vector is None:
+            return None
+        return self.query(vector, limit, exclude=(vehicle_id,))
+
+    def by_preferences(self, preferences, limit=10):
+        """preferences: dict with any of price, year, mileage, mark, fuel, color, text."""
+        vector = encode([preferences])[0]
+        # Só os blocos informados contam; normalizar deixa o score na escala 0..1
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return self.query(vector, limit)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'vehicles': self._size - self._dead,
+                'capacity': len(self._ids),
+                'dimensions': DIMENSIONS,
+                'matrix_bytes': self._matrix.nbytes,
+                'bytes_per_vehicle': DIMENSIONS * 4,
+            }
+
+
+similarity_index = SimilarityIndex()
@@ -29,7 +29,8 @@ function AISuggestion() {
         const dataToSend = searchData;
         
         try {
-            const response = await fetch(`${API_BASE_URL}/suggest_car/`, {
+            // Versão em streaming (SSE): o texto aparece conforme a IA gera
+            const response = await fetch(`${API_BASE_URL}/suggest_car/stream`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -39,14 +40,37 @@ function AISuggestion() {
                 body: JSON.stringify(dataToSend), 
             });
 
-            const responseData = await response.json();
-
             if (!response.ok) {
+                const responseData = await response.json();
                 throw new Error(responseData.detail || 'Failed to get suggestion from AI.');
             }
 
-            // O FastAPI retorna: {"Suggestion": "..."}
-            setSuggestion(responseData.Suggestion);
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                // Cada evento SSE termina com uma linha em branco
+                const events = buffer.split('\n\n');
+                buffer = events.pop();
+
+                for (const event of events) {
+                    const dataLine = event.split('\n').find(line => line.startsWith('data: '));
+                    if (!dataLine) continue;
+                    const payload = JSON.parse(dataLine.slice(6));
+
+                    if (payload.token) {
+                        setLoading(false);
+                        setSuggestion(prev => prev + payload.token);
+                    } else if (payload.error) {
+                        throw new Error(payload.error);
+                    }
+                }
+            }
             setError(''); 
 
         } catch (err) {
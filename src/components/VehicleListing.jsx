@@ -1,35 +1,100 @@
 // src/components/VehicleListing.jsx
-import React, { useState, useEffect, useMemo } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import CardVehicle from './CardVehicle'; 
 import SearchBar from './SearchBar'; // 🎯 NOVO IMPORT: Barra de Pesquisa
 
 const VEHICLES_API = 'http://localhost:8000/api/vehicles/available'; 
+// Feed de mudanças (SSE): o EventSource reconecta sozinho e retoma pelo Last-Event-ID
+const CHANGES_API = 'http://localhost:8000/api/vehicles/changes';
+const PAGE_SIZE = 50;
+// Busca textual no servidor (índice invertido): cobre o estoque inteiro, não só as páginas carregadas
+const SEARCH_API = 'http://localhost:8000/api/vehicles/search';
+const SEARCH_LIMIT = 100;
+const SEARCH_DEBOUNCE_MS = 300;
 
 /**
- * Componente que lista todos os veículos disponíveis, com funcionalidade de pesquisa local.
+ * Componente que lista todos os veículos disponíveis, com pesquisa feita no servidor.
  * @param {function} onBuyClick - Função de callback do App.jsx para iniciar o checkout.
  */
 const VehicleListing = ({ onBuyClick }) => {
     const [vehicles, setVehicles] = useState([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(null);
+    // Cursor da próxima página (header X-Next-Cursor); null quando não há mais
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     
     // 🎯 NOVO ESTADO: Termo de pesquisa
     const [searchTerm, setSearchTerm] = useState(''); 
+    // Resultado da busca no servidor; null quando não há termo (mostra a listagem paginada)
+    const [searchResults, setSearchResults] = useState(null);
+
+    const fetchPage = async (cursor) => {
+        const params = new URLSearchParams({ limit: PAGE_SIZE });
+        if (cursor) params.set('cursor', cursor);
+
+        const response = await fetch(`${VEHICLES_API}?${params}`); 
+        
+        if (!response.ok) {
+            throw new Error(`Fail to search the vehicle. Status: ${response.status}..`);
+        }
+        
+        const data = await response.json();
+        return { data, cursor: response.headers.get('X-Next-Cursor') };
+    };
+
+    const loadMore = async () => {
+        setLoadingMore(true);
+        try {
+            const page = await fetchPage(nextCursor);
+            setVehicles(prev => [...prev, ...page.data]);
+            setNextCursor(page.cursor);
+        } catch (err) {
+            console.error("Fail to search the vehicle:", err);
+            setError(err.message);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
+    // Ref com o cursor atual: o handler do feed não deve recriar a conexão a cada página
+    const nextCursorRef = useRef(null);
+    useEffect(() => { nextCursorRef.current = nextCursor; }, [nextCursor]);
 
     useEffect(() => {
-        // Função original para buscar dados, roda apenas na montagem
+        // Eventos que chegam enquanto a listagem carrega ficam guardados e são aplicados depois
+        let pending = null;
+
+        const applyChange = (kind, data) => {
+            if (kind === 'sold') {
+                setVehicles(prev => prev.filter(vehicle => vehicle.id !== data.id));
+                setSearchResults(prev => (prev ? prev.filter(vehicle => vehicle.id !== data.id) : prev));
+            } else if (kind === 'added') {
+                // Carro novo tem o maior id: entra no fim da lista só se ela já está completa
+                if (nextCursorRef.current) return;
+                const vehicle = { ...data, Inventory_Status: 'Available' };
+                setVehicles(prev => (prev.some(item => item.id === vehicle.id) ? prev : [...prev, vehicle]));
+            }
+        };
+
+        const onChange = (event) => {
+            const data = JSON.parse(event.data);
+            if (pending) {
+                pending.push([event.type, data]);
+            } else {
+                applyChange(event.type, data);
+            }
+        };
+
+        // Busca apenas a primeira página; as demais vêm do botão "Load more"
         const fetchVehicles = async () => {
+            pending = [];
             try {
-                const response = await fetch(VEHICLES_API); 
-                
-                if (!response.ok) {
-                    throw new Error(`Fail to search the vehicle. Status: ${response.status}..`);
-                }
-                
-                const data = await response.json();
+                const page = await fetchPage(null);
                 
-                setVehicles(data);
+                setVehicles(page.data);
+                setNextCursor(page.cursor);
+                nextCursorRef.current = page.cursor;
                 setError(null);
                 
             } catch (err) {
@@ -37,29 +102,72 @@ const VehicleListing = ({ onBuyClick }) => {
                 setError(err.message);
                 setVehicles([]);
             } finally {
+                // Reaplica o que chegou durante a busca (repetir um evento já refletido não muda nada)
+                const missed = pending;
+                pending = null;
+                missed.forEach(([kind, data]) => applyChange(kind, data));
                 setLoading(false);
             }
         };
 
-        fetchVehicles();
-    }, []); // Array de dependência vazio: roda apenas uma vez
+        // Assina o feed antes de buscar a listagem: nada publicado entre as duas se perde.
+        // O EventSource reconecta sozinho e retoma pelo Last-Event-ID
+        const changes = new EventSource(CHANGES_API);
+        let subscribed = false;
+        changes.addEventListener('hello', () => {
+            // "hello" de novo é uma reconexão retomada: os eventos perdidos vêm em seguida
+            if (subscribed) return;
+            subscribed = true;
+            fetchVehicles();
+        });
+        // Sem feed (servidor antigo ou fora do ar) a listagem carrega mesmo assim
+        changes.onerror = () => {
+            if (subscribed) return;
+            subscribed = true;
+            fetchVehicles();
+        };
+        changes.addEventListener('sold', onChange);
+        changes.addEventListener('added', onChange);
+        // O histórico do servidor não cobre o que perdemos: recarrega a primeira página
+        changes.addEventListener('reset', () => {
+            subscribed = true;
+            fetchVehicles();
+        });
 
-    // 🎯 LÓGICA DE FILTRAGEM: Re-filtra somente quando 'vehicles' (dados) ou 'searchTerm' (busca) mudam
-    const filteredVehicles = useMemo(() => {
-        if (!searchTerm) return vehicles;
+        return () => changes.close();
+    }, []); // Array de dependência vazio: roda apenas uma vez
 
-        const term = searchTerm.toLowerCase().trim();
+    // Busca no servidor a cada termo (com debounce); a requisição anterior é cancelada
+    useEffect(() => {
+        const term = searchTerm.trim();
+        if (!term) {
+            setSearchResults(null);
+            return undefined;
+        }
 
-        return vehicles.filter(vehicle => {
-            const mark = vehicle.mark || vehicle.Mark || '';
-            const model = vehicle.model || vehicle.Model || '';
-            const year = (vehicle.year || vehicle.Year || '').toString();
+        const controller = new AbortController();
+        const timer = setTimeout(async () => {
+            try {
+                const params = new URLSearchParams({ q: term, limit: SEARCH_LIMIT });
+                const response = await fetch(`${SEARCH_API}?${params}`, { signal: controller.signal });
+                if (!response.ok) {
+                    throw new Error(`Fail to search the vehicle. Status: ${response.status}..`);
+                }
+                setSearchResults(await response.json());
+            } catch (err) {
+                if (err.name === 'AbortError') return;
+                console.error("Fail to search the vehicle:", err);
+                setError(err.message);
+            }
+        }, SEARCH_DEBOUNCE_MS);
 
-            const searchString = `${mark} ${model} ${year}`.toLowerCase();
-            return searchString.includes(term);
-            });
-        }, [vehicles, searchTerm]); // Dependências que disparam o recálculo
+        return () => {
+            clearTimeout(timer);
+            controller.abort();
+        };
+    }, [searchTerm]);
 
+    const shownVehicles = searchResults ?? vehicles;
     
     if (loading) {
         return <div className="loading-message">Carregando veículos disponíveis...</div>;
@@ -76,12 +184,12 @@ const VehicleListing = ({ onBuyClick }) => {
             {/* 🎯 INTEGRAÇÃO DA BARRA DE PESQUISA */}
             <SearchBar 
                 searchTerm={searchTerm}
-                onSearchChange={setSearchTerm} // Esta função atualiza o estado e dispara a filtragem via useMemo
+                onSearchChange={setSearchTerm} // Atualiza o termo e dispara a busca no servidor
                 placeholder="Search by Mark, Model, Year..."
             />
             
             {/* Mensagem de Sem Resultados após a filtragem */}
-            {filteredVehicles.length === 0 ? (
+            {shownVehicles.length === 0 ? (
                  <div className="empty-message">
                     {searchTerm ? (
                         `Any vehicle is found: "${searchTerm}"`
@@ -91,8 +199,8 @@ const VehicleListing = ({ onBuyClick }) => {
                  </div>
             ) : (
                 <div className="car-cards-grid">
-                    {/* Renderiza APENAS a lista FILTRADA */}
-                    {filteredVehicles.map(vehicle => (
+                    {/* Resultado da busca ou a listagem paginada */}
+                    {shownVehicles.map(vehicle => (
                         <CardVehicle 
                             key={vehicle.id} 
                             vehicle={vehicle} 
@@ -101,6 +209,13 @@ const VehicleListing = ({ onBuyClick }) => {
                     ))}
                 </div>
             )}
+
+            {/* A busca devolve o ranking completo; paginação só na listagem */}
+            {nextCursor && searchResults === null && (
+                <button className="load-more-button" onClick={loadMore} disabled={loadingMore}>
+                    {loadingMore ? 'Loading...' : 'Load more'}
+                </button>
+            )}
         </div>
     );
 };
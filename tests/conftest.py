@@ -0,0 +1,118 @@
+import contextlib
+import os
+import sys
+
+import pymysql  # type: ignore
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeCheckoutDatabase:
+    """
+    In-memory stand-in for the tables the checkout touches (vehicles, sells,
+    checkout_idempotency), answering the exact statements of checkout.py.
+    Uncommitted writes are discarded on rollback.
+    """
+
+    def __init__(self, vehicles):
+        self.vehicles = {vehicle_id: dict(row) for vehicle_id, row in vehicles.items()}
+        self.sells = []
+        self.idempotency = {}
+
+    @contextlib.contextmanager
+    def connection(self):
+        yield FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+        self._undo = []
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self)
+
+    def begin(self):
+        self._undo = []
+
+    def commit(self):
+        self._undo = []
+
+    def rollback(self):
+        for undo in reversed(self._undo):
+            undo()
+        self._undo = []
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.db = conn.db
+        self.rowcount = 0
+        self.lastrowid = None
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=()):
+        query = ' '.join(query.split()).lower()
+        db = self.db
+        self._rows = []
+        if query.startswith("insert into checkout_idempotency"):
+            key, client_id, car_id = params
+            if key in db.idempotency:
+                raise pymysql.err.IntegrityError(1062, f"Duplicate entry '{key}' for key 'PRIMARY'")
+            db.idempotency[key] = {'Client_id': client_id, 'Car_id': car_id, 'Sell_id': None, 'Total_value': None}
+            self.conn._undo.append(lambda: db.idempotency.pop(key, None))
+        elif query.startswith("select client_id, car_id, sell_id, total_value from checkout_idempotency"):
+            row = db.idempotency.get(params[0])
+            self._rows = [dict(row)] if row else []
+        elif query.startswith("update vehicles set inventory_status = 'sold'"):
+            vehicle = db.vehicles.get(params[0])
+            self.rowcount = 0
+            if vehicle is not None and vehicle['Inventory_Status'] == 'Available':
+                vehicle['Inventory_Status'] = 'Sold'
+                self.rowcount = 1
+                self.conn._undo.append(lambda: vehicle.update(Inventory_Status='Available'))
+        elif query.startswith("select inventory_status from vehicles"):
+            vehicle = db.vehicles.get(params[0])
+            self._rows = [{'Inventory_Status': vehicle['Inventory_Status']}] if vehicle else []
+        elif query.startswith("select seller_id, price from vehicles"):
+            vehicle = db.vehicles[params[0]]
+            self._rows = [{'Seller_ID': vehicle['Seller_ID'], 'Price': vehicle['Price']}]
+        elif query.startswith("insert into sells"):
+            client_id, car_id, total, purchase_status = params
+            db.sells.append({'Client_id': client_id, 'Car_id': car_id, 'Total_value': total})
+            self.lastrowid = len(db.sells)
+            self.conn._undo.append(db.sells.pop)
+        elif query.startswith("update checkout_idempotency set sell_id"):
+            sell_id, total, key = params
+            row = db.idempotency[key]
+            previous = dict(row)
+            row.update(Sell_id=sell_id, Total_value=total)
+            self.conn._undo.append(lambda: row.update(previous))
+        else:
+            raise AssertionError(f"Unexpected query: {query}")
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+
+@pytest.fixture
+def checkout_db(monkeypatch):
+    import checkout
+
+    db = FakeCheckoutDatabase({
+        1: {'Seller_ID': 10, 'Price': 50000.0, 'Inventory_Status': 'Available'},
+        2: {'Seller_ID': 10, 'Price': 32000.0, 'Inventory_Status': 'Available'},
+    })
+    monkeypatch.setattr(checkout, 'get_db_connection', db.connection)
+    return db
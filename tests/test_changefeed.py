@@ -0,0 +1,197 @@
+import contextlib
+import json
+from decimal import Decimal
+
+import pytest
+
+import changefeed as changefeed_module
+from changefeed import ChangeFeed
+
+
+class FakeChangesTable:
+    """
+    In-memory inventory_changes shared by several feeds: the writer side
+    (submit) and the statements of ChangeFeed.poll.
+    """
+
+    def __init__(self):
+        self.rows = []
+
+    def submit(self, item):
+        kind, payload, origin = item
+        self.rows.append({'Version': len(self.rows) + 1, 'Kind': kind, 'Payload': payload, 'Origin': origin})
+        return True
+
+    def snapshot(self):
+        return {'queued': 0, 'failed': 0, 'dropped': 0}
+
+    @contextlib.contextmanager
+    def connection(self):
+        yield FakeChangesConnection(self)
+
+
+class FakeChangesConnection:
+    def __init__(self, table):
+        self.table = table
+        self._rows = []
+
+    @contextlib.contextmanager
+    def cursor(self):
+        yield self
+
+    def execute(self, query, params=()):
+        query = ' '.join(query.split()).lower()
+        if query.startswith("select coalesce(max(version), 0)"):
+            self._rows = [{'version': len(self.table.rows)}]
+        elif query.startswith("select version, kind, payload, origin from inventory_changes"):
+            after, limit = params
+            self._rows = [row for row in self.table.rows if row['Version'] > after][:limit]
+        elif query.startswith("delete from inventory_changes"):
+            self._rows = []
+        else:
+            raise AssertionError(f"unexpected query: {query}")
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def commit(self):
+        pass
+
+
+@pytest.fixture
+def changes(monkeypatch):
+    table = FakeChangesTable()
+    monkeypatch.setattr(changefeed_module, 'get_db_connection', table.connection)
+    return table
+
+
+def _row(vehicle_id):
+    return {
+        'id': vehicle_id, 'Seller_ID': 1, 'Mark': 'Zephyrion', 'Model': 'Quasar', 'Year': 2021,
+        'Mileage': 12000, 'Price': Decimal('84990.00'), 'Fuel_type': 'Flex', 'Color': 'Azul',
+        'Status': 'Used', 'Description': None, 'Inventory_Status': 'Available',
+    }
+
+
+def test_each_feed_applies_only_the_other_workers_events(changes):
+    first, second = ChangeFeed(writer=changes), ChangeFeed(writer=changes)
+    applied = {'first': [], 'second': []}
+    first.on_remote = applied['first'].extend
+    second.on_remote = applied['second'].extend
+
+    # Já estava no banco antes dos workers carregarem: não é reaplicado
+    first.sold(1)
+    first.poll()
+    second.poll()
+
+    first.added(_row(2))
+    second.sold(3)
+    first.poll()
+    second.poll()
+
+    assert applied['first'] == [('sold', {'id': 3})]
+    assert [kind for kind, _ in applied['second']] == ['added']
+    assert applied['second'][0][1]['Description'] is None
+    # Os dois feeds transmitem os mesmos eventos, com o "added" reduzido aos campos públicos
+    assert [version for version, _, _ in first.since(1)] == [2, 3]
+    frame = first.since(1)[0][1].decode()
+    assert 'Seller_ID' not in frame and 'Zephyrion' in frame
+
+
+def test_write_on_one_worker_reaches_the_indexes_of_another(changes, monkeypatch):
+    import main
+
+    assert changefeed_module.changefeed.on_remote is main._apply_remote_changes
+    # Dois workers: o deste módulo main (estruturas globais) e outro que só escreve no feed
+    local = ChangeFeed(writer=changes)
+    local.on_remote = main._apply_remote_changes
+    monkeypatch.setattr(main, 'changefeed', local)
+    other = ChangeFeed(writer=changes)
+    local.poll()
+    other.poll()
+
+    vehicle_id = 990001
+    vehicles = len(main.inventory)
+    other.added(_row(vehicle_id))
+    local.poll()
+    assert main.search_index.get(vehicle_id)['Price'] == Decimal('84990.00')
+    assert main.similarity_index.vector(vehicle_id) is not None
+    assert len(main.inventory) == vehicles + 1
+
+    main.listing_cache.set('page', {'filters': {}, 'ids': [vehicle_id]})
+    other.sold(vehicle_id)
+    local.poll()
+    assert main.search_index.get(vehicle_id) is None
+    assert main.similarity_index.vector(vehicle_id) is None
+    assert len(main.inventory) == vehicles
+    assert main.listing_cache.get('page') is None
+    # O próprio worker não reaplica (nem republica) os eventos que escreveu
+    assert [json.loads(row['Payload'])['id'] for row in changes.rows] == [vehicle_id, vehicle_id]
+    assert local.snapshot()['applied_remote'] == 2
+
+
+def test_vehicle_sold_on_another_worker_leaves_the_similar_ranking(changes, monkeypatch):
+    import main
+
+    local = ChangeFeed(writer=changes)
+    local.on_remote = main._apply_remote_changes
+    monkeypatch.setattr(main, 'changefeed', local)
+    other = ChangeFeed(writer=changes)
+    local.poll()
+    other.poll()
+
+    reference, sold = 990101, 990102
+    # O carro de referência foi cadastrado aqui; o parecido, em outro worker
+    main._vehicles_added([_row(reference)], publish=False)
+    other.added(_row(sold))
+    local.poll()
+    vector = main.similarity_index.vector(reference)
+    assert sold in [vehicle_id for vehicle_id, _ in main.similarity_index.query(vector, exclude=(reference,))]
+
+    other.sold(sold)
+    local.poll()
+    assert sold not in [vehicle_id for vehicle_id, _ in main.similarity_index.query(vector, exclude=(reference,))]
+    main._vehicle_sold(reference, publish=False)
+
+
+def test_vehicle_added_on_another_worker_is_searchable(changes, monkeypatch):
+    import main
+
+    local = ChangeFeed(writer=changes)
+    local.on_remote = main._apply_remote_changes
+    monkeypatch.setattr(main, 'changefeed', local)
+    other = ChangeFeed(writer=changes)
+    local.poll()
+    other.poll()
+
+    vehicle_id = 990201
+    assert main.search_index.search('zephyrion quasar') == []
+    other.added(_row(vehicle_id))
+    local.poll()
+    assert [row['id'] for row in main.search_index.search('zephyrion quas')] == [vehicle_id]
+
+    other.sold(vehicle_id)
+    local.poll()
+    assert main.search_index.search('zephyrion') == []
+
+
+def test_email_registered_on_another_worker_leaves_the_negative_cache(changes, monkeypatch):
+    import main
+
+    local = ChangeFeed(writer=changes)
+    local.on_remote = main._apply_remote_changes
+    monkeypatch.setattr(main, 'changefeed', local)
+    other = ChangeFeed(writer=changes)
+    local.poll()
+    other.poll()
+
+    main.login_guard.remember_unknown("New.Buyer@example.com")
+    assert main.login_guard.is_unknown("new.buyer@example.com")
+    other.email_known("new.buyer@example.com")
+    local.poll()
+    assert not main.login_guard.is_unknown("New.Buyer@example.com")
+    # Evento interno: não vira frame para os navegadores
+    assert local.since(0) == []
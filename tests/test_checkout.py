@@ -0,0 +1,44 @@
+import pytest
+
+import checkout
+
+
+def test_idempotency_key_replays_the_original_sale(checkout_db):
+    sold = []
+
+    def on_sold(cursor, vehicle, sell_id):
+        sold.append(sell_id)
+
+    first = checkout.process_checkout(7, 1, "key-1", on_sold)
+    again = checkout.process_checkout(7, 1, "key-1", on_sold)
+
+    assert first['replayed'] is False
+    assert again == {**first, 'replayed': True}
+    assert again['final_price'] == 50000.0
+    # Vendido uma vez só: uma linha em sells e o hook chamado uma vez
+    assert len(checkout_db.sells) == 1
+    assert sold == [first['sell_id']]
+
+
+def test_idempotency_key_reused_for_another_car_is_rejected(checkout_db):
+    checkout.process_checkout(7, 1, "key-1")
+    with pytest.raises(checkout.IdempotencyConflict):
+        checkout.process_checkout(7, 2, "key-1")
+    assert checkout_db.vehicles[2]['Inventory_Status'] == 'Available'
+
+
+def test_second_buyer_without_key_loses_the_race(checkout_db):
+    checkout.process_checkout(7, 1)
+    with pytest.raises(checkout.VehicleUnavailable) as excinfo:
+        checkout.process_checkout(8, 1)
+    assert excinfo.value.current_status == 'Sold'
+    assert len(checkout_db.sells) == 1
+
+
+def test_failed_sale_releases_the_idempotency_key(checkout_db):
+    with pytest.raises(checkout.VehicleNotFound):
+        checkout.process_checkout(7, 99, "key-2")
+    # O rollback apaga a chave: a mesma chave pode ser usada numa nova tentativa
+    result = checkout.process_checkout(7, 2, "key-2")
+    assert result['replayed'] is False
+    assert checkout_db.idempotency["key-2"]['Sell_id'] == result['sell_id']
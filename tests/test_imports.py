@@ -0,0 +1,74 @@
+import io
+import json
+
+import pytest
+
+import imports
+from main import VehicleIn
+
+VEHICLE = {
+    'mark': 'Fiat', 'model': 'Argo', 'year': '2022', 'mileage': 15000, 'price': 72000.0,
+    'fuel_type': 'Flex', 'color': 'Branco', 'status': 'Available', 'seller_id': 10,
+    'description': 'Único dono, revisões em dia na concessionária',
+}
+
+
+def ndjson(records):
+    return b''.join(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n' for record in records)
+
+
+@pytest.fixture
+def chunks(monkeypatch):
+    """Records every chunk handed to the database; fail_on holds chunk numbers that raise."""
+    state = {'inserted': [], 'fail_on': set(), 'next_id': 100}
+
+    def insert_chunk(chunk, batch):
+        number = len(state['inserted']) + 1
+        state['inserted'].append(chunk)
+        if number in state['fail_on']:
+            raise RuntimeError("Deadlock found when trying to get lock")
+        # Como com innodb_autoinc_lock_mode=2: os ids de um INSERT podem ter buracos
+        ids = list(range(state['next_id'], state['next_id'] + 2 * len(chunk), 2))
+        state['next_id'] = ids[-1] + 2
+        return ids
+
+    monkeypatch.setattr(imports, '_insert_chunk', insert_chunk)
+    return state
+
+
+def test_failed_chunk_is_reported_and_the_others_are_kept(chunks):
+    chunks['fail_on'] = {2}
+    records = [VEHICLE] * 5 + [{**VEHICLE, 'mileage': 'muito'}] + ["not an object"] + [VEHICLE] * 3
+    inserted = []
+
+    report = imports.import_vehicles(io.BytesIO(ndjson(records)), 'ndjson', VehicleIn, 2, inserted.extend)
+
+    # 8 linhas válidas em 4 chunks; o segundo chunk (linhas 3 e 4) falha no banco
+    assert report['inserted'] == 6
+    assert report['failed'] == 4
+    assert [error['line'] for error in report['errors']] == [3, 4, 6, 7]
+    assert report['errors'][0]['error'].startswith("Database error")
+    assert report['errors'][2]['error'].startswith("mileage")
+    assert [vehicle_id for vehicle_id, _ in inserted] == [100, 102, 104, 106, 108, 110]
+
+
+def test_unreadable_file_reports_only_committed_chunks(chunks):
+    body = ndjson([VEHICLE] * 50) + b'\xff\xfe invalid utf-8\n' + ndjson([VEHICLE] * 5)
+    inserted = []
+
+    with pytest.raises(imports.ImportFormatError) as excinfo:
+        imports.import_vehicles(io.BytesIO(body), 'ndjson', VehicleIn, 10, inserted.extend)
+
+    report = excinfo.value.report
+    committed = sum(len(chunk) for chunk in chunks['inserted'])
+    # O chunk pendente no momento do erro não é gravado nem contado
+    assert report is not None
+    assert report['inserted'] == committed == len(inserted)
+    assert committed % 10 == 0 and 0 < committed <= 50
+
+
+def test_file_without_csv_header_has_no_report(chunks):
+    with pytest.raises(imports.ImportFormatError) as excinfo:
+        imports.import_vehicles(io.BytesIO(b''), 'csv', VehicleIn)
+    assert excinfo.value.report is None
+    assert chunks['inserted'] == []
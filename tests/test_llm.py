@@ -0,0 +1,115 @@
+import asyncio
+from contextlib import aclosing
+import time
+
+import pytest
+
+from cache import TTLCache
+from llm import FakeProvider, GeminiProvider, SuggestionService
+
+
+def make_service(latency=0.05, answer=None):
+    provider = FakeProvider(latency=latency, answer=answer)
+    return provider, SuggestionService(provider, cache=TTLCache(max_entries=16, ttl=60.0))
+
+
+def test_concurrent_identical_requests_share_one_upstream_call():
+    provider, service = make_service()
+
+    async def run():
+        return await asyncio.gather(*(service.suggest("SUV econômico, até 100 mil") for _ in range(10)))
+
+    answers = asyncio.run(run())
+    assert provider.calls == 1
+    assert len(set(answers)) == 1
+    stats = service.snapshot()
+    assert stats['upstream_calls'] == 1
+    assert stats['coalesced'] == 9
+    assert stats['inflight'] == 0
+
+
+def test_normalized_preferences_hit_the_cache():
+    provider, service = make_service(latency=0.0)
+
+    async def run():
+        first = await service.suggest("SUV Econômico!")
+        second = await service.suggest("  suv economico ")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second
+    assert provider.calls == 1
+    assert service.snapshot()['cache_hits'] == 1
+
+
+def test_cancelling_the_leader_keeps_the_coalesced_waiters():
+    provider, service = make_service(latency=0.05)
+
+    async def run():
+        leader = asyncio.create_task(service.suggest("hatch para cidade"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(service.suggest("hatch para cidade"))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    answer = asyncio.run(run())
+    assert "hatch para cidade" in answer
+    assert provider.calls == 1
+    assert service.snapshot()['errors'] == 0
+
+
+def test_upstream_error_reaches_every_waiter_and_is_not_cached():
+    def fail(prompt):
+        raise RuntimeError("quota exceeded")
+
+    provider, service = make_service(latency=0.01, answer=fail)
+
+    async def run():
+        return await asyncio.gather(*(service.suggest("sedan") for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert provider.calls == 1
+    stats = service.snapshot()
+    assert stats['errors'] == 1
+    assert stats['inflight'] == 0
+    assert stats['cache']['entries'] == 0
+
+
+def test_closing_a_gemini_stream_stops_pulling_tokens():
+    pulled = []
+
+    class Chunk:
+        def __init__(self, text):
+            self.text = text
+
+    class Model:
+        def generate_content(self, prompt, stream=False):
+            for index in range(100):
+                time.sleep(0.005)
+                pulled.append(index)
+                yield Chunk(f"token{index} ")
+
+    provider = GeminiProvider("test-key", workers=1)
+    provider._model = Model()
+    service = SuggestionService(provider, cache=TTLCache(max_entries=16, ttl=60.0))
+
+    async def run():
+        received = []
+        async with aclosing(service.stream("picape diesel")) as stream:
+            async for chunk in stream:
+                received.append(chunk)
+                if len(received) == 3:
+                    break
+        # A thread do provedor percebe o cancelamento no próximo chunk
+        await asyncio.sleep(0.1)
+        return received
+
+    received = asyncio.run(run())
+    assert received == ["token0 ", "token1 ", "token2 "]
+    assert len(pulled) < 10
+    # Resposta parcial não vai para o cache
+    assert service.snapshot()['cache']['entries'] == 0
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from ratelimit import FakeBackend, FakeClock, LocalBackend, LoginGuard, RateLimitExceeded
+
+
+def test_local_backend_keeps_at_most_max_keys():
+    clock = FakeClock()
+    backend = LocalBackend(max_keys=1000, clock=clock)
+    for index in range(5000):
+        backend.consume(f"email:{index}", 5, 5 / 60)
+        clock.advance(0.001)
+    assert len(backend) == 1000
+    assert backend.evictions == 4000
+
+
+def test_local_backend_evicts_least_recently_used_key():
+    clock = FakeClock()
+    backend = LocalBackend(max_keys=2, clock=clock)
+    backend.consume("a", 2, 1.0)
+    backend.consume("b", 2, 1.0)
+    # "a" usada de novo: quem sai com a chave nova é "b"
+    backend.consume("a", 2, 1.0)
+    backend.consume("c", 2, 1.0)
+    assert backend.evictions == 1
+    assert backend.consume("a", 2, 1.0) == (False, 1.0)
+    # "b" foi descartada e volta com o balde cheio
+    assert backend.consume("b", 2, 1.0) == (True, 0.0)
+
+
+def test_bucket_refills_with_the_clock():
+    backend = FakeBackend()
+    assert backend.consume("ip:1", 1, 0.5) == (True, 0.0)
+    assert backend.consume("ip:1", 1, 0.5) == (False, 2.0)
+    backend.clock.advance(2.0)
+    assert backend.consume("ip:1", 1, 0.5) == (True, 0.0)
+
+
+def test_login_guard_limits_per_email():
+    backend = FakeBackend()
+    guard = LoginGuard(backend, email_burst=2, email_per_minute=12, ip_burst=100, ip_per_minute=100)
+
+    async def attempts():
+        await guard.check("login", "user@example.com", "10.0.0.1")
+        await guard.check("login", "USER@example.com", "10.0.0.2")
+        with pytest.raises(RateLimitExceeded) as excinfo:
+            await guard.check("login", "user@example.com", "10.0.0.3")
+        return excinfo.value
+
+    error = asyncio.run(attempts())
+    assert error.scope == "email"
+    assert error.retry_after == pytest.approx(5.0)
+    assert guard.snapshot()['rejected_email'] == 1
@@ -0,0 +1,54 @@
+import os
+import time
+
+# Variantes geradas de cada foto: (nome, lado máximo em px, formato)
+VARIANTS = (
+    ('large', 1600, 'webp'),
+    ('thumb', 320, 'webp'),
+    ('thumb', 320, 'jpg'),  # para navegadores sem WebP
+)
+
+_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Limite contra "decompression bombs" (o Pillow só avisa acima do padrão dele)
+MAX_PIXELS = 60_000_000
+
+
+def variant_filename(content_hash, name, ext):
+    return f"{content_hash}_{name}.{ext}"
+
+
+def make_variants(source, targets):
+    """
+    Writes every (path, max_side, ext) target from the image at source and
+    returns the seconds spent. Runs inside the photo process pool, so Pillow
+    is only imported there.
+
+    The image is decoded once (JPEGs already downscaled by the decoder via
+    draft()) and each variant is resized from the previous, larger one.
+    Files are written under a temporary name and renamed into place, so a
+    reader never sees a partial variant.
+    """
+    from PIL import Image, ImageOps
+
+    started = time.perf_counter()
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    targets = sorted(targets, key=lambda target: -target[1])
+    with Image.open(source) as opened:
+        largest = targets[0][1]
+        opened.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(opened)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+        for path, side, ext in targets:
+            if max(image.size) > side:
+                image.thumbnail((side, side), Image.Resampling.LANCZOS)
+            fmt, options = _FORMATS[ext]
+            frame = image.convert('RGB') if fmt == 'JPEG' and image.mode != 'RGB' else image
+            partial = f"{path}.{os.getpid()}.tmp"
+            frame.save(partial, fmt, **options)
+            os.replace(partial, path)
+    return time.perf_counter() - started